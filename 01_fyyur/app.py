@@ -2,98 +2,1416 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import atexit
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import hashlib
+import mimetypes
+import os
+import random
+import secrets
+import time
+import click
+from flask import Blueprint, Flask, current_app, g, has_request_context, render_template, request, Response, flash, redirect, url_for, abort, jsonify, make_response, send_from_directory, session, stream_with_context
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
 import logging
-from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
-from datetime import datetime
+from logging import FileHandler
+import calendar
+from datetime import date, datetime, timedelta
+from collections import Counter
+from itertools import groupby
+from models import db, Venue, Artist, Show, Reservation, Ticket, ArtistRecommendation, Watermark, AreaMonthRollup, GenreMonthRollup, \
+  VenueMonthRollup, DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+from search import search
+from page_cache import PageCache
+from formatting import NAMED_FORMATS, format_rows, get_formatter, local_time
+from request_log import JSONFormatter, RequestLog, RequestStats, Sampler
+from exports import chunked, csv_lines, ical_calendar
+from autocomplete import PrefixIndex
+from template_cache import TemplateBytecodeCache
+from assets import AssetBuild, AssetManifest, ENCODINGS
+from importer import LoadReport, RejectedRow, batched, normalize, read_records
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-
-#----------------------------------------------------------------------------#
-# Models.
-#----------------------------------------------------------------------------#
-
-class Venue(db.Model):
-    __tablename__ = 'Venue'
-    __table_args__ = (db.UniqueConstraint('name', 'city', 'state'),)
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(), nullable=False)
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    address = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.String(120), nullable=True)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
-    image_link = db.Column(db.String(500), nullable=True)
-    facebook_link = db.Column(db.String(120), nullable=True)
-    website = db.Column(db.String(), nullable=True)
-    seeking_talent = db.Column(db.Boolean, nullable=True, default=False)
-    seeking_description = db.Column(db.String(), nullable=True)
-
-class Artist(db.Model):
-    __tablename__ = 'Artist'
-    __table_args__ = (db.UniqueConstraint('name', 'city', 'state'),)
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.String(120), nullable=True)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
-    image_link = db.Column(db.String(500), nullable=True)
-    facebook_link = db.Column(db.String(120), nullable=True)
-    website = db.Column(db.String(), nullable=True)
-    seeking_venue = db.Column(db.Boolean, nullable=True, default=False)
-    seeking_description = db.Column(db.String(), nullable=True)
-
-class Show(db.Model):
-    __tablename__ = 'Show'
-    __table_args__ = (db.UniqueConstraint('artist_id', 'venue_id', 'start_time'),)
-
-    id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.DateTime, nullable=False)
-    
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
-
-    artist = db.relationship('Artist', backref=db.backref('shows', lazy=True))
-    venue = db.relationship('Venue', backref=db.backref('shows', lazy=True))
+# Forms (WTForms), Babel, dateutil and Flask-Migrate (Alembic) are imported
+# where they are first needed, so starting a worker or a CLI command only pays
+# for what it uses. warm_up() imports them ahead of time for pre-fork servers.
+
+DEVELOPMENT_SECRET_KEY = 'fyyur-development-key'
+
+moment = Moment()
+page_cache = PageCache()
+fyyur = Blueprint('fyyur', __name__, cli_group=None)
+
+def create_app(config=None):
+  # Settings are read from config.py, then from the file named by FYYUR_SETTINGS,
+  # then from `config`.
+  app = Flask(__name__)
+  app.config.from_object('config')
+  app.config.from_envvar('FYYUR_SETTINGS', silent=True)
+  app.config.from_mapping(config or {})
+  check_secret_key(app)
+  db.init_app(app)
+  moment.init_app(app)
+  page_cache.init_app(app)
+  init_template_cache(app)
+  app.extensions['assets'] = AssetManifest(app.config['ASSETS_DIR'])
+  init_name_indexes(app)
+  init_migrations(app)
+  app.register_blueprint(fyyur)
+  configure_logging(app)
+  return app
+
+def check_secret_key(app):
+  # Every worker has to sign sessions with the same key, or a message flashed by
+  # one worker can't be read by the next.
+  if app.config.get('SECRET_KEY'):
+    return
+  if not (app.debug or app.testing):
+    raise RuntimeError('SECRET_KEY is not set; export it or point FYYUR_SETTINGS at a settings file.')
+  app.config['SECRET_KEY'] = DEVELOPMENT_SECRET_KEY
+
+def init_migrations(app):
+  # only the `flask db` commands need Alembic, and they always run through the flask CLI
+  if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+    from flask_migrate import Migrate
+    Migrate(app, db)
+
+def init_template_cache(app):
+  # compiled templates are shared on disk, so a recycled worker doesn't compile them again
+  directory = app.config.get('TEMPLATE_CACHE_DIR')
+  if not directory:
+    return
+  try:
+    app.jinja_env.bytecode_cache = TemplateBytecodeCache(directory)
+  except OSError as e:
+    app.logger.warning('Template cache disabled: %s', e)
+
+def configure_logging(app, handlers=None):
+  # Application errors and one JSON line per request go through a queue to a
+  # background thread, so request threads never wait on the log file.
+  if handlers is None:
+    handlers = []
+    if not app.debug and not app.testing:
+      file_handler = FileHandler(app.config['LOG_FILE'])
+      file_handler.setFormatter(JSONFormatter())
+      file_handler.setLevel(logging.INFO)
+      handlers.append(file_handler)
+  if not handlers:
+    return
+  request_log = RequestLog(handlers, Sampler(
+    rate=app.config['REQUEST_LOG_SAMPLE_RATE'],
+    slow_ms=app.config['REQUEST_LOG_SLOW_MS'],
+    max_per_second=app.config['REQUEST_LOG_MAX_PER_SECOND']),
+    queue_size=app.config['REQUEST_LOG_QUEUE_SIZE'])
+  app.logger.setLevel(logging.INFO)
+  app.logger.addHandler(request_log)
+  app.extensions['request_log'] = request_log
+  atexit.register(request_log.stop)
+
+def warm_up(app):
+  # Does the import and compile work the first requests would otherwise pay for,
+  # without opening database connections, so a pre-fork master can do it once
+  # and share it with every worker.
+  import forms  # noqa: F401
+  import dateutil.parser  # noqa: F401
+  for format in NAMED_FORMATS:
+    get_formatter(format, app.config['BABEL_DEFAULT_LOCALE'], app.config['DISPLAY_TIMEZONE'])
+  compile_templates(app)
+
+def compile_templates(app):
+  # with a bytecode cache, also writes (or refreshes) each template's cache entry
+  names = app.jinja_env.list_templates()
+  for name in names:
+    app.jinja_env.get_template(name)
+  return names
+
+@fyyur.cli.group('templates')
+def template_commands():
+  """Compiled template cache."""
+
+@template_commands.command('compile')
+@click.option('--clear/--no-clear', default=True, show_default=True,
+  help='Remove existing cache entries first, including those of deleted templates.')
+def compile_templates_command(clear):
+  """Compile every template into TEMPLATE_CACHE_DIR, e.g. when deploying."""
+  cache = current_app.jinja_env.bytecode_cache
+  if cache is None:
+    raise click.ClickException('TEMPLATE_CACHE_DIR is not set.')
+  if clear:
+    cache.clear()
+  names = compile_templates(current_app)
+  click.echo('Compiled {} templates into {}'.format(len(names), cache.directory))
+
+#----------------------------------------------------------------------------#
+# Request timing.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def sql_started(conn, cursor, statement, parameters, context, executemany):
+  # statements on a connection run one at a time, so one slot is enough; a statement
+  # that raises never reaches sql_finished and the next one overwrites its start
+  conn.info['query_started'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def sql_finished(conn, cursor, statement, parameters, context, executemany):
+  started = conn.info.pop('query_started')
+  stats = g.get('request_stats') if has_request_context() else None
+  if stats is not None:
+    stats.sql_count += 1
+    stats.sql_ms += (time.perf_counter() - started) * 1000
+
+@fyyur.before_app_request
+def start_request_timer():
+  if 'request_log' in current_app.extensions:
+    g.request_stats = RequestStats()
+
+@fyyur.after_app_request
+def log_request(response):
+  stats = g.get('request_stats')
+  if stats is not None:
+    # streamed pages keep querying after this hook, so log when the body is done
+    request_log = current_app.extensions['request_log']
+    method, route, status = request.method, request.url_rule.rule if request.url_rule else None, response.status_code
+    response.call_on_close(lambda: request_log.request(method, route, status, stats))
+  return response
+
+#----------------------------------------------------------------------------#
+# Counters.
+#----------------------------------------------------------------------------#
+
+# Venue.upcoming_shows_count and Artist.upcoming_shows_count count the shows
+# flagged counted_upcoming. Handlers keep them current on writes and
+# `flask counters expire` moves shows that have started out of the counts.
+
+def shift_upcoming_counts(deltas):
+  # deltas: iterable of (venue_id, artist_id, delta)
+  venue_deltas = Counter()
+  artist_deltas = Counter()
+  for venue_id, artist_id, delta in deltas:
+    venue_deltas[venue_id] += delta
+    artist_deltas[artist_id] += delta
+
+  for model, model_deltas in ((Venue, venue_deltas), (Artist, artist_deltas)):
+    params = [{"owner_id": owner_id, "delta": delta} for owner_id, delta in model_deltas.items() if delta]
+    if params:
+      db.session.execute(model.__table__.update().
+        where(model.id == db.bindparam('owner_id')).
+        values(upcoming_shows_count=model.upcoming_shows_count + db.bindparam('delta')), params)
+
+def count_upcoming_show(show, now=None):
+  now = now or datetime.now()
+  if show.start_time > now:
+    show.counted_upcoming = True
+    shift_upcoming_counts([(show.venue_id, show.artist_id, 1)])
+
+def release_upcoming_shows(*criteria):
+  # call before deleting the shows matched by criteria (directly or by cascade)
+  rows = db.session.query(Show.venue_id, Show.artist_id, -db.func.count(Show.id)). \
+    filter(Show.counted_upcoming, *criteria).group_by(Show.venue_id, Show.artist_id).all()
+  shift_upcoming_counts(rows)
+
+def expire_upcoming_shows(now=None):
+  now = now or datetime.now()
+  expired = Show.__table__.update(). \
+    where(db.and_(Show.counted_upcoming, Show.start_time <= now)). \
+    values(counted_upcoming=False).returning(Show.venue_id, Show.artist_id)
+  rows = db.session.execute(expired).fetchall()
+  shift_upcoming_counts((venue_id, artist_id, -1) for venue_id, artist_id in rows)
+  db.session.commit()
+  return len(rows)
+
+def rebuild_upcoming_counts(now=None):
+  now = now or datetime.now()
+  db.session.query(Show).update({Show.counted_upcoming: Show.start_time > now}, synchronize_session=False)
+  for model, show_fk in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    count = db.select([db.func.count(Show.id)]). \
+      where(db.and_(show_fk == model.id, Show.counted_upcoming)).as_scalar()
+    db.session.query(model).update({model.upcoming_shows_count: count}, synchronize_session=False)
+  db.session.commit()
+
+def check_upcoming_counts(now=None):
+  # returns (table, id, stored, actual) for every counter that disagrees with Show
+  now = now or datetime.now()
+  mismatches = []
+  for model, show_fk in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    actual = db.session.query(show_fk.label('owner_id'), db.func.count(Show.id).label('count')). \
+      filter(Show.start_time > now).group_by(show_fk).subquery()
+    actual_count = db.func.coalesce(actual.c.count, 0)
+    rows = db.session.query(model.id, model.upcoming_shows_count, actual_count). \
+      outerjoin(actual, actual.c.owner_id == model.id). \
+      filter(model.upcoming_shows_count != actual_count).order_by(model.id).all()
+    mismatches.extend((model.__tablename__,) + tuple(row) for row in rows)
+  return mismatches
+
+@fyyur.cli.group()
+def counters():
+  """Maintain the upcoming show counters."""
+
+@counters.command('expire')
+def expire_counters_command():
+  """Remove shows that have started from the counters (run from cron)."""
+  click.echo('Expired {} shows.'.format(expire_upcoming_shows()))
+
+@counters.command('check')
+@click.option('--rebuild', is_flag=True, help='Recompute every counter from the Show table.')
+def check_counters_command(rebuild):
+  """Report counters that disagree with the Show table."""
+  if rebuild:
+    rebuild_upcoming_counts()
+  mismatches = check_upcoming_counts()
+  for table, owner_id, stored, actual in mismatches:
+    click.echo('{} {}: stored {}, actual {}'.format(table, owner_id, stored, actual))
+  click.echo('{} mismatched counters.'.format(len(mismatches)))
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+
+# A proposed show conflicts with every show of the same artist, or at the same
+# venue, whose [start_time, end_time) overlaps its own. Durations are capped at
+# MAX_SHOW_MINUTES, so only shows starting in (start - max, end) can overlap:
+# each branch is a range scan on the (artist_id, start_time) or
+# (venue_id, start_time) index, however many past shows the table holds.
+BOOKING_CONFLICTS = db.text("""
+  WITH proposed AS (
+    SELECT * FROM unnest(CAST(:idx AS int[]), CAST(:artist_ids AS int[]), CAST(:venue_ids AS int[]),
+                         CAST(:start_times AS timestamp[]), CAST(:end_times AS timestamp[]))
+      AS p(idx, artist_id, venue_id, start_time, end_time)
+  )
+  SELECT p.idx, 'artist' AS booked, s.id, s.artist_id, s.venue_id, s.start_time, s.duration_minutes
+  FROM proposed p JOIN "Show" s ON s.artist_id = p.artist_id
+  WHERE s.start_time > p.start_time - :max_duration AND s.start_time < p.end_time
+    AND s.start_time + s.duration_minutes * interval '1 minute' > p.start_time
+  UNION ALL
+  SELECT p.idx, 'venue' AS booked, s.id, s.artist_id, s.venue_id, s.start_time, s.duration_minutes
+  FROM proposed p JOIN "Show" s ON s.venue_id = p.venue_id
+  WHERE s.start_time > p.start_time - :max_duration AND s.start_time < p.end_time
+    AND s.start_time + s.duration_minutes * interval '1 minute' > p.start_time
+  ORDER BY idx, start_time
+""")
+
+def end_time(proposal):
+  return proposal['start_time'] + timedelta(minutes=proposal['duration_minutes'])
+
+def parse_proposal(item):
+  # {"artist_id", "venue_id", "start_time" (ISO 8601), "duration_minutes"?} -> proposal
+  try:
+    proposal = {
+      'artist_id': int(item['artist_id']),
+      'venue_id': int(item['venue_id']),
+      'start_time': local_time(datetime.fromisoformat(item['start_time'])),
+      'duration_minutes': int(item.get('duration_minutes', DEFAULT_SHOW_MINUTES)),
+    }
+  except KeyError as e:
+    raise ValueError('missing {}'.format(e.args[0]))
+  except (TypeError, AttributeError):
+    raise ValueError('expected an object with artist_id, venue_id and start_time')
+  if not 1 <= proposal['duration_minutes'] <= MAX_SHOW_MINUTES:
+    raise ValueError('duration_minutes must be between 1 and {}'.format(MAX_SHOW_MINUTES))
+  return proposal
+
+def booking_conflicts(proposals):
+  # the existing shows each proposal overlaps, all proposals in one statement
+  if not proposals:
+    return []
+  conflicts = [{} for _ in proposals]
+  rows = db.session.execute(BOOKING_CONFLICTS, {
+    'idx': list(range(len(proposals))),
+    'artist_ids': [proposal['artist_id'] for proposal in proposals],
+    'venue_ids': [proposal['venue_id'] for proposal in proposals],
+    'start_times': [proposal['start_time'] for proposal in proposals],
+    'end_times': [end_time(proposal) for proposal in proposals],
+    'max_duration': timedelta(minutes=MAX_SHOW_MINUTES),
+  })
+  for row in rows:
+    conflict = conflicts[row.idx].setdefault(row.id, {
+      "show_id": row.id,
+      "artist_id": row.artist_id,
+      "venue_id": row.venue_id,
+      "start_time": row.start_time,
+      "end_time": row.start_time + timedelta(minutes=row.duration_minutes),
+      "booked": [],
+    })
+    conflict['booked'].append(row.booked)
+    conflict['booked'].sort()
+  return [list(shows.values()) for shows in conflicts]
+
+def schedule_conflicts(proposals):
+  # positions of the other proposals each one overlaps, for the same artist or venue
+  clashes = [set() for _ in proposals]
+  for field in ('artist_id', 'venue_id'):
+    order = sorted(range(len(proposals)), key=lambda i: (proposals[i][field], proposals[i]['start_time']))
+    for _, group in groupby(order, key=lambda i: proposals[i][field]):
+      running = []
+      for i in group:
+        running = [j for j in running if end_time(proposals[j]) > proposals[i]['start_time']]
+        for j in running:
+          clashes[i].add(j)
+          clashes[j].add(i)
+        running.append(i)
+  return [sorted(positions) for positions in clashes]
+
+def lock_bookings(artist_ids, venue_ids):
+  # Holds the artist and venue rows until commit so two concurrent bookings for
+  # any of them can't both pass the conflict check. Always artists first, in id
+  # order, so they never wait on each other; NO KEY UPDATE leaves show inserts unblocked.
+  db.session.query(Artist.id).filter(Artist.id.in_(artist_ids)).order_by(Artist.id). \
+    with_for_update(key_share=True).all()
+  db.session.query(Venue.id).filter(Venue.id.in_(venue_ids)).order_by(Venue.id). \
+    with_for_update(key_share=True).all()
+
+def bookable_shows(rows, report):
+  # (line number, show) rows that overlap neither a booking nor an earlier row; the rest
+  # are rejected. The same show imported again is left to ON CONFLICT DO NOTHING.
+  shows = [row for _, row in rows]
+  lock_bookings({show['artist_id'] for show in shows}, {show['venue_id'] for show in shows})
+  accepted = []
+  for index, (conflicts, clashes) in enumerate(zip(booking_conflicts(shows), schedule_conflicts(shows))):
+    line_no, show = rows[index]
+    key = (show['artist_id'], show['venue_id'], show['start_time'])
+    conflicts = [conflict for conflict in conflicts
+                 if (conflict['artist_id'], conflict['venue_id'], conflict['start_time']) != key]
+    earlier = [rows[i][0] for i in clashes if i in accepted]
+    if conflicts:
+      conflict = conflicts[0]
+      report.reject(line_no, 'the {} is already booked from {} to {}'.format(
+        ' and '.join(conflict['booked']), conflict['start_time'].isoformat(), conflict['end_time'].isoformat()))
+    elif earlier:
+      report.reject(line_no, 'overlaps line {}'.format(earlier[0]))
+    else:
+      accepted.append(index)
+  return [rows[index] for index in accepted]
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+IMPORT_BATCH_SIZE = 1000
+
+# a row repeating an earlier row's key in the same batch would be dropped by the writer
+IMPORT_KEYS = {
+  'venues': ('name', 'city', 'state'),
+  'artists': ('name', 'city', 'state'),
+  'shows': ('artist_id', 'venue_id', 'start_time'),
+}
+
+def upsert_rows(model, rows):
+  # one multi-row INSERT ... ON CONFLICT (name, city, state) DO UPDATE per batch
+  key = ('name', 'city', 'state')
+  rows = list({tuple(row[k] for k in key): row for row in rows}.values())
+  stmt = insert(model.__table__)
+  updates = {field: stmt.excluded[field] for field in rows[0] if field not in key}
+  updates['updated_at'] = stmt.excluded.updated_at
+  # an edit form opened before the import must not overwrite it
+  updates['version'] = model.__table__.c.version + 1
+  stmt = stmt.on_conflict_do_update(index_elements=key, set_=updates)
+  db.session.execute(stmt, rows)
+
+def resolve_references(model, refs):
+  # maps (name, city, state) keys to ids with one query per batch
+  keys = {ref for ref in refs if isinstance(ref, tuple)}
+  if not keys:
+    return {}
+  rows = db.session.query(model.id, model.name, model.city, model.state). \
+    filter(db.tuple_(model.name, model.city, model.state).in_(keys)).all()
+  return {(row.name, row.city, row.state): row.id for row in rows}
+
+def insert_shows(rows, now=None):
+  now = now or datetime.now()
+  rows = list({(row['artist_id'], row['venue_id'], row['start_time']): row for row in rows}.values())
+  db.session.execute(insert(Show.__table__).on_conflict_do_nothing(), rows)
+  # count the upcoming shows this batch added, whichever of them were new
+  keys = [(row['artist_id'], row['venue_id'], row['start_time']) for row in rows]
+  counted = Show.__table__.update(). \
+    where(db.and_(
+      db.not_(Show.counted_upcoming), Show.start_time > now,
+      db.tuple_(Show.artist_id, Show.venue_id, Show.start_time).in_(keys))). \
+    values(counted_upcoming=True).returning(Show.venue_id, Show.artist_id)
+  shift_upcoming_counts((venue_id, artist_id, 1) for venue_id, artist_id in db.session.execute(counted))
+
+def write_batch(kind, rows):
+  if kind == 'venues':
+    upsert_rows(Venue, rows)
+  elif kind == 'artists':
+    upsert_rows(Artist, rows)
+  else:
+    insert_shows(rows)
+
+def import_batch(kind, batch, report):
+  rows = []
+  for line_no, record in batch:
+    try:
+      rows.append((line_no, normalize(kind, record)))
+    except RejectedRow as e:
+      report.reject(line_no, e)
+
+  if kind == 'shows':
+    artist_ids = resolve_references(Artist, [row['artist'] for _, row in rows])
+    venue_ids = resolve_references(Venue, [row['venue'] for _, row in rows])
+    resolved = []
+    for line_no, row in rows:
+      artist_id = artist_ids.get(row['artist'], row['artist'])
+      venue_id = venue_ids.get(row['venue'], row['venue'])
+      if isinstance(artist_id, tuple):
+        report.reject(line_no, 'unknown artist {}'.format(', '.join(artist_id)))
+      elif isinstance(venue_id, tuple):
+        report.reject(line_no, 'unknown venue {}'.format(', '.join(venue_id)))
+      else:
+        resolved.append((line_no, {
+          'artist_id': artist_id, 'venue_id': venue_id, 'start_time': row['start_time'],
+          'duration_minutes': row['duration_minutes'] or DEFAULT_SHOW_MINUTES}))
+    rows = resolved
+
+  first_lines, unique = {}, []
+  for line_no, row in rows:
+    key = tuple(row[field] for field in IMPORT_KEYS[kind])
+    if key in first_lines:
+      report.reject(line_no, 'duplicate of line {}'.format(first_lines[key]))
+    else:
+      first_lines[key] = line_no
+      unique.append((line_no, row))
+  rows = unique
+
+  if not rows:
+    return
+  try:
+    if kind == 'shows':
+      rows = bookable_shows(rows, report)
+    if rows:
+      write_batch(kind, [row for _, row in rows])
+    db.session.commit()
+    report.loaded += len(rows)
+  except SQLAlchemyError:
+    # isolate the offending rows instead of dropping the whole batch
+    db.session.rollback()
+    for line_no, row in rows:
+      try:
+        # the locks went with the rollback, so each row is checked again
+        if kind == 'shows' and not bookable_shows([(line_no, row)], report):
+          continue
+        write_batch(kind, [row])
+        db.session.commit()
+        report.loaded += 1
+      except SQLAlchemyError as e:
+        db.session.rollback()
+        report.reject(line_no, getattr(e, 'orig', e))
+
+def import_file(kind, path, batch_size=IMPORT_BATCH_SIZE, progress=None):
+  report = LoadReport()
+  for batch in batched(read_records(path), batch_size):
+    import_batch(kind, batch, report)
+    if progress:
+      progress(report)
+  return report
+
+def pages_shared_with_workers():
+  # CLI commands run in their own process, so with the per-process memory backend their
+  # clears and invalidations never reach the web workers; say so instead of pretending
+  if not page_cache.shared:
+    click.echo('Pages cached by running web workers expire within {}s; set PAGE_CACHE_BACKEND=redis '
+               'to invalidate them from the command line.'.format(page_cache.ttl), err=True)
+  return page_cache.shared
+
+@fyyur.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+def import_command(kind, path, batch_size):
+  """Load venues, artists or shows from a CSV or NDJSON file.
+
+  Shows that overlap a booking of their artist or venue, or an earlier line, are rejected.
+  """
+  report = import_file(kind, path, batch_size, progress=lambda r: click.echo(r.summary(), err=True))
+  if pages_shared_with_workers():
+    page_cache.clear()
+  for line_no, reason in report.rejects:
+    click.echo('{}:{}: {}'.format(path, line_no, reason), err=True)
+  click.echo(report.summary())
+
+#----------------------------------------------------------------------------#
+# Seeding.
+#----------------------------------------------------------------------------#
+
+def seed_database(venues, artists, shows, random_seed=0, batch_size=IMPORT_BATCH_SIZE, now=None):
+  # synthetic data through the bulk import writers, so triggers and counters see it as real
+  import seeding
+  rng = random.Random(random_seed)
+  for kind, records in (('venues', seeding.venue_records(venues, rng)),
+                        ('artists', seeding.artist_records(artists, rng))):
+    for batch in batched(records, batch_size):
+      write_batch(kind, batch)
+      db.session.commit()
+  venue_rows = db.session.query(Venue.id, Venue.city).order_by(Venue.id).all()
+  artist_rows = db.session.query(Artist.id, Artist.city).order_by(Artist.id).all()
+  for batch in batched(seeding.show_records(shows, venue_rows, artist_rows, rng, now), batch_size):
+    insert_shows(batch, now)
+    db.session.commit()
+  page_cache.clear()
+
+@fyyur.cli.command('seed')
+@click.option('--venues', default=100, show_default=True)
+@click.option('--artists', default=300, show_default=True)
+@click.option('--shows', default=3000, show_default=True)
+@click.option('--random-seed', default=0, show_default=True, help='Same seed, same data.')
+def seed_command(venues, artists, shows, random_seed):
+  """Add synthetic venues, artists and shows for development and benchmarks.
+
+  Synthetic shows are not checked for overlapping bookings.
+  """
+  started = time.time()
+  seed_database(venues, artists, shows, random_seed)
+  pages_shared_with_workers()
+  click.echo('Seeded {} venues, {} artists and {} shows in {:.1f}s.'.format(
+    venues, artists, shows, time.time() - started))
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# Each process keeps a PrefixIndex of names per model. The handlers that write a
+# name update it in place; writes made by other workers or by `flask import` are
+# picked up every AUTOCOMPLETE_REFRESH_SECONDS from updated_at, and deletions by
+# a full reload every AUTOCOMPLETE_RELOAD_SECONDS.
+
+AUTOCOMPLETE_MODELS = {'artists': Artist, 'venues': Venue}
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+def init_name_indexes(app):
+  app.extensions['autocomplete'] = {kind: PrefixIndex() for kind in AUTOCOMPLETE_MODELS}
+
+def load_name_indexes():
+  for kind in AUTOCOMPLETE_MODELS:
+    load_name_index(kind)
+
+def load_name_index(kind):
+  model = AUTOCOMPLETE_MODELS[kind]
+  rows = db.session.query(model.id, model.name, model.updated_at).all()
+  name_indexes()[kind].load(((row.id, row.name) for row in rows),
+    max((row.updated_at for row in rows), default=None))
+
+def name_indexes():
+  return current_app.extensions['autocomplete']
+
+def name_index(kind):
+  index = name_indexes()[kind]
+  config = current_app.config
+  now = time.monotonic()
+  if index.loaded_at is None or now - index.loaded_at > config['AUTOCOMPLETE_RELOAD_SECONDS']:
+    load_name_index(kind)
+  elif now - index.refreshed_at > config['AUTOCOMPLETE_REFRESH_SECONDS']:
+    # re-read a window before the high-water mark for commits that landed late
+    model = AUTOCOMPLETE_MODELS[kind]
+    query = db.session.query(model.id, model.name, model.updated_at)
+    if index.high_water is not None:
+      query = query.filter(model.updated_at >= index.high_water - timedelta(seconds=config['AUTOCOMPLETE_REFRESH_SECONDS']))
+    rows = query.all()
+    index.refresh(((row.id, row.name) for row in rows), max((row.updated_at for row in rows), default=None))
+  return index
+
+def index_name(kind, entry_id, name):
+  # only for indexes already loaded; the first lookup reads the committed row anyway
+  index = name_indexes()[kind]
+  if index.loaded_at is not None:
+    index.add([(entry_id, name)])
+
+def unindex_names(kind, ids):
+  name_indexes()[kind].remove(ids)
+
+#----------------------------------------------------------------------------#
+# Recommendations.
+#----------------------------------------------------------------------------#
+
+# The artist page lists related artists from ArtistRecommendation, which
+# `flask recommendations build` fills offline from venue co-occurrence and
+# genres (see recommendations.py). An incremental build only recomputes the
+# artists whose shows or details changed since the last build, along with the
+# artists sharing a venue with those changed shows, the artists sharing a genre
+# with the changed artists and those that listed them by genre. Scores are
+# weighted over all artists, so the others drift slightly until a --full build.
+
+RELATED_ARTISTS = 6
+RECOMMENDATION_BATCH_SIZE = 1000
+RECOMMENDATIONS_WATERMARK = 'recommendations'
+
+def get_watermark(name):
+  return db.session.query(Watermark).filter(Watermark.name == name).first()
+
+def set_watermark(name, value, position=None):
+  statement = insert(Watermark).values(name=name, value=value, position=position)
+  db.session.execute(statement.on_conflict_do_update(index_elements=[Watermark.name],
+    set_={'value': statement.excluded.value, 'position': statement.excluded.position}))
+
+def changed_artists(since, plays, artists):
+  # artists whose recommendations may have moved since `since`
+  edited = {artist_id for artist_id, in db.session.query(Artist.id).filter(Artist.updated_at >= since)}
+  changed = set(edited)
+  # an edited artist's genres may be new: artists sharing them may list it now, and
+  # artists that listed it by its old genres may not
+  genres = {genre for artist_id, artist_genres in artists if artist_id in edited for genre in artist_genres or ()}
+  changed.update(artist_id for artist_id, artist_genres in artists if genres.intersection(artist_genres or ()))
+  if edited:
+    changed.update(artist_id for artist_id, in db.session.query(ArtistRecommendation.artist_id).filter(
+      ArtistRecommendation.kind == 'genre', ArtistRecommendation.related_artist_id.in_(edited)).distinct())
+  venue_ids = set()
+  for artist_id, venue_id in db.session.query(Show.artist_id, Show.venue_id). \
+      filter(Show.updated_at >= since).distinct():
+    changed.add(artist_id)
+    venue_ids.add(venue_id)
+  changed.update(artist_id for artist_id, venue_id, _ in plays if venue_id in venue_ids)
+  return changed
+
+def build_recommendations(full=False, top_k=RELATED_ARTISTS, batch_size=RECOMMENDATION_BATCH_SIZE, progress=None):
+  """Recomputes related artists; returns how many artists were updated."""
+  from recommendations import RelatedArtists
+  started = datetime.utcnow()
+  watermark = None if full else get_watermark(RECOMMENDATIONS_WATERMARK)
+  since = watermark.value if watermark else None
+  artists = db.session.query(Artist.id, Artist.genres).order_by(Artist.id).all()
+  plays = db.session.query(Show.artist_id, Show.venue_id, db.func.count(Show.id)). \
+    group_by(Show.artist_id, Show.venue_id).all()
+  targets = [artist.id for artist in artists]
+  if since is not None:
+    changed = changed_artists(since, plays, artists)
+    targets = [artist_id for artist_id in targets if artist_id in changed]
+  related = RelatedArtists([artist.id for artist in artists], [artist.genres for artist in artists], plays)
+
+  table = ArtistRecommendation.__table__
+  columns = ('artist_id', 'kind', 'rank', 'related_artist_id', 'score')
+  for done, batch in enumerate(batched(targets, batch_size), 1):
+    # each batch replaces its artists' rows in one short transaction
+    rows = [dict(zip(columns, row)) for row in related.neighbors(batch, top_k)]
+    db.session.execute(table.delete().where(table.c.artist_id.in_(batch)))
+    if rows:
+      db.session.execute(table.insert(), rows)
+    db.session.commit()
+    page_cache.invalidate('artist', *batch)
+    if progress:
+      progress(min(done * batch_size, len(targets)), len(targets))
+  set_watermark(RECOMMENDATIONS_WATERMARK, started)
+  db.session.commit()
+  return len(targets)
+
+def related_artists(artist_id):
+  # one primary key range scan, joined to the related artists' rows
+  rows = db.session.query(ArtistRecommendation.kind, Artist.id, Artist.name, Artist.image_link). \
+    join(Artist, Artist.id == ArtistRecommendation.related_artist_id). \
+    filter(ArtistRecommendation.artist_id == artist_id). \
+    order_by(ArtistRecommendation.kind, ArtistRecommendation.rank).all()
+  related = {'venue': [], 'genre': []}
+  for row in rows:
+    related[row.kind].append({
+      "artist_id": row.id,
+      "artist_name": row.name,
+      "artist_image_link": row.image_link,
+    })
+  return related
+
+@fyyur.cli.group()
+def recommendations():
+  """Maintain the related artists shown on artist pages."""
+
+@recommendations.command('build')
+@click.option('--full', is_flag=True, help='Recompute every artist, not only those changed since the last build.')
+@click.option('--top-k', default=RELATED_ARTISTS, show_default=True, help='Related artists kept per artist and kind.')
+@click.option('--batch-size', default=RECOMMENDATION_BATCH_SIZE, show_default=True)
+def build_recommendations_command(full, top_k, batch_size):
+  """Recompute related artists (needs numpy and scipy)."""
+  started = time.time()
+  count = build_recommendations(full, top_k, batch_size,
+    progress=lambda done, total: click.echo('{}/{} artists'.format(done, total), err=True))
+  pages_shared_with_workers()
+  click.echo('Updated related artists of {} artists in {:.1f}s.'.format(count, time.time() - started))
+
+#----------------------------------------------------------------------------#
+# Analytics.
+#----------------------------------------------------------------------------#
+
+# /analytics reads monthly rollups and never the Show table. `flask analytics
+# refresh` (run from cron) adds the shows inserted since its last run. It holds
+# a SHARE lock on Show, which waits for inserts in flight and holds back new
+# ones, so every id up to max(id) is committed and that max is a safe
+# high-water mark. Deleting a venue takes its shows back out of the rollups.
+# Rollups keep the city and genres a show had when it was added; `--full`
+# recomputes them after venues or artists are edited.
+
+ANALYTICS_WATERMARK = 'analytics'
+ANALYTICS_MONTHS = 12
+MAX_ANALYTICS_MONTHS = 120
+ANALYTICS_TOP_VENUES = 25
+
+ROLLUPS = (
+  '''INSERT INTO "AreaMonthRollup" (city, state, month, shows)
+  SELECT v.city, v.state, date_trunc('month', s.start_time)::date, :sign * count(*)
+  FROM "Show" s JOIN "Venue" v ON v.id = s.venue_id
+  WHERE {where}
+  GROUP BY 1, 2, 3
+  ON CONFLICT (city, state, month) DO UPDATE SET shows = "AreaMonthRollup".shows + excluded.shows''',
+  '''INSERT INTO "GenreMonthRollup" (genre, month, shows)
+  SELECT g.genre, date_trunc('month', s.start_time)::date, :sign * count(*)
+  FROM "Show" s JOIN "Artist" a ON a.id = s.artist_id CROSS JOIN LATERAL unnest(a.genres) AS g (genre)
+  WHERE {where}
+  GROUP BY 1, 2
+  ON CONFLICT (genre, month) DO UPDATE SET shows = "GenreMonthRollup".shows + excluded.shows''',
+  '''INSERT INTO "VenueMonthRollup" (venue_id, month, shows, booked_minutes)
+  SELECT s.venue_id, date_trunc('month', s.start_time)::date, :sign * count(*), :sign * sum(s.duration_minutes)
+  FROM "Show" s
+  WHERE {where}
+  GROUP BY 1, 2
+  ON CONFLICT (venue_id, month) DO UPDATE SET shows = "VenueMonthRollup".shows + excluded.shows,
+    booked_minutes = "VenueMonthRollup".booked_minutes + excluded.booked_minutes''',
+)
+ROLLUP_MODELS = (AreaMonthRollup, GenreMonthRollup, VenueMonthRollup)
+
+def shift_rollups(sign, where, **params):
+  for statement in ROLLUPS:
+    db.session.execute(statement.format(where=where), dict(params, sign=sign))
+  if sign < 0:
+    for model in ROLLUP_MODELS:
+      db.session.query(model).filter(model.shows <= 0).delete(synchronize_session=False)
+
+def refresh_rollups(full=False):
+  """Adds shows inserted since the last refresh (all shows if `full`); returns how many."""
+  db.session.execute('LOCK TABLE "Show" IN SHARE MODE')
+  watermark = None if full else get_watermark(ANALYTICS_WATERMARK)
+  if full:
+    for model in ROLLUP_MODELS:
+      db.session.query(model).delete(synchronize_session=False)
+  after = watermark.position if watermark else 0
+  upto = max(db.session.query(db.func.max(Show.id)).scalar() or 0, after)
+  added = db.session.query(db.func.count(Show.id)).filter(Show.id > after, Show.id <= upto).scalar()
+  if added:
+    shift_rollups(1, 's.id > :after AND s.id <= :upto', after=after, upto=upto)
+  set_watermark(ANALYTICS_WATERMARK, datetime.utcnow(), upto)
+  db.session.commit()
+  return added
+
+def release_rollups(show_fk, owner_ids):
+  # call before deleting the venues' (or artists') shows; only shows already rolled
+  # up come out. ROW EXCLUSIVE conflicts with the refresh's SHARE lock, so the two
+  # take turns.
+  db.session.execute('LOCK TABLE "Show" IN ROW EXCLUSIVE MODE')
+  watermark = get_watermark(ANALYTICS_WATERMARK)
+  if watermark is not None and owner_ids:
+    shift_rollups(-1, 's.{} = ANY(:owner_ids) AND s.id <= :upto'.format(show_fk.name),
+      owner_ids=list(owner_ids), upto=watermark.position)
+
+def month_start(day, months_back=0):
+  index = day.year * 12 + day.month - 1 - months_back
+  return date(index // 12, index % 12 + 1, 1)
+
+def month_minutes(month):
+  return calendar.monthrange(month.year, month.month)[1] * 24 * 60
+
+def analytics(months=ANALYTICS_MONTHS, today=None):
+  # the last `months` months of every rollup, oldest first; utilization is the
+  # share of the month's minutes the venue had a show on
+  first = month_start(today or date.today(), months - 1)
+  areas = AreaMonthRollup.query.filter(AreaMonthRollup.month >= first). \
+    order_by(AreaMonthRollup.month, AreaMonthRollup.state, AreaMonthRollup.city).all()
+  genres = GenreMonthRollup.query.filter(GenreMonthRollup.month >= first). \
+    order_by(GenreMonthRollup.month, GenreMonthRollup.genre).all()
+  top = db.session.query(VenueMonthRollup.venue_id, db.func.sum(VenueMonthRollup.booked_minutes).label('booked')). \
+    filter(VenueMonthRollup.month >= first).group_by(VenueMonthRollup.venue_id). \
+    order_by(db.desc('booked'), VenueMonthRollup.venue_id).limit(ANALYTICS_TOP_VENUES).subquery()
+  venues = db.session.query(Venue.id, Venue.name, VenueMonthRollup.month, VenueMonthRollup.shows,
+    VenueMonthRollup.booked_minutes).join(top, top.c.venue_id == Venue.id). \
+    join(VenueMonthRollup, VenueMonthRollup.venue_id == Venue.id).filter(VenueMonthRollup.month >= first). \
+    order_by(top.c.booked.desc(), Venue.id, VenueMonthRollup.month).all()
+  watermark = get_watermark(ANALYTICS_WATERMARK)
+  return {
+    "since": first.isoformat(),
+    "refreshed_at": watermark.value.isoformat() + 'Z' if watermark else None,
+    "areas": [{"city": row.city, "state": row.state, "month": row.month.isoformat(), "shows": row.shows}
+      for row in areas],
+    "genres": [{"genre": row.genre, "month": row.month.isoformat(), "shows": row.shows} for row in genres],
+    "venues": [{
+      "venue_id": row.id,
+      "venue_name": row.name,
+      "month": row.month.isoformat(),
+      "shows": row.shows,
+      "booked_minutes": row.booked_minutes,
+      "utilization": round(row.booked_minutes / month_minutes(row.month), 4),
+    } for row in venues],
+  }
+
+@fyyur.cli.group('analytics')
+def analytics_commands():
+  """Maintain the /analytics rollups."""
+
+@analytics_commands.command('refresh')
+@click.option('--full', is_flag=True, help='Recompute the rollups from every show.')
+def refresh_rollups_command(full):
+  """Add shows inserted since the last refresh to the rollups (run from cron)."""
+  click.echo('Rolled up {} shows.'.format(refresh_rollups(full)))
+
+#----------------------------------------------------------------------------#
+# Partitions.
+#----------------------------------------------------------------------------#
+
+# Show is range-partitioned by month of start_time, so queries for upcoming
+# shows (start_time >= now) only read the current and future months. Shows
+# outside every monthly partition land in Show_default. `flask partitions
+# maintain` (run monthly from cron) creates the months ahead, moves anything in
+# Show_default into its month, and can detach old months as ShowArchive_YYYY_MM
+# tables, which pages, exports and counters no longer see.
+
+SHOW_PARTITIONS_AHEAD = 12
+
+def show_partition_name(month, prefix='Show'):
+  return '{}_{:%Y_%m}'.format(prefix, month)
+
+def show_partition_months():
+  # months that have an attached partition
+  names = db.session.execute(
+    'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+    'WHERE i.inhparent = \'"Show"\'::regclass').fetchall()
+  return sorted(datetime.strptime(name, 'Show_%Y_%m').date() for name, in names if name != 'Show_default')
+
+def create_show_partition(month):
+  # Show_default can't keep rows a new partition would cover, so they are moved
+  # into it in the same transaction
+  bounds = {'start': month, 'end': month_start(month, -1)}
+  in_range = 'start_time >= :start AND start_time < :end'
+  moved = db.session.execute(db.text('SELECT count(*) FROM "Show_default" WHERE ' + in_range), bounds).scalar()
+  if moved:
+    # the shows' reservations and tickets would go with them (ON DELETE CASCADE), so they are kept aside too
+    for table in ('Reservation', 'Ticket'):
+      db.session.execute(db.text('CREATE TEMPORARY TABLE "{0}_moved" ON COMMIT DROP AS SELECT * FROM "{0}" '
+        'WHERE (show_id, show_start_time) IN (SELECT id, start_time FROM "Show_default" WHERE {1})'.format(
+        table, in_range)), bounds)
+    db.session.execute('CREATE TEMPORARY TABLE show_moved (LIKE "Show_default") ON COMMIT DROP')
+    db.session.execute(db.text('WITH moved AS (DELETE FROM "Show_default" WHERE {} RETURNING *) '
+      'INSERT INTO show_moved SELECT * FROM moved'.format(in_range)), bounds)
+  db.session.execute('CREATE TABLE "{}" PARTITION OF "Show" FOR VALUES FROM (\'{:%Y-%m-%d}\') TO (\'{:%Y-%m-%d}\')'.format(
+    show_partition_name(month), bounds['start'], bounds['end']))
+  if moved:
+    db.session.execute('INSERT INTO "Show" SELECT * FROM show_moved')
+    for table in ('Reservation', 'Ticket'):
+      db.session.execute('INSERT INTO "{0}" SELECT * FROM "{0}_moved"'.format(table))
+  db.session.commit()
+  return moved
+
+def maintain_show_partitions(ahead=SHOW_PARTITIONS_AHEAD, archive_before=None, today=None):
+  """Returns the months created and the months archived."""
+  today = today or date.today()
+  existing = set(show_partition_months())
+  wanted = {month_start(today, -i) for i in range(ahead + 1)}
+  wanted.update(row[0] for row in db.session.execute(
+    'SELECT DISTINCT date_trunc(\'month\', start_time)::date FROM "Show_default"'))
+  created = sorted(wanted - existing)
+  for month in created:
+    create_show_partition(month)
+
+  archived = []
+  if archive_before is not None:
+    cutoff = month_start(today, archive_before)
+    archived = [month for month in sorted(existing) if month < cutoff]
+    for month in archived:
+      # the archived shows leave the venue and artist pages and the exports
+      in_month = db.and_(Show.start_time >= month, Show.start_time < month_start(month, -1))
+      venue_ids, artist_ids = [[owner_id for (owner_id,) in db.session.query(show_fk).filter(in_month).distinct()]
+        for show_fk in (Show.venue_id, Show.artist_id)]
+      touch(Venue, venue_ids)
+      touch(Artist, artist_ids)
+      # tickets can't point into a detached table; an archived show's sales go with its pages
+      for table in ('Ticket', 'Reservation'):
+        db.session.execute(db.text('DELETE FROM "{}" WHERE show_start_time >= :start AND show_start_time < :end'.format(
+          table)), {'start': month, 'end': month_start(month, -1)})
+      db.session.execute('ALTER TABLE "Show" DETACH PARTITION "{}"'.format(show_partition_name(month)))
+      db.session.execute('ALTER TABLE "{}" RENAME TO "{}"'.format(
+        show_partition_name(month), show_partition_name(month, 'ShowArchive')))
+      db.session.commit()
+      invalidate_pages(venue_ids, artist_ids)
+  return created, archived
+
+@fyyur.cli.group()
+def partitions():
+  """Maintain the monthly partitions of the Show table."""
+
+@partitions.command('maintain')
+@click.option('--ahead', default=SHOW_PARTITIONS_AHEAD, show_default=True, help='Months to create ahead of this one.')
+@click.option('--archive-before', type=click.IntRange(min=1), default=None,
+  help='Detach the months that ended more than this many months ago.')
+def maintain_partitions_command(ahead, archive_before):
+  """Create upcoming monthly partitions and optionally archive old ones (run monthly)."""
+  created, archived = maintain_show_partitions(ahead, archive_before)
+  for month in created:
+    click.echo('Created {}'.format(show_partition_name(month)))
+  for month in archived:
+    click.echo('Archived {} as {}'.format(show_partition_name(month), show_partition_name(month, 'ShowArchive')))
+  click.echo('{} partitions created, {} archived.'.format(len(created), len(archived)))
+
+#----------------------------------------------------------------------------#
+# Bulk delete.
+#----------------------------------------------------------------------------#
+
+# Venues and artists are deleted with one set-based DELETE per batch, and the
+# database's ON DELETE CASCADE removes their shows, recommendations and rollup
+# rows without loading them. Each batch is its own short transaction, so locks
+# are held for one batch at a time. Counters, rollups and pages that count
+# or list the deleted shows are released or invalidated along with them.
+
+DELETE_BATCH_SIZE = 100
+MAX_BULK_DELETE = 10000
+
+DELETABLE = {
+  # kind: (model, its show column, the model on the other side of its shows, that column)
+  'venues': (Venue, Show.venue_id, Artist, Show.artist_id),
+  'artists': (Artist, Show.artist_id, Venue, Show.venue_id),
+}
+
+def delete_batch(kind, ids):
+  # deletes one batch and returns (deleted ids, ids on the other side of their shows)
+  model, show_fk, partner, partner_fk = DELETABLE[kind]
+  try:
+    partner_ids = [partner_id for (partner_id,) in
+      db.session.query(partner_fk).filter(show_fk.in_(ids)).distinct()]
+    release_upcoming_shows(show_fk.in_(ids))
+    release_rollups(show_fk, ids)
+    touch(partner, partner_ids)
+    deleted = [row[0] for row in db.session.execute(
+      'DELETE FROM "{}" WHERE id = ANY(:ids) RETURNING id'.format(model.__tablename__), {'ids': list(ids)})]
+    db.session.commit()
+  except:
+    db.session.rollback()
+    raise
+  return sorted(deleted), partner_ids
+
+def delete_rows(kind, ids, batch_size=DELETE_BATCH_SIZE, progress=None):
+  """Deletes venues or artists by id; returns the ids that existed."""
+  model = DELETABLE[kind][0]
+  ids = sorted(set(ids))
+  deleted = []
+  for done, batch in enumerate(batched(ids, batch_size), 1):
+    gone, partner_ids = delete_batch(kind, batch)
+    deleted.extend(gone)
+    if kind == 'venues':
+      invalidate_pages(venue_ids=gone, artist_ids=partner_ids)
+    else:
+      invalidate_pages(artist_ids=gone, venue_ids=partner_ids)
+    unindex_names(kind, gone)
+    if progress:
+      progress(min(done * batch_size, len(ids)), len(ids), len(deleted))
+  if deleted:
+    invalidate_genre_counts(model)
+  return deleted
+
+@fyyur.cli.command('delete')
+@click.argument('kind', type=click.Choice(sorted(DELETABLE)))
+@click.argument('ids', nargs=-1, type=int)
+@click.option('--ids-from', type=click.File(), help='Read ids, one per line, from a file ("-" for stdin).')
+@click.option('--batch-size', default=DELETE_BATCH_SIZE, show_default=True)
+def delete_command(kind, ids, ids_from, batch_size):
+  """Delete venues or artists, with their shows, by id."""
+  ids = list(ids)
+  if ids_from:
+    ids.extend(int(line) for line in ids_from if line.strip())
+  deleted = delete_rows(kind, ids, batch_size,
+    progress=lambda done, total, count: click.echo('{}/{} ids, {} deleted'.format(done, total, count), err=True))
+  if pages_shared_with_workers():
+    page_cache.clear()
+  click.echo('Deleted {} of {} {}.'.format(len(deleted), len(set(ids)), kind))
+
+#----------------------------------------------------------------------------#
+# Tickets.
+#----------------------------------------------------------------------------#
+
+# Every seat of a show is a Ticket row, made when its capacity is set. A buyer
+# claims free seats with SELECT ... FOR UPDATE SKIP LOCKED, so hundreds of
+# concurrent buyers of one show each take different rows instead of queueing
+# on a shared counter, and a seat can never be in two holds. Nothing locks the
+# Show row. A hold lasts TICKET_HOLD_SECONDS; once it has passed the seats are
+# free again without any cleanup, and `flask tickets expire` only deletes the
+# reservation rows nobody confirmed.
+
+MAX_TICKETS_PER_RESERVATION = 10
+EXPIRE_BATCH_SIZE = 1000
+
+FREE_SEAT = '(reservation_id IS NULL OR held_until < :now)'
+
+CLAIM_SEATS = db.text('''
+  WITH claimed AS (
+    SELECT id FROM "Ticket"
+    WHERE show_id = :show_id AND {}
+    ORDER BY seat
+    LIMIT :quantity
+    FOR UPDATE SKIP LOCKED)
+  UPDATE "Ticket" SET reservation_id = :reservation_id, held_until = :expires_at
+  FROM claimed WHERE "Ticket".id = claimed.id
+  RETURNING "Ticket".seat'''.format(FREE_SEAT))
+
+class TicketError(ValueError):
+  # the message is safe to show to the buyer
+  pass
+
+def on_sale_show(show_id):
+  # Show's primary key is (id, start_time), so look it up by id alone
+  return Show.query.filter(Show.id == show_id).first()
+
+def set_show_capacity(show, capacity):
+  """Adds seats up to `capacity` or removes free seats above it; the caller commits."""
+  db.session.execute(db.text('''INSERT INTO "Ticket" (show_id, show_start_time, seat)
+    SELECT :show_id, :start_time, seat FROM generate_series(1, :capacity) AS seat
+    ON CONFLICT (show_id, seat) DO NOTHING'''), {'show_id': show.id, 'start_time': show.start_time, 'capacity': capacity})
+  above = {'show_id': show.id, 'capacity': capacity, 'now': datetime.utcnow()}
+  taken = db.session.execute(db.text('SELECT count(*) FROM "Ticket" WHERE show_id = :show_id AND seat > :capacity '
+    'AND NOT ' + FREE_SEAT), above).scalar()
+  if taken:
+    raise TicketError('{} seats above {} are held or sold.'.format(taken, capacity))
+  db.session.execute(db.text('DELETE FROM "Ticket" WHERE show_id = :show_id AND seat > :capacity'), above)
+  show.capacity = capacity
+
+def ticket_counts(show, now=None):
+  now = now or datetime.utcnow()
+  row = db.session.execute(db.text('''SELECT
+      count(*) FILTER (WHERE {}) AS available,
+      count(*) FILTER (WHERE reservation_id IS NOT NULL AND held_until >= :now) AS held,
+      count(*) FILTER (WHERE reservation_id IS NOT NULL AND held_until IS NULL) AS sold
+    FROM "Ticket" WHERE show_id = :show_id'''.format(FREE_SEAT)), {'show_id': show.id, 'now': now}).first()
+  return {"show_id": show.id, "capacity": show.capacity or 0,
+          "available": row.available, "held": row.held, "sold": row.sold}
+
+def reserve_tickets(show_id, quantity, now=None):
+  """Holds `quantity` seats of a show, all or none; returns (reservation, seats)."""
+  now = now or datetime.utcnow()
+  show = on_sale_show(show_id)
+  if show is None or not show.capacity:
+    raise TicketError('This show has no tickets for sale.')
+  if show.start_time <= datetime.now():
+    raise TicketError('This show has already started.')
+  reservation = Reservation(show_id=show.id, show_start_time=show.start_time, quantity=quantity,
+    token=secrets.token_hex(16), created_at=now,
+    expires_at=now + timedelta(seconds=current_app.config['TICKET_HOLD_SECONDS']))
+  try:
+    db.session.add(reservation)
+    db.session.flush()
+    seats = sorted(row.seat for row in db.session.execute(CLAIM_SEATS, {
+      'show_id': show.id, 'quantity': quantity, 'now': now,
+      'reservation_id': reservation.id, 'expires_at': reservation.expires_at}))
+    if len(seats) < quantity:
+      # seats locked by other buyers right now count as taken; they may come back
+      db.session.rollback()
+      raise TicketError('Not enough tickets left.')
+    db.session.commit()
+  except SQLAlchemyError:
+    db.session.rollback()
+    raise
+  return reservation, seats
+
+def held_reservation(reservation_id, token):
+  reservation = Reservation.query.get(reservation_id)
+  if reservation is None or not secrets.compare_digest(reservation.token, token or ''):
+    abort(404)
+  return reservation
+
+def confirm_reservation(reservation, now=None):
+  """Turns a live hold into sold tickets; returns the seats."""
+  now = now or datetime.utcnow()
+  if reservation.confirmed_at is not None:
+    return sorted(seat for seat, in db.session.query(Ticket.seat).filter(Ticket.reservation_id == reservation.id))
+  # a seat whose hold ran out may already be someone else's; its row no longer matches
+  seats = sorted(row.seat for row in db.session.execute(db.text(
+    'UPDATE "Ticket" SET held_until = NULL WHERE reservation_id = :id AND held_until >= :now RETURNING seat'),
+    {'id': reservation.id, 'now': now}))
+  if len(seats) < reservation.quantity:
+    db.session.rollback()
+    raise TicketError('The hold on these tickets has expired.')
+  reservation.confirmed_at = now
+  db.session.commit()
+  return seats
+
+def release_reservation(reservation):
+  # gives back an unconfirmed hold before it expires
+  # ON DELETE SET NULL alone would leave held_until set, so the seats are freed here first;
+  # a confirm that got there first has cleared held_until and wins
+  db.session.execute(db.text('UPDATE "Ticket" SET reservation_id = NULL, held_until = NULL '
+    'WHERE reservation_id = :id AND held_until IS NOT NULL'), {'id': reservation.id})
+  released = db.session.execute(db.text('DELETE FROM "Reservation" WHERE id = :id AND confirmed_at IS NULL'),
+    {'id': reservation.id}).rowcount
+  if not released:
+    db.session.rollback()
+    raise TicketError('These tickets are already sold.')
+  db.session.commit()
+
+def expire_reservations(now=None, batch_size=EXPIRE_BATCH_SIZE):
+  """Deletes unconfirmed reservations past their hold; returns how many."""
+  now = now or datetime.utcnow()
+  deleted = 0
+  while True:
+    count = db.session.execute(db.text('''DELETE FROM "Reservation" WHERE id IN (
+      SELECT id FROM "Reservation" WHERE confirmed_at IS NULL AND expires_at < :now LIMIT :limit)'''),
+      {'now': now, 'limit': batch_size}).rowcount
+    db.session.commit()
+    deleted += count
+    if count < batch_size:
+      return deleted
+
+@fyyur.cli.group('tickets')
+def ticket_commands():
+  """Show capacity and ticket holds."""
+
+@ticket_commands.command('capacity')
+@click.argument('show_id', type=int)
+@click.argument('capacity', type=click.IntRange(min=0))
+def set_capacity_command(show_id, capacity):
+  """Put a show's tickets on sale, or change how many there are."""
+  show = on_sale_show(show_id)
+  if show is None:
+    raise click.ClickException('No show {}.'.format(show_id))
+  try:
+    set_show_capacity(show, capacity)
+  except TicketError as e:
+    db.session.rollback()
+    raise click.ClickException(str(e))
+  db.session.commit()
+  counts = ticket_counts(show)
+  click.echo('Show {}: {capacity} seats, {available} available, {held} held, {sold} sold.'.format(show_id, **counts))
+
+@ticket_commands.command('expire')
+def expire_reservations_command():
+  """Delete unconfirmed reservations whose hold has passed (run from cron)."""
+  click.echo('Deleted {} expired reservations.'.format(expire_reservations()))
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+# `flask assets build` writes content-hashed copies of static/ into ASSETS_DIR.
+# Templates link files through asset_url(), which names the copy once a build
+# exists; a copy's content never changes, so browsers may keep it for a year.
+
+@fyyur.app_template_global()
+def asset_url(name):
+  hashed = current_app.extensions['assets'].files.get(name)
+  if hashed is None:
+    return url_for('static', filename=name)
+  return url_for('fyyur.asset', filename=hashed)
+
+@fyyur.app_template_global()
+def asset_urls(name):
+  # a bundle's one url after a build, its source files' urls before
+  return [asset_url(source) for source in current_app.extensions['assets'].urls(name)]
+
+@fyyur.route('/assets/<path:filename>')
+def asset(filename):
+  manifest = current_app.extensions['assets']
+  encodings = manifest.encodings.get(filename)
+  if encodings is None:
+    abort(404)
+  mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+  encoding, suffix = next(((encoding, suffix) for encoding, suffix in ENCODINGS
+    if encoding in encodings and request.accept_encodings.quality(encoding) > 0), (None, ''))
+  response = send_from_directory(manifest.directory, filename + suffix, mimetype=mimetype, conditional=True)
+  if encoding:
+    response.headers['Content-Encoding'] = encoding
+  if encodings:
+    response.vary.add('Accept-Encoding')
+  response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(current_app.config['ASSET_MAX_AGE'])
+  return response
+
+@fyyur.cli.group('assets')
+def asset_commands():
+  """Fingerprinted, precompressed static files."""
+
+@asset_commands.command('build')
+@click.option('--clean', is_flag=True, help='Remove the files of earlier builds. Pages rendered '
+  'before the deploy still link them, so only clean once those are gone.')
+def build_assets_command(clean):
+  """Build the static files into ASSETS_DIR; restart the app afterwards."""
+  build = AssetBuild(current_app.static_folder, current_app.config['ASSETS_DIR'])
+  manifest = build.run()
+  for bundle in sorted(manifest['files']):
+    if bundle.startswith('bundles/'):
+      sizes = build.sizes[bundle]
+      click.echo('{:<20} {:>9} bytes, gzip {:>8}, br {:>8}'.format(
+        manifest['files'][bundle], sizes['raw'], sizes.get('gzip', '-'), sizes.get('br', '-')))
+  click.echo('Built {} files into {}'.format(len(manifest['files']), build.out_dir))
+  if clean:
+    click.echo('Removed {} old files.'.format(build.clean()))
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
+def datetime_formatter(format='medium'):
+  return get_formatter(format, current_app.config['BABEL_DEFAULT_LOCALE'], current_app.config['DISPLAY_TIMEZONE'])
+
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+  return datetime_formatter(format)(value)
+
+def format_show_times(shows, format='full'):
+  # formats the start_time of a whole list of show dicts with one compiled pattern
+  return format_rows(shows, datetime_formatter(format))
+
+@fyyur.app_template_filter('datetime')
+def datetime_filter(value, format='medium'):
+  return format_datetime(value, format)
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+PAST_SHOWS_PER_PAGE = 12
+SHOWS_PER_PAGE = 30
+MAX_SHOWS_PER_PAGE = 100
+CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+def encode_cursor(start_time, show_id):
+  return '{}-{}'.format(start_time.strftime(CURSOR_TIME_FORMAT), show_id)
+
+def decode_cursor(cursor):
+  # keyset cursors look like '20201218124117094762-42' -> (start_time, show id)
+  if not cursor:
+    return None
+  try:
+    start_time, show_id = cursor.split('-')
+    return datetime.strptime(start_time, CURSOR_TIME_FORMAT), int(show_id)
+  except ValueError:
+    abort(400)
+
+def parse_date(value):
+  return datetime.strptime(value, '%Y-%m-%d')
+
+def stream_template(template_name, **context):
+  # renders the template chunk by chunk so the response starts before every row is fetched
+  current_app.update_template_context(context)
+  template = current_app.jinja_env.get_template(template_name)
+  stream = template.stream(context)
+  stream.enable_buffering(5)
+  return stream
+
+def show_partitions(show_fk, owner_id, other, before=None, per_page=PAST_SHOWS_PER_PAGE, now=None):
+  # Splits the shows of one venue (or artist) against a single `now` snapshot in one
+  # statement: every upcoming show plus one keyset page of past shows, newest first.
+  # Shows starting exactly at `now` count as upcoming.
+  now = now or datetime.now()
+  past_count = db.select([db.func.count(Show.id)]). \
+    where(db.and_(show_fk == owner_id, Show.start_time < now)).correlate(None).as_scalar()
+
+  def partition(upcoming):
+    return db.session.query(
+      other.id, other.name, other.image_link,
+      Show.id.label('show_id'), Show.start_time,
+      db.literal(upcoming, db.Boolean).label('upcoming'),
+      past_count.label('past_count')).join(Show).filter(show_fk == owner_id)
+
+  upcoming_query = partition(True).filter(Show.start_time >= now)
+  past_query = partition(False).filter(Show.start_time < now)
+  if before is not None:
+    past_query = past_query.filter(db.tuple_(Show.start_time, Show.id) < before)
+  past_query = past_query.order_by(Show.start_time.desc(), Show.id.desc()).limit(per_page + 1)
+  rows = upcoming_query.union_all(past_query).all()
+
+  upcoming = sorted((row for row in rows if row.upcoming), key=lambda row: (row.start_time, row.show_id))
+  past = [row for row in rows if not row.upcoming]
+  next_cursor = None
+  if len(past) > per_page:
+    past = past[:per_page]
+    next_cursor = encode_cursor(past[-1].start_time, past[-1].show_id)
+
+  if rows:
+    past_shows_count = rows[0].past_count
+  else:
+    past_shows_count = db.session.query(past_count).scalar()
+  return upcoming, past, past_shows_count, next_cursor
+
+def has_genre(model, genre):
+  # genres @> ARRAY[genre]::varchar[], which the GIN index on genres serves
+  return model.genres.op('@>')(db.cast([genre], db.ARRAY(db.String)))
+
+def genre_counts(model):
+  # {genre: number of venues (or artists)} from one grouped query, cached until the next write
+  key = model.__tablename__
+  cached = page_cache.get('genres', key)
+  if cached is not None:
+    return json.loads(cached)
+  genres = db.session.query(db.func.unnest(model.genres).label('genre')).subquery()
+  counts = dict(db.session.query(genres.c.genre, db.func.count()). \
+    group_by(genres.c.genre).order_by(genres.c.genre).all())
+  page_cache.set('genres', key, json.dumps(counts))
+  return counts
+
+def utc(value):
+  # start times are naive server-local datetimes (see DISPLAY_TIMEZONE in config.py), updated_at columns are naive UTC
+  return datetime.utcfromtimestamp(value.timestamp())
+
+def detail_validator(model, owner_id, show_fk, other, other_fk):
+  # one aggregate over the rows a detail payload is built from; its result changes
+  # whenever the payload does, including when an upcoming show starts
+  now = datetime.now()
+  row = db.session.query(
+    model.updated_at,
+    db.func.max(Show.updated_at),
+    db.func.max(other.updated_at),
+    db.func.max(Show.start_time).filter(Show.start_time < now),
+    db.func.count(Show.id)). \
+    outerjoin(Show, show_fk == model.id).outerjoin(other, other.id == other_fk). \
+    filter(model.id == owner_id).group_by(model.id).first()
+  if row is None:
+    abort(404)
+  updated_at, shows_updated_at, others_updated_at, last_started, show_count = row
+  return aggregate_validator(row, updated_at, shows_updated_at, others_updated_at, last_started and utc(last_started))
+
+def aggregate_validator(row, *timestamps):
+  # (strong etag, last modified) from an aggregate row that changes whenever the response would
+  last_modified = max((value for value in timestamps if value), default=None)
+  etag = hashlib.sha1(repr((request.full_path, tuple(row))).encode('utf-8')).hexdigest()
+  return etag, last_modified
+
+def is_fresh(etag, last_modified):
+  if request.if_none_match:
+    return request.if_none_match.contains(etag)
+  if request.if_modified_since and last_modified:
+    return last_modified.replace(microsecond=0) <= request.if_modified_since
+  return False
+
+def conditional(validator, respond):
+  # a current client copy gets a 304 before respond() runs the real queries
+  etag, last_modified = validator
+  if is_fresh(etag, last_modified):
+    response = Response(status=304)
+  else:
+    response = respond()
+  response.set_etag(etag)
+  if last_modified:
+    response.last_modified = last_modified
+  return response
+
+def page_is_cacheable():
+  # only the first page of a detail view is cached, and never one that shows flashed messages
+  return not request.args and '_flashes' not in session
+
+def invalidate_pages(venue_ids=(), artist_ids=()):
+  page_cache.invalidate('venue', *venue_ids)
+  page_cache.invalidate('artist', *artist_ids)
+
+def touch(model, ids):
+  # moves Last-Modified forward for rows whose payload changed without a column write,
+  # e.g. an artist whose past shows went away with a deleted venue
+  if ids:
+    db.session.query(model).filter(model.id.in_(ids)). \
+      update({model.updated_at: datetime.utcnow()}, synchronize_session=False)
+
+def invalidate_genre_counts(model):
+  page_cache.invalidate('genres', model.__tablename__)
 
-app.jinja_env.filters['datetime'] = format_datetime
+def show_partners(show_fk, owner_id, partner_fk):
+  # ids on the other side of a venue's (or artist's) shows, whose pages list it
+  return [partner_id for (partner_id,) in
+    db.session.query(partner_fk).filter(show_fk == owner_id).distinct()]
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@fyyur.route('/')
 def index():
   return render_template('pages/home.html')
 
@@ -101,79 +1419,61 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
-def venues():
-  cities = Venue.query.distinct(Venue.city, Venue.state).all()
+def venue_areas():
+  # one statement: every venue with its maintained upcoming show counter, ordered by area
+  rows = db.session.query(
+    Venue.city, Venue.state, Venue.id, Venue.name, Venue.upcoming_shows_count.label('num_upcoming_shows')). \
+    order_by(Venue.state, Venue.city, Venue.id).all()
+
   data = []
-  
-  for city in cities:
-    venues_query = Venue.query.filter(Venue.city == city.city, Venue.state == city.state).all()
-    venues = []
-    for venue in venues_query:
-      upcoming_shows = Show.query.filter(Show.venue_id == venue.id, Show.start_time > datetime.now())
-      venues.append({
+  for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+    data.append({
+      "city": city,
+      "state": state,
+      "venues": [{
         "id": venue.id,
         "name": venue.name,
-        "num_upcoming_shows": upcoming_shows.count()
-      })
-    data.append({
-      "city": city.city,
-      "state": city.state,
-      "venues": venues
+        "num_upcoming_shows": venue.num_upcoming_shows
+      } for venue in venues]
     })
-  return render_template('pages/venues.html', areas=data);
+  return data
 
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-  search_term = request.form.get('search_term', '')
-  venues = Venue.query.filter(Venue.name.ilike('%' + search_term + '%')).all()
-  data = []
-  
-  for venue in venues:
-    num_upcoming_shows = Show.query.filter(
-      Show.venue_id == venue.id, Show.start_time > datetime.now()).count()
-    data.append({
-      "id": venue.id,
-      "name": venue.name,
-      "num_upcoming_shows": num_upcoming_shows
-    })
+@fyyur.route('/venues')
+def venues():
+  return render_template('pages/venues.html', areas=venue_areas())
 
-  response = {
-    "count": len(venues),
-    "data": data
-  }
+@fyyur.route('/venues/search', methods=['GET', 'POST'])
+def search_venues():
+  search_term = request.values.get('search_term', '')
+  page = request.args.get('page', 1, type=int)
+  response = search(db.session, Venue, search_term, page=page)
   return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # shows the venue page with the given venue_id
+def venue_detail(venue_id, before=None):
+  # the venue page data, with native datetimes; 404s for unknown ids
   venue = Venue.query.filter_by(id=venue_id).first_or_404()
-  past_shows_query = db.session.query(
-    Artist.id, Artist.name, Artist.image_link, Show.start_time). \
-    join(Show).filter(Show.venue_id == venue_id, Show.start_time < datetime.now()).all()
-  upcoming_shows_query = db.session.query(
-    Artist.id, Artist.name, Artist.image_link, Show.start_time). \
-    join(Show).filter(Show.venue_id == venue_id, Show.start_time > datetime.now()).all()
+  upcoming_rows, past_rows, past_shows_count, past_cursor = show_partitions(
+    Show.venue_id, venue_id, Artist, before=before)
 
   past_shows = []
-  for k in past_shows_query:
+  for k in past_rows:
     past_shows.append({
       "artist_id": k.id, 
       "artist_name": k.name,
       "artist_image_link": k.image_link,
-      "start_time": k.start_time.strftime("%m/%d/%Y, %H:%M")
+      "start_time": k.start_time
     })
 
   upcoming_shows = []
-  for k in upcoming_shows_query:
+  for k in upcoming_rows:
     upcoming_shows.append({
       "artist_id": k.id, 
       "artist_name": k.name,
       "artist_image_link": k.image_link,
-      "start_time": k.start_time.strftime("%m/%d/%Y, %H:%M")
+      "start_time": k.start_time
     })
 
-  data = {
+  return {
     "id": venue.id,
     "name": venue.name,
     "genres": venue.genres,
@@ -188,20 +1488,41 @@ def show_venue(venue_id):
     "image_link": venue.image_link,
     "past_shows": past_shows,
     "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
+    "past_shows_count": past_shows_count,
+    "past_shows_cursor": past_cursor,
     "upcoming_shows_count": len(upcoming_shows),
   }
-  return render_template('pages/show_venue.html', venue=data)
+
+@fyyur.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  cacheable = page_is_cacheable()
+  if cacheable:
+    page = page_cache.get('venue', venue_id)
+    if page is not None:
+      return page
+
+  data = venue_detail(venue_id, before=decode_cursor(request.args.get('before')))
+  # the page goes stale when its next upcoming show starts and becomes a past show
+  expires_at = data['upcoming_shows'][0]['start_time'] if data['upcoming_shows'] else None
+  format_show_times(data['past_shows'])
+  format_show_times(data['upcoming_shows'])
+
+  page = render_template('pages/show_venue.html', venue=data)
+  if cacheable:
+    page_cache.set('venue', venue_id, page, expires_at)
+  return page
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@fyyur.route('/venues/create', methods=['GET'])
 def create_venue_form():
+  from forms import VenueForm
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@fyyur.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   error = False
   try:
@@ -222,6 +1543,8 @@ def create_venue_submission():
     venue.seeking_description = request.form['seeking_description']
     db.session.add(venue)
     db.session.commit()
+    index_name('venues', venue.id, venue.name)
+    invalidate_genre_counts(Venue)
   except:
     error = True
     db.session.rollback()
@@ -233,23 +1556,17 @@ def create_venue_submission():
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
   return render_template('pages/home.html')
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@fyyur.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
-  try:
-    venue = Venue.query.get(venue_id)
-    db.session.delete(venue)
-    db.session.commit()
-  except:
-    db.session.rollback()
-  finally:
-    db.session.close()
-  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-  # clicking that button delete it from the db then redirect the user to the homepage
-  return None
+  # BONUS CHALLENGE: a delete button on the venue page can call this, then go
+  # back to the homepage
+  if not delete_rows('venues', [venue_id]):
+    abort(404)
+  return jsonify({"success": True})
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@fyyur.route('/artists')
 def artists():
   artists = Artist.query.all()
   data = []
@@ -261,57 +1578,38 @@ def artists():
     })
   return render_template('pages/artists.html', artists=data)
 
-@app.route('/artists/search', methods=['POST'])
+@fyyur.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
-  search_term = request.form.get('search_term', '')
-  artists = Artist.query.filter(Artist.name.ilike('%' + search_term + '%')).all()
-  data = []
-  
-  for artist in artists:
-    num_upcoming_shows = Show.query.filter(
-      Show.artist_id == artist.id, Show.start_time > datetime.now()).count()
-    data.append({
-      "id": artist.id,
-      "name": artist.name,
-      "num_upcoming_shows": num_upcoming_shows
-    })
-
-  response = {
-    "count": len(artists),
-    "data": data
-  }
+  search_term = request.values.get('search_term', '')
+  page = request.args.get('page', 1, type=int)
+  response = search(db.session, Artist, search_term, page=page)
   return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-  # shows the artist page with the given artist_id
+def artist_detail(artist_id, before=None):
+  # the artist page data, with native datetimes; 404s for unknown ids
   artist = Artist.query.filter_by(id=artist_id).first_or_404()
-  past_shows_query = db.session.query(
-    Venue.id, Venue.name, Venue.image_link, Show.start_time). \
-    join(Show).filter(Show.artist_id == artist_id, Show.start_time < datetime.now()).all()
-  upcoming_shows_query = db.session.query(
-    Venue.id, Venue.name, Venue.image_link, Show.start_time). \
-    join(Show).filter(Show.artist_id == artist_id, Show.start_time > datetime.now()).all()
+  upcoming_rows, past_rows, past_shows_count, past_cursor = show_partitions(
+    Show.artist_id, artist_id, Venue, before=before)
 
   past_shows = []
-  for k in past_shows_query:
+  for k in past_rows:
     past_shows.append({
       "venue_id": k.id, 
       "venue_name": k.name,
       "venue_image_link": k.image_link,
-      "start_time": k.start_time.strftime("%m/%d/%Y, %H:%M")
+      "start_time": k.start_time
     })
 
   upcoming_shows = []
-  for k in upcoming_shows_query:
+  for k in upcoming_rows:
     upcoming_shows.append({
       "venue_id": k.id, 
       "venue_name": k.name,
       "venue_image_link": k.image_link,
-      "start_time": k.start_time.strftime("%m/%d/%Y, %H:%M")
+      "start_time": k.start_time
     })
 
-  data = {
+  return {
     "id": artist.id,
     "name": artist.name,
     "genres": artist.genres,
@@ -325,31 +1623,118 @@ def show_artist(artist_id):
     "image_link": artist.image_link,
     "past_shows": past_shows,
     "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
+    "past_shows_count": past_shows_count,
+    "past_shows_cursor": past_cursor,
     "upcoming_shows_count": len(upcoming_shows),
   }
-  return render_template('pages/show_artist.html', artist=data)
+
+@fyyur.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  cacheable = page_is_cacheable()
+  if cacheable:
+    page = page_cache.get('artist', artist_id)
+    if page is not None:
+      return page
+
+  data = artist_detail(artist_id, before=decode_cursor(request.args.get('before')))
+  related = related_artists(artist_id)
+  data['played_same_venues'] = related['venue']
+  data['similar_genres'] = related['genre']
+  # the page goes stale when its next upcoming show starts and becomes a past show
+  expires_at = data['upcoming_shows'][0]['start_time'] if data['upcoming_shows'] else None
+  format_show_times(data['past_shows'])
+  format_show_times(data['upcoming_shows'])
+
+  page = render_template('pages/show_artist.html', artist=data)
+  if cacheable:
+    page_cache.set('artist', artist_id, page, expires_at)
+  return page
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+# An edit is checked against the version of the row its form was rendered from
+# (a hidden field, or If-Match with the edit page's ETag), and only the fields
+# that differ from the stored row are written. The UPDATE also matches on the
+# version it loaded, so an edit committed in between is caught as well.
+
+EDIT_FIELDS = {
+  'venues': ('name', 'city', 'state', 'address', 'phone', 'genres', 'facebook_link'),
+  'artists': ('name', 'city', 'state', 'phone', 'genres', 'facebook_link'),
+}
+
+def version_etag(record):
+  return 'v{}'.format(record.version)
+
+def edit_form_values(kind):
+  return {field: request.form.getlist(field) if field == 'genres' else request.form[field]
+    for field in EDIT_FIELDS[kind]}
+
+def edit_is_current(record):
+  # a form without a version (an old page or client) is taken as current
+  if request.if_match:
+    return request.if_match.contains(version_etag(record))
+  version = request.form.get('version', type=int)
+  return version is None or version == record.version
+
+def changed_fields(record, values):
+  # '' and None, and [] and None, are the same empty value
+  return {field: value for field, value in values.items() if (value or None) != (getattr(record, field) or None)}
+
+def save_edit(record, values):
+  # returns the changed fields; StaleDataError if the row changed after it was loaded
+  changed = changed_fields(record, values)
+  for field, value in changed.items():
+    setattr(record, field, value)
+  db.session.commit()
+  return changed
+
+def edit_page(kind, record, conflicts=None, status=200):
+  from forms import ArtistForm, VenueForm
+  form_class = VenueForm if kind == 'venues' else ArtistForm
+  # a conflict page keeps what the user typed; the table shows what is stored
+  form = form_class(formdata=request.form, obj=record) if conflicts else form_class(formdata=None, obj=record)
+  response = make_response(render_template('forms/edit_{}.html'.format(kind[:-1]), form=form,
+    conflicts=conflicts, version=record.version, **{kind[:-1]: record}), status)
+  response.set_etag(version_etag(record))
+  return response
+
+def edit_conflict(kind, record, values):
+  # 412 with the stored values for If-Match clients, 409 with the form for browsers;
+  # sending the form again overwrites, since it now carries the current version
+  current = {field: getattr(record, field) for field in EDIT_FIELDS[kind]}
+  if request.if_match:
+    response = jsonify({"error": "changed since your copy", "version": record.version, "current": current})
+    response.status_code = 412
+    response.set_etag(version_etag(record))
+    return response
+  conflicts = [{"field": field, "yours": value, "current": current[field]}
+    for field, value in values.items() if (value or None) != (current[field] or None)]
+  return edit_page(kind, record, conflicts, status=409)
+
+@fyyur.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-  artist = Artist.query.get(artist_id)
-  form = ArtistForm(obj=artist)
-  return render_template('forms/edit_artist.html', form=form, artist=artist)
+  return edit_page('artists', Artist.query.get_or_404(artist_id))
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@fyyur.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   error = False
-  artist = Artist.query.get(artist_id)
+  artist = Artist.query.get_or_404(artist_id)
+  values = edit_form_values('artists')
   try:
-    artist.name = request.form['name']
-    artist.city = request.form['city']
-    artist.state = request.form['state']
-    artist.phone = request.form['phone']
-    artist.genres = request.form.getlist('genres')
-    artist.facebook_link = request.form['facebook_link']
-    db.session.commit()
+    if not edit_is_current(artist):
+      return edit_conflict('artists', artist, values)
+    changed = save_edit(artist, values)
+    if 'name' in changed:
+      index_name('artists', artist_id, values['name'])
+    if changed:
+      invalidate_pages(artist_ids=[artist_id],
+        venue_ids=show_partners(Show.artist_id, artist_id, Show.venue_id))
+    if 'genres' in changed:
+      invalidate_genre_counts(Artist)
+  except StaleDataError:
+    db.session.rollback()
+    return edit_conflict('artists', Artist.query.get_or_404(artist_id), values)
   except:
     error = True
     db.session.rollback()
@@ -359,27 +1744,31 @@ def edit_artist_submission(artist_id):
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be updated.')
   else:
     flash('Artist ' + request.form['name'] + ' was successfully updated!')
-  return redirect(url_for('show_artist', artist_id=artist_id))
+  return redirect(url_for('fyyur.show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@fyyur.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-  venue = Venue.query.get(venue_id)
-  form = VenueForm(obj=venue)
-  return render_template('forms/edit_venue.html', form=form, venue=venue)
+  return edit_page('venues', Venue.query.get_or_404(venue_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@fyyur.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
-  venue = Venue.query.get(venue_id)
+  venue = Venue.query.get_or_404(venue_id)
+  values = edit_form_values('venues')
   error = False
   try:
-    venue.name = request.form['name']
-    venue.city = request.form['city']
-    venue.state = request.form['state']
-    venue.address = request.form['address']
-    venue.phone = request.form['phone']
-    venue.genres = request.form.getlist('genres')
-    venue.facebook_link = request.form['facebook_link']
-    db.session.commit()
+    if not edit_is_current(venue):
+      return edit_conflict('venues', venue, values)
+    changed = save_edit(venue, values)
+    if 'name' in changed:
+      index_name('venues', venue_id, values['name'])
+    if changed:
+      invalidate_pages(venue_ids=[venue_id],
+        artist_ids=show_partners(Show.venue_id, venue_id, Show.artist_id))
+    if 'genres' in changed:
+      invalidate_genre_counts(Venue)
+  except StaleDataError:
+    db.session.rollback()
+    return edit_conflict('venues', Venue.query.get_or_404(venue_id), values)
   except:
     error=True
     db.session.rollback()
@@ -389,17 +1778,18 @@ def edit_venue_submission(venue_id):
     flash('An error occurred. Venue ' + request.form['name'] + ' could not be updated.')
   else:
     flash('Venue ' + request.form['name'] + ' was successfully updated!')
-  return redirect(url_for('show_venue', venue_id=venue_id)) 
+  return redirect(url_for('fyyur.show_venue', venue_id=venue_id)) 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@fyyur.route('/artists/create', methods=['GET'])
 def create_artist_form():
+  from forms import ArtistForm
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@fyyur.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   error = False
   try:
@@ -419,6 +1809,8 @@ def create_artist_submission():
     artist.seeking_description = request.form['seeking_description']
     db.session.add(artist)
     db.session.commit()
+    index_name('artists', artist.id, artist.name)
+    invalidate_genre_counts(Artist)
   except:
     error = True
     db.session.rollback()
@@ -430,44 +1822,136 @@ def create_artist_submission():
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
   return render_template('pages/home.html')
 
+#  Genres
+#  ----------------------------------------------------------------
+
+GENRE_PAGE_SIZE = 20
+
+def genre_listing(model, genre, kind):
+  page = max(request.args.get('page', 1, type=int), 1)
+  counts = genre_counts(model)
+  rows = db.session.query(model.id, model.name).filter(has_genre(model, genre)). \
+    order_by(model.name, model.id).limit(GENRE_PAGE_SIZE).offset((page - 1) * GENRE_PAGE_SIZE).all()
+  return render_template('pages/genre.html', kind=kind, genre=genre, genres=counts,
+    count=counts.get(genre, 0), page=page, per_page=GENRE_PAGE_SIZE,
+    items=[{"id": row.id, "name": row.name} for row in rows])
+
+@fyyur.route('/genres/<genre>/artists')
+def genre_artists(genre):
+  return genre_listing(Artist, genre, 'artists')
+
+@fyyur.route('/genres/<genre>/venues')
+def genre_venues(genre):
+  return genre_listing(Venue, genre, 'venues')
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@fyyur.route('/autocomplete/<any(artists, venues):kind>')
+def autocomplete(kind):
+  # names starting with `q` (or with a word that does), for the show form
+  limit = min(max(request.args.get('limit', 10, type=int), 1), AUTOCOMPLETE_MAX_LIMIT)
+  fuzzy = current_app.config['AUTOCOMPLETE_FUZZY']
+  if 'fuzzy' in request.args:
+    fuzzy = request.args['fuzzy'] not in ('0', 'false')
+  matches = name_index(kind).lookup(request.args.get('q', ''), limit=limit, fuzzy=fuzzy)
+  return jsonify(data=[{"id": entry_id, "name": name} for entry_id, name in matches])
+
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+SHOW_FILTERS = ('start', 'end', 'city', 'genre')
+
+def shows_query(args):
+  # the filtered keyset page behind /shows and /api/v1/shows, newest first
+  filters = {
+    "start": args.get('start', type=parse_date),
+    "end": args.get('end', type=parse_date),
+    "city": args.get('city'),
+    "genre": args.get('genre'),
+  }
+  before = decode_cursor(args.get('before'))
+  per_page = max(1, min(args.get('limit', SHOWS_PER_PAGE, type=int), MAX_SHOWS_PER_PAGE))
+
+  query = db.session.query(
+    Show.id, Show.venue_id, Show.artist_id, Show.start_time,
+    Venue.name.label('venue_name'), Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link')).join(Venue).join(Artist)
+  if filters['start']:
+    query = query.filter(Show.start_time >= filters['start'])
+  if filters['end']:
+    query = query.filter(Show.start_time < filters['end'] + timedelta(days=1))
+  if filters['city']:
+    query = query.filter(Venue.city == filters['city'])
+  if filters['genre']:
+    query = query.filter(has_genre(Artist, filters['genre']))
+  if before is not None:
+    query = query.filter(db.tuple_(Show.start_time, Show.id) < before)
+  return query.order_by(Show.start_time.desc(), Show.id.desc()).limit(per_page + 1), per_page
+
+def show_rows(query, per_page, page):
+  # yields one page of show dicts; page['next_cursor'] is set once the page turns out to be full
+  last = None
+  for i, show in enumerate(query.yield_per(per_page)):
+    if i == per_page:
+      page['next_cursor'] = encode_cursor(last.start_time, last.id)
+      break
+    last = show
+    yield {
+      "venue_id": show.venue_id,
+      "venue_name": show.venue_name,
+      "artist_id": show.artist_id,
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "start_time": show.start_time
+    }
+
+@fyyur.route('/shows')
 def shows():
-  # displays list of shows at /shows
-  shows = db.session.query(
-    Show, Venue.name, Artist.name, Artist.image_link).join(Venue).join(Artist).order_by(db.desc(Show.start_time)).all()
-  data = []
+  # displays list of shows at /shows, newest first, one keyset page at a time
+  query, per_page = shows_query(request.args)
+  args = {key: request.args[key] for key in SHOW_FILTERS if request.args.get(key)}
+  page = {"next_cursor": None, "args": dict(args, limit=per_page)}
+  format_start_time = datetime_formatter('full')
+  rows = (dict(show, start_time=format_start_time(show['start_time']))
+    for show in show_rows(query, per_page, page))
 
-  for show in shows:
-    data.append({
-      "venue_id": show[0].venue_id,
-      "venue_name": show[1],
-      "artist_id": show[0].artist_id,
-      "artist_name": show[2],
-      "artist_image_link": show[3],
-      "start_time": show[0].start_time.strftime("%m/%d/%Y, %H:%M")
-    })
-  return render_template('pages/shows.html', shows=data)
+  return Response(stream_with_context(
+    stream_template('pages/shows.html', shows=rows, page=page)))
 
-@app.route('/shows/create')
+@fyyur.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
+  from forms import ShowForm
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@fyyur.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
   error = False
+  conflicts = []
   try:
-    show = Show()
-    show.artist_id = request.form['artist_id']
-    show.venue_id = request.form['venue_id']
-    show.start_time = request.form['start_time']
-    db.session.add(show)
-    db.session.commit()
+    import dateutil.parser
+    proposal = {
+      'artist_id': int(request.form['artist_id']),
+      'venue_id': int(request.form['venue_id']),
+      'start_time': local_time(dateutil.parser.parse(request.form['start_time'])),
+      'duration_minutes': int(request.form.get('duration_minutes') or DEFAULT_SHOW_MINUTES),
+    }
+    lock_bookings([proposal['artist_id']], [proposal['venue_id']])
+    conflicts, = booking_conflicts([proposal])
+    if conflicts:
+      db.session.rollback()
+    else:
+      show = Show(**proposal)
+      count_upcoming_show(show)
+      db.session.add(show)
+      if request.form.get('capacity'):
+        db.session.flush()
+        set_show_capacity(show, max(int(request.form['capacity']), 0))
+      db.session.commit()
+      invalidate_pages(venue_ids=[proposal['venue_id']], artist_ids=[proposal['artist_id']])
   except:
     error = True
     db.session.rollback()
@@ -475,40 +1959,273 @@ def create_show_submission():
     db.session.close()
   if error:
     flash('An error occurred. Show could not be listed.') 
+  elif conflicts:
+    conflict = conflicts[0]
+    flash('Show could not be listed: the {} is already booked from {} to {}.'.format(
+      ' and '.join(conflict['booked']), format_datetime(conflict['start_time']), format_datetime(conflict['end_time'])))
   else:
     flash('Show was successfully listed!')
   return render_template('pages/home.html')
 
-@app.errorhandler(404)
+#  Analytics
+#  ----------------------------------------------------------------
+
+def analytics_months():
+  return min(max(request.args.get('months', ANALYTICS_MONTHS, type=int), 1), MAX_ANALYTICS_MONTHS)
+
+def totals(rows, key, *fields):
+  # sums `fields` of the monthly rows per key, biggest first
+  sums = {}
+  for row in rows:
+    total = sums.setdefault(key(row), dict.fromkeys(fields, 0))
+    for field in fields:
+      total[field] += row[field]
+  return sorted(sums.items(), key=lambda item: (-item[1][fields[-1]], item[0]))
+
+@fyyur.route('/analytics')
+def analytics_page():
+  months = analytics_months()
+  data = analytics(months)
+  first = date.fromisoformat(data['since'])
+  window_minutes = sum(month_minutes(month_start(first, -i)) for i in range(months))
+  venues = totals(data['venues'], lambda row: (row['venue_id'], row['venue_name']), 'shows', 'booked_minutes')
+  return render_template('pages/analytics.html', months=months, refreshed_at=data['refreshed_at'],
+    monthly=sorted(totals(data['areas'], lambda row: row['month'], 'shows')),
+    areas=totals(data['areas'], lambda row: '{}, {}'.format(row['city'], row['state']), 'shows'),
+    genres=totals(data['genres'], lambda row: row['genre'], 'shows'),
+    venues=[(venue, total, total['booked_minutes'] / window_minutes) for venue, total in venues])
+
+#  Exports
+#  ----------------------------------------------------------------
+
+# Exports stream from a server-side cursor (yield_per), so memory stays flat
+# however many shows they cover. ?start= and ?end= (YYYY-MM-DD, inclusive)
+# limit the date range; ETag/Last-Modified let polling calendar clients get
+# a 304 from one aggregate query.
+
+EXPORT_BATCH_SIZE = 1000
+CSV_COLUMNS = ('show_id', 'start_time', 'end_time', 'duration_minutes', 'venue_id', 'venue_name',
+               'venue_city', 'venue_state', 'artist_id', 'artist_name')
+
+def export_query():
+  query = db.session.query(
+    Show.id, Show.start_time, Show.duration_minutes, Show.updated_at, Show.venue_id, Show.artist_id,
+    Venue.name.label('venue_name'), Venue.address, Venue.city, Venue.state,
+    Artist.name.label('artist_name')).join(Venue).join(Artist)
+  start = request.args.get('start', type=parse_date)
+  end = request.args.get('end', type=parse_date)
+  if start:
+    query = query.filter(Show.start_time >= start)
+  if end:
+    query = query.filter(Show.start_time < end + timedelta(days=1))
+  return query
+
+def calendar_events(query):
+  for show in query.yield_per(EXPORT_BATCH_SIZE):
+    yield {
+      "uid": 'show-{}@fyyur'.format(show.id),
+      "start": show.start_time,
+      "end": show.start_time + timedelta(minutes=show.duration_minutes),
+      "stamp": show.updated_at,
+      "summary": '{} at {}'.format(show.artist_name, show.venue_name),
+      "location": ', '.join(part for part in (show.address, show.city, show.state) if part),
+    }
+
+def calendar_response(name, query):
+  events = calendar_events(query.order_by(Show.start_time, Show.id))
+  return Response(stream_with_context(chunked(ical_calendar(name, events))),
+                  mimetype='text/calendar')
+
+@fyyur.route('/venues/<int:venue_id>/shows.ics')
+def venue_calendar(venue_id):
+  return conditional(
+    detail_validator(Venue, venue_id, Show.venue_id, Artist, Show.artist_id),
+    lambda: calendar_response(
+      db.session.query(Venue.name).filter(Venue.id == venue_id).scalar(),
+      export_query().filter(Show.venue_id == venue_id)))
+
+@fyyur.route('/artists/<int:artist_id>/shows.ics')
+def artist_calendar(artist_id):
+  return conditional(
+    detail_validator(Artist, artist_id, Show.artist_id, Venue, Show.venue_id),
+    lambda: calendar_response(
+      db.session.query(Artist.name).filter(Artist.id == artist_id).scalar(),
+      export_query().filter(Show.artist_id == artist_id)))
+
+def shows_validator():
+  # every max() is one index probe, so polling doesn't scan Show. The highest id moves
+  # with inserts and updated_at with edits. Shows are only deleted with their venue or
+  # artist, or by archiving a month, and both touch the venues and artists on the other side.
+  row = db.session.query(
+    db.func.max(Show.id), db.func.max(Show.updated_at),
+    db.select([db.func.max(Venue.updated_at)]).as_scalar(),
+    db.select([db.func.max(Artist.updated_at)]).as_scalar()).one()
+  return aggregate_validator(row, *row[1:])
+
+@fyyur.route('/shows.csv')
+def shows_csv():
+  def respond():
+    # id order needs no sort, so the first rows go out as soon as the scan starts
+    query = export_query().order_by(Show.id).yield_per(EXPORT_BATCH_SIZE)
+    rows = ((show.id, show.start_time.isoformat(),
+             (show.start_time + timedelta(minutes=show.duration_minutes)).isoformat(), show.duration_minutes,
+             show.venue_id, show.venue_name, show.city, show.state, show.artist_id, show.artist_name)
+            for show in query)
+    response = Response(stream_with_context(chunked(csv_lines(CSV_COLUMNS, rows))), mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename=shows.csv'
+    return response
+  return conditional(shows_validator(), respond)
+
+#  API
+#  ----------------------------------------------------------------
+
+def api_times(shows):
+  return format_rows(shows, lambda value: value.isoformat())
+
+def hashed_json(data):
+  # list payloads have no cheap validator; hashing the body still saves the transfer
+  response = jsonify(data)
+  response.add_etag()
+  return response.make_conditional(request)
+
+def api_venue(venue_id):
+  data = venue_detail(venue_id, before=decode_cursor(request.args.get('before')))
+  api_times(data['past_shows'])
+  api_times(data['upcoming_shows'])
+  return data
+
+def api_artist(artist_id):
+  data = artist_detail(artist_id, before=decode_cursor(request.args.get('before')))
+  api_times(data['past_shows'])
+  api_times(data['upcoming_shows'])
+  return data
+
+@fyyur.route('/api/v1/venues')
+def api_venues():
+  return hashed_json({"areas": venue_areas()})
+
+@fyyur.route('/api/v1/venues/<int:venue_id>')
+def api_show_venue(venue_id):
+  return conditional(
+    detail_validator(Venue, venue_id, Show.venue_id, Artist, Show.artist_id),
+    lambda: jsonify(api_venue(venue_id)))
+
+@fyyur.route('/api/v1/artists')
+def api_artists():
+  artists = db.session.query(Artist.id, Artist.name).order_by(Artist.id).all()
+  return hashed_json({"artists": [{"id": artist.id, "name": artist.name} for artist in artists]})
+
+@fyyur.route('/api/v1/artists/<int:artist_id>')
+def api_show_artist(artist_id):
+  return conditional(
+    detail_validator(Artist, artist_id, Show.artist_id, Venue, Show.venue_id),
+    lambda: jsonify(api_artist(artist_id)))
+
+@fyyur.route('/api/v1/shows')
+def api_shows():
+  query, per_page = shows_query(request.args)
+  page = {"next_cursor": None}
+  shows = api_times(list(show_rows(query, per_page, page)))
+  return hashed_json({"shows": shows, "next_cursor": page['next_cursor']})
+
+@fyyur.route('/api/v1/analytics')
+def api_analytics():
+  return hashed_json(analytics(analytics_months()))
+
+@fyyur.route('/api/v1/<any(venues, artists):kind>/delete', methods=['POST'])
+def api_bulk_delete(kind):
+  # {"ids": [...]}; deletes in batches and reports which ids existed
+  ids = (request.get_json(silent=True) or {}).get('ids')
+  if not isinstance(ids, list) or not 0 < len(ids) <= MAX_BULK_DELETE or \
+      not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+    return jsonify({"error": "expected {{\"ids\": [...]}} with 1 to {} integer ids".format(MAX_BULK_DELETE)}), 400
+  deleted = delete_rows(kind, ids)
+  return jsonify({"deleted": deleted, "missing": sorted(set(ids) - set(deleted))})
+
+@fyyur.route('/api/v1/shows/<int:show_id>/tickets')
+def api_show_tickets(show_id):
+  show = on_sale_show(show_id)
+  if show is None:
+    abort(404)
+  return jsonify(ticket_counts(show))
+
+@fyyur.route('/api/v1/shows/<int:show_id>/reservations', methods=['POST'])
+def api_reserve_tickets(show_id):
+  # {"quantity": n}; the token in the response is needed to confirm or release the hold
+  quantity = (request.get_json(silent=True) or {}).get('quantity', 1)
+  if not isinstance(quantity, int) or isinstance(quantity, bool) or not 1 <= quantity <= MAX_TICKETS_PER_RESERVATION:
+    return jsonify({"error": "quantity must be 1 to {}".format(MAX_TICKETS_PER_RESERVATION)}), 400
+  try:
+    reservation, seats = reserve_tickets(show_id, quantity)
+  except TicketError as e:
+    return jsonify({"error": str(e)}), 409
+  return jsonify({"reservation_id": reservation.id, "token": reservation.token, "seats": seats,
+    "expires_at": reservation.expires_at.isoformat() + 'Z'}), 201
+
+@fyyur.route('/api/v1/reservations/<int:reservation_id>/confirm', methods=['POST'])
+def api_confirm_reservation(reservation_id):
+  reservation = held_reservation(reservation_id, (request.get_json(silent=True) or {}).get('token'))
+  try:
+    seats = confirm_reservation(reservation)
+  except TicketError as e:
+    return jsonify({"error": str(e)}), 410
+  return jsonify({"reservation_id": reservation_id, "seats": seats})
+
+@fyyur.route('/api/v1/reservations/<int:reservation_id>', methods=['DELETE'])
+def api_release_reservation(reservation_id):
+  reservation = held_reservation(reservation_id, (request.get_json(silent=True) or {}).get('token'))
+  try:
+    release_reservation(reservation)
+  except TicketError as e:
+    return jsonify({"error": str(e)}), 409
+  return jsonify({"success": True})
+
+MAX_TOUR_SHOWS = 500
+
+@fyyur.route('/api/v1/shows/validate', methods=['POST'])
+def api_validate_shows():
+  # checks a proposed tour against the calendar and against itself, in one query
+  items = (request.get_json(silent=True) or {}).get('shows')
+  if not isinstance(items, list) or not 0 < len(items) <= MAX_TOUR_SHOWS:
+    return jsonify({"error": "expected {{\"shows\": [...]}} with 1 to {} shows".format(MAX_TOUR_SHOWS)}), 400
+
+  proposals, errors = [], []
+  for index, item in enumerate(items):
+    try:
+      proposals.append(parse_proposal(item))
+    except ValueError as e:
+      errors.append({"index": index, "error": str(e)})
+  if errors:
+    return jsonify({"errors": errors}), 400
+
+  results = []
+  for index, (conflicts, clashes) in enumerate(zip(booking_conflicts(proposals), schedule_conflicts(proposals))):
+    api_times(conflicts)
+    format_rows(conflicts, lambda value: value.isoformat(), field='end_time')
+    results.append({"index": index, "conflicts": conflicts, "schedule_conflicts": clashes})
+  valid = not any(result['conflicts'] or result['schedule_conflicts'] for result in results)
+  return jsonify({"valid": valid, "shows": results})
+
+@fyyur.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@fyyur.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,212 @@
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+# Static files for production, built by `flask assets build`. Every file under
+# static/ is copied with a hash of its content in the name, the layout's CSS and
+# scripts are minified and joined into a few bundles, and compressible files get
+# .gz (and, with the brotli package installed, .br) siblings. A manifest maps
+# each source name to its copy, so the names can change with the content and be
+# cached forever.
+
+MANIFEST = 'manifest.json'
+
+HASH_LENGTH = 12
+
+# Joined in this order. Bundle names are not source files; until the first build,
+# templates link the sources one by one.
+BUNDLES = {
+    'bundles/site.css': ('css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+                         'css/main.responsive.css', 'css/main.quickfix.css'),
+    'bundles/head.js': ('js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'),
+    'bundles/site.js': ('js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'),
+}
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.json', '.svg', '.eot', '.otf', '.ttf', '.txt')
+
+# (Content-Encoding, file suffix), preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_STRING = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+_CSS_TOKENS = re.compile(r'({})|(/\*!.*?\*/)|/\*.*?\*/|\s+'.format(_STRING), re.S)
+_CSS_PUNCTUATION = re.compile(r'({})|\s*([{{}};,])\s*'.format(_STRING))
+_CSS_URL = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)')
+
+
+def minify_css(text):
+    """Drops comments (except /*! notices */) and insignificant whitespace."""
+    def token(match):
+        string, notice = match.group(1), match.group(2)
+        if string or notice:
+            return string or notice + '\n'
+        return '' if match.group(0).startswith('/*') else ' '
+
+    def punctuation(match):
+        return match.group(1) or match.group(2)
+
+    text = _CSS_PUNCTUATION.sub(punctuation, _CSS_TOKENS.sub(token, text))
+    # strings can't span lines, so the only line breaks left follow notices
+    return re.sub(r'\n +', '\n', text.replace(';}', '}')).strip()
+
+
+def minify_js(text):
+    """Drops indentation, blank lines and whole-line // comments.
+
+    Statements are left exactly as written, so there is nothing a missing
+    semicolon or a regular expression can trip over.
+    """
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def fingerprint(name, content):
+    """'css/main.css' -> 'css/main.<hash>.css'."""
+    root, ext = posixpath.splitext(name)
+    return '{}.{}{}'.format(root, hashlib.sha256(content).hexdigest()[:HASH_LENGTH], ext)
+
+
+def rewrite_css_urls(text, source, output, files):
+    # url()s are relative to the source; point them at the copies, relative to the output
+    def replace(match):
+        url = match.group(2)
+        if url.startswith(('data:', '/', '#')) or '//' in url:
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = files.get(posixpath.normpath(posixpath.join(posixpath.dirname(source), path)))
+        if target is None:
+            return match.group(0)
+        return 'url("{}{}")'.format(posixpath.relpath(target, posixpath.dirname(output)), suffix)
+
+    return _CSS_URL.sub(replace, text)
+
+
+def compressed(name, content):
+    """Yields (encoding, suffix, bytes) for the encodings that make `content` smaller."""
+    if not name.endswith(COMPRESSIBLE):
+        return
+    variants = {'gzip': lambda: gzip.compress(content, 9, mtime=0)}
+    try:
+        import brotli
+        variants['br'] = lambda: brotli.compress(content, quality=11)
+    except ImportError:
+        pass
+    for encoding, suffix in ENCODINGS:
+        if encoding in variants:
+            data = variants[encoding]()
+            if len(data) < len(content):
+                yield encoding, suffix, data
+
+
+def source_files(static_dir, skip=None):
+    # (name relative to static_dir, path) of every file, leaving out the `skip` directory
+    static_dir = os.path.abspath(static_dir)
+    for directory, dirnames, filenames in os.walk(static_dir):
+        dirnames[:] = sorted(d for d in dirnames if os.path.join(directory, d) != skip)
+        for filename in sorted(filenames):
+            if not filename.startswith('.'):
+                path = os.path.join(directory, filename)
+                yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+
+
+def _write(path, content):
+    # complete files only, so a running server never serves half of one
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + '.partial'
+    with open(partial, 'wb') as f:
+        f.write(content)
+    os.replace(partial, path)
+
+
+class AssetBuild(object):
+    """Writes fingerprinted copies of `static_dir` into `out_dir`."""
+
+    def __init__(self, static_dir, out_dir, bundles=BUNDLES):
+        self.static_dir = static_dir
+        self.out_dir = out_dir
+        self.bundles = bundles
+        self.files = {}
+        self.encodings = {}
+        self.sizes = {}
+
+    def add(self, name, content):
+        output = fingerprint(name, content)
+        path = os.path.join(self.out_dir, output)
+        # identical content has the same name and is already complete
+        if not os.path.exists(path):
+            _write(path, content)
+        self.files[name] = output
+        self.encodings[output] = []
+        self.sizes[name] = {'raw': len(content)}
+        for encoding, suffix, data in compressed(name, content):
+            if not os.path.exists(path + suffix):
+                _write(path + suffix, data)
+            self.encodings[output].append(encoding)
+            self.sizes[name][encoding] = len(data)
+
+    def css(self, source, output, minify=False):
+        with open(os.path.join(self.static_dir, source), encoding='utf-8') as f:
+            text = f.read()
+        if minify and not source.endswith('.min.css'):
+            text = minify_css(text)
+        return rewrite_css_urls(text, source, output, self.files)
+
+    def run(self):
+        sources = list(source_files(self.static_dir, os.path.abspath(self.out_dir)))
+        # stylesheets last, so the files they point at already have their names
+        for name, path in sorted(sources, key=lambda source: source[0].endswith('.css')):
+            if name.endswith('.css'):
+                self.add(name, self.css(name, name).encode('utf-8'))
+            else:
+                with open(path, 'rb') as f:
+                    self.add(name, f.read())
+        for bundle, members in sorted(self.bundles.items()):
+            if bundle.endswith('.css'):
+                text = '\n'.join(self.css(member, bundle, minify=True) for member in members)
+            else:
+                parts = []
+                for member in members:
+                    with open(os.path.join(self.static_dir, member), encoding='utf-8') as f:
+                        text = f.read()
+                    parts.append(text.strip() if member.endswith('.min.js') else minify_js(text))
+                # a file that ends without a semicolon must not run into the next one
+                text = ';\n'.join(parts)
+            self.add(bundle, text.encode('utf-8'))
+        manifest = {'files': self.files, 'encodings': self.encodings}
+        _write(os.path.join(self.out_dir, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+        return manifest
+
+    def clean(self):
+        """Removes files from earlier builds; returns how many."""
+        keep = {MANIFEST}
+        for output, encodings in self.encodings.items():
+            keep.add(output)
+            keep.update(output + suffix for encoding, suffix in ENCODINGS if encoding in encodings)
+        removed = 0
+        for name, path in list(source_files(self.out_dir)):
+            if name not in keep:
+                os.remove(path)
+                removed += 1
+        return removed
+
+
+class AssetManifest(object):
+    """The manifest of the last build, or an empty one before the first."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        try:
+            with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {'files': {}, 'encodings': {}}
+        self.files = manifest['files']
+        self.encodings = manifest['encodings']
+
+    def urls(self, name):
+        """Source names to link for `name`: itself, or a bundle's members before a build."""
+        if name in self.files or name not in BUNDLES:
+            return [name]
+        return list(BUNDLES[name])
@@ -0,0 +1,148 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+# Name lookups for the autocomplete endpoints, answered from memory. Names are
+# normalized (accents and punctuation dropped, case folded) and kept in sorted
+# lists, so a prefix is one bisect plus a short scan.
+
+FUZZY_MIN_LENGTH = 3
+FUZZY_ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789 '
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize_name(name):
+    text = name or ''
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return ' '.join(word for word in _SEPARATORS.split(text.casefold()) if word)
+
+
+def _word_keys(key):
+    # "the blue room" is also found from "blue" and "room"
+    words = key.split(' ')
+    return [' '.join(words[i:]) for i in range(1, len(words))]
+
+
+def _scan(entries, prefix, seen, limit):
+    found = []
+    for i in range(bisect_left(entries, (prefix,)), len(entries)):
+        key, entry_id = entries[i]
+        if not key.startswith(prefix) or len(seen) >= limit:
+            break
+        if entry_id not in seen:
+            seen.add(entry_id)
+            found.append(entry_id)
+    return found
+
+
+def one_edit_prefixes(prefix):
+    """Prefixes one deletion, transposition, substitution or insertion away."""
+    splits = [(prefix[:i], prefix[i:]) for i in range(len(prefix) + 1)]
+    variants = set()
+    for head, tail in splits:
+        if tail:
+            variants.add(head + tail[1:])
+            if len(tail) > 1:
+                variants.add(head + tail[1] + tail[0] + tail[2:])
+            for c in FUZZY_ALPHABET:
+                variants.add(head + c + tail[1:])
+        for c in FUZZY_ALPHABET:
+            variants.add(head + c + tail)
+    variants.discard(prefix)
+    return sorted(variant for variant in variants if variant.strip())
+
+
+class PrefixIndex(object):
+    """Ids by normalized name, for one kind of record.
+
+    Whole names and word suffixes live in two sorted lists of (key, id), so
+    matches at the start of a name come first. Writers build new lists and
+    swap them in under a lock; readers take the current lists without one.
+    `loaded_at`, `refreshed_at` and `high_water` are left to the caller to
+    decide when to reload or catch up with other processes' writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = ([], [], {})
+        self.loaded_at = None
+        self.refreshed_at = None
+        self.high_water = None
+
+    def __len__(self):
+        return len(self._snapshot[2])
+
+    def load(self, rows, high_water=None):
+        # rows are (id, name) pairs; replaces everything in the index
+        names, words, display = [], [], {}
+        for entry_id, name in rows:
+            key = normalize_name(name)
+            display[entry_id] = name
+            names.append((key, entry_id))
+            words.extend((word_key, entry_id) for word_key in _word_keys(key))
+        names.sort()
+        words.sort()
+        with self._lock:
+            self._snapshot = (names, words, display)
+            self.loaded_at = self.refreshed_at = time.monotonic()
+            self.high_water = high_water
+
+    def add(self, rows):
+        # adds or renames (id, name) pairs
+        with self._lock:
+            display = self._snapshot[2]
+            rows = [(entry_id, name) for entry_id, name in rows if display.get(entry_id) != name]
+            if not rows:
+                return
+            names, words, display = self._without([entry_id for entry_id, _ in rows])
+            for entry_id, name in rows:
+                key = normalize_name(name)
+                display[entry_id] = name
+                insort(names, (key, entry_id))
+                for word_key in _word_keys(key):
+                    insort(words, (word_key, entry_id))
+            self._snapshot = (names, words, display)
+
+    def refresh(self, rows, high_water=None):
+        # add() for rows changed since `high_water` elsewhere
+        self.add(rows)
+        self.refreshed_at = time.monotonic()
+        if high_water is not None:
+            self.high_water = max(self.high_water or high_water, high_water)
+
+    def remove(self, ids):
+        with self._lock:
+            self._snapshot = self._without(ids)
+
+    def _without(self, ids):
+        names, words, display = self._snapshot
+        gone = set(ids) & display.keys()
+        if not gone:
+            return list(names), list(words), dict(display)
+        return ([entry for entry in names if entry[1] not in gone],
+                [entry for entry in words if entry[1] not in gone],
+                {entry_id: name for entry_id, name in display.items() if entry_id not in gone})
+
+    def lookup(self, text, limit=10, fuzzy=False):
+        """(id, name) pairs whose name, or a word in it, starts with `text`.
+
+        With `fuzzy`, a prefix that matches nothing falls back to prefixes one
+        edit away, e.g. "wlov" finds "The Lucky Wolves".
+        """
+        names, words, display = self._snapshot
+        prefix = normalize_name(text)
+        if not prefix:
+            return []
+        seen = set()
+        found = _scan(names, prefix, seen, limit) + _scan(words, prefix, seen, limit)
+        if fuzzy and not found and len(prefix) >= FUZZY_MIN_LENGTH:
+            for entries in (names, words):
+                for variant in one_edit_prefixes(prefix):
+                    if len(seen) >= limit:
+                        break
+                    found += _scan(entries, variant, seen, limit)
+        return [(entry_id, display[entry_id]) for entry_id in found]
@@ -0,0 +1,86 @@
+"""Cold-start cost of each module Fyyur imports, and of building the app.
+
+Every measurement runs in a fresh interpreter, so nothing is already in
+sys.modules. Module times come from `python -X importtime` and include
+everything the module imports in turn.
+
+    python benchmarks/import_benchmark.py --repeat 7
+
+No database is needed.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = (
+    'flask',
+    'flask_sqlalchemy',
+    'flask_moment',
+    'flask_migrate',
+    'flask_wtf',
+    'babel.dates',
+    'dateutil.parser',
+    'forms',
+    'formatting',
+    'importer',
+    'page_cache',
+    'search',
+    'models',
+    'app',
+)
+
+STARTUP = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app({'TESTING': True})
+created = time.perf_counter()
+app.warm_up(application)
+warmed = time.perf_counter()
+print(imported - started, created - imported, warmed - created)
+"""
+
+
+def run(args):
+    return subprocess.run([sys.executable] + args, cwd=APP_DIR, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+
+def import_ms(module):
+    # the last -X importtime line for a top-level import is the module itself:
+    # "import time: self [us] | cumulative | name"
+    for line in reversed(run(['-X', 'importtime', '-c', 'import ' + module]).stderr.splitlines()):
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000.0
+    raise RuntimeError('no importtime line for ' + module)
+
+
+def startup_ms():
+    return [float(value) * 1000 for value in run(['-c', STARTUP]).stdout.split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args()
+
+    print('{:<24} {:>10} {:>10}'.format('module', 'median ms', 'min ms'))
+    for module in args.modules:
+        timings = [import_ms(module) for _ in range(args.repeat)]
+        print('{:<24} {:>10.1f} {:>10.1f}'.format(module, statistics.median(timings), min(timings)))
+
+    phases = list(zip(*[startup_ms() for _ in range(args.repeat)]))
+    print()
+    for label, timings in zip(('import app', 'create_app()', 'warm_up()'), phases):
+        print('{:<24} {:>10.1f} {:>10.1f}'.format(label, statistics.median(timings), min(timings)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""First-request latency of a new worker with the template cache off, cold and warm.
+
+Every run starts a fresh interpreter, like a recycled worker, builds the app
+and times the first request to each page, which is when its templates are
+compiled or loaded from TEMPLATE_CACHE_DIR:
+
+* off:  no bytecode cache, templates are compiled in memory
+* cold: an empty cache directory, so templates are compiled and written
+* warm: a directory filled by `flask templates compile`
+
+    python benchmarks/template_benchmark.py --repeat 7
+
+The pages below don't query the database, so no database is needed.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ('/', '/venues/create', '/artists/create', '/shows/create')
+
+FIRST_REQUESTS = """
+import json, sys, time
+import app
+application = app.create_app({'TESTING': True, 'TEMPLATE_CACHE_DIR': sys.argv[1]})
+client = application.test_client()
+timings = {}
+for page in sys.argv[2:]:
+    started = time.perf_counter()
+    response = client.get(page, buffered=True)
+    timings[page] = (time.perf_counter() - started) * 1000
+    assert response.status_code == 200, (page, response.status_code)
+started = time.perf_counter()
+app.compile_templates(application)
+timings['all templates'] = (time.perf_counter() - started) * 1000
+print(json.dumps(timings))
+"""
+
+PRECOMPILE = """
+import sys
+import app
+app.compile_templates(app.create_app({'TESTING': True, 'TEMPLATE_CACHE_DIR': sys.argv[1]}))
+"""
+
+
+def run(script, *args):
+    return subprocess.run([sys.executable, '-c', script] + list(args), cwd=APP_DIR, check=True,
+                          stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+
+def first_requests(cache_dir):
+    return json.loads(run(FIRST_REQUESTS, cache_dir, *PAGES))
+
+
+def measure(mode, repeat, scratch):
+    runs = []
+    for i in range(repeat):
+        cache_dir = os.path.join(scratch, '{}-{}'.format(mode, i))
+        if mode == 'warm':
+            run(PRECOMPILE, cache_dir)
+        runs.append(first_requests('' if mode == 'off' else cache_dir))
+    return {label: statistics.median(run[label] for run in runs) for label in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='fyyur-templates-')
+    try:
+        results = {mode: measure(mode, args.repeat, scratch) for mode in ('off', 'cold', 'warm')}
+    finally:
+        shutil.rmtree(scratch)
+
+    print('median ms over {} fresh processes'.format(args.repeat))
+    print('{:<18} {:>9} {:>9} {:>9}'.format('first request', 'off', 'cold', 'warm'))
+    for label in results['off']:
+        print('{:<18} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+            label, results['off'][label], results['cold'][label], results['warm'][label]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import csv
+import io
+
+ICAL_TIME_FORMAT = '%Y%m%dT%H%M%S'
+# responses are written in chunks of about this many characters
+CHUNK_SIZE = 64 * 1024
+
+#----------------------------------------------------------------------------#
+# iCalendar.
+#----------------------------------------------------------------------------#
+
+def ical_text(value):
+    # TEXT values escape backslashes, semicolons, commas and newlines (RFC 5545 3.3.11)
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ical_line(name, value):
+    # content lines are folded at 75 octets, never inside a UTF-8 character
+    line = '{}:{}'.format(name, value).encode('utf-8')
+    parts = []
+    limit = 75
+    while len(line) > limit:
+        cut = limit
+        while line[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(line[:cut])
+        line = line[cut:]
+        limit = 74  # continuation lines start with a space
+    parts.append(line)
+    return b'\r\n '.join(parts).decode('utf-8') + '\r\n'
+
+
+def ical_calendar(name, events):
+    """Yields an iCalendar document one VEVENT at a time.
+
+    Events are dicts with uid, start, end (naive local times, written as
+    floating times), stamp (naive UTC), summary and location.
+    """
+    yield (ical_line('BEGIN', 'VCALENDAR') + ical_line('VERSION', '2.0') +
+           ical_line('PRODID', '-//Fyyur//Shows//EN') + ical_line('CALSCALE', 'GREGORIAN') +
+           ical_line('X-WR-CALNAME', ical_text(name)))
+    for event in events:
+        yield (ical_line('BEGIN', 'VEVENT') +
+               ical_line('UID', event['uid']) +
+               ical_line('DTSTAMP', event['stamp'].strftime(ICAL_TIME_FORMAT) + 'Z') +
+               ical_line('DTSTART', event['start'].strftime(ICAL_TIME_FORMAT)) +
+               ical_line('DTEND', event['end'].strftime(ICAL_TIME_FORMAT)) +
+               ical_line('SUMMARY', ical_text(event['summary'])) +
+               ical_line('LOCATION', ical_text(event['location'])) +
+               ical_line('END', 'VEVENT'))
+    yield ical_line('END', 'VCALENDAR')
+
+#----------------------------------------------------------------------------#
+# CSV.
+#----------------------------------------------------------------------------#
+
+def csv_lines(header, rows):
+    """Yields CSV text one row at a time, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def chunked(pieces, size=CHUNK_SIZE):
+    """Joins small strings into chunks of about `size` characters, so a
+    response of many rows isn't written to the socket row by row."""
+    chunk, length = [], 0
+    for piece in pieces:
+        chunk.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,54 @@
+from functools import lru_cache
+
+# Named formats accepted by the `datetime` template filter.
+NAMED_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+class DatetimeFormatter(object):
+    """Formats datetimes with a Babel pattern compiled once per (format, locale).
+
+    Native datetimes are formatted as they are; strings are still accepted
+    and parsed. Naive datetimes are taken as server-local time, as they are
+    stored, and shown in `timezone` when one is given.
+    """
+
+    def __init__(self, format='medium', locale='en_US', timezone=None):
+        # Babel and pytz load their locale and zone data on import; defer that
+        # until the first formatter is built
+        import babel.dates
+        import pytz
+        from babel import Locale
+        self.pattern = babel.dates.parse_pattern(NAMED_FORMATS.get(format, format))
+        self.locale = Locale.parse(locale)
+        self.tzinfo = pytz.timezone(timezone) if timezone else None
+
+    def __call__(self, value):
+        if isinstance(value, str):
+            import dateutil.parser
+            value = dateutil.parser.parse(value)
+        if self.tzinfo is not None:
+            # astimezone() reads a naive value as local time
+            value = value.astimezone(self.tzinfo)
+        return self.pattern.apply(value, self.locale)
+
+
+def local_time(value):
+    """Show times are stored naive in server-local time; an explicit offset is converted to that."""
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+@lru_cache(maxsize=64)
+def get_formatter(format='medium', locale='en_US', timezone=None):
+    return DatetimeFormatter(format, locale, timezone)
+
+
+def format_rows(rows, formatter, field='start_time'):
+    """Formats `field` of every dict in rows in place and returns rows."""
+    for row in rows:
+        row[field] = formatter(row[field])
+    return rows
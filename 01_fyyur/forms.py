@@ -1,7 +1,8 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange, Optional
+from models import DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
 
 class ShowForm(Form):
     artist_id = StringField(
@@ -15,6 +16,15 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[DataRequired(), NumberRange(min=1, max=MAX_SHOW_MINUTES)],
+        default=DEFAULT_SHOW_MINUTES
+    )
+    capacity = IntegerField(
+        'capacity',
+        validators=[Optional(), NumberRange(min=0)]
+    )
 
 class VenueForm(Form):
     name = StringField(
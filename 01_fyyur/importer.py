@@ -0,0 +1,181 @@
+import csv
+import json
+import time
+
+from formatting import local_time
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+class RejectedRow(ValueError):
+    pass
+
+
+def read_records(path):
+    """Streams (line number, record) pairs from a .csv or .ndjson/.jsonl file."""
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError as e:
+                    yield line_no, RejectedRow('invalid JSON: {}'.format(e))
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+#----------------------------------------------------------------------------#
+# Normalizing.
+#----------------------------------------------------------------------------#
+
+def _required(record, field):
+    value = record.get(field)
+    if value is None or str(value).strip() == '':
+        raise RejectedRow('missing {}'.format(field))
+    return str(value).strip()
+
+
+def _optional(record, field):
+    value = record.get(field)
+    if value is None or str(value).strip() == '':
+        return None
+    return str(value).strip()
+
+
+def _genres(record):
+    # CSV cells hold 'Jazz;Reggae', NDJSON records hold a list
+    value = record.get('genres') or []
+    if isinstance(value, str):
+        value = value.split(';')
+    genres = [genre.strip() for genre in value if genre and genre.strip()]
+    if not genres:
+        raise RejectedRow('missing genres')
+    return genres
+
+
+def _flag(record, field):
+    value = record.get(field)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 't', 'yes', 'y')
+    return bool(value)
+
+
+def _integer(record, field):
+    value = _optional(record, field)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise RejectedRow('{} is not an integer'.format(field))
+
+
+def normalize_venue(record):
+    return {
+        'name': _required(record, 'name'),
+        'city': _required(record, 'city'),
+        'state': _required(record, 'state'),
+        'address': _required(record, 'address'),
+        'phone': _optional(record, 'phone'),
+        'genres': _genres(record),
+        'image_link': _optional(record, 'image_link'),
+        'facebook_link': _optional(record, 'facebook_link'),
+        'website': _optional(record, 'website'),
+        'seeking_talent': _flag(record, 'seeking_talent'),
+        'seeking_description': _optional(record, 'seeking_description'),
+    }
+
+
+def normalize_artist(record):
+    return {
+        'name': _required(record, 'name'),
+        'city': _required(record, 'city'),
+        'state': _required(record, 'state'),
+        'phone': _optional(record, 'phone'),
+        'genres': _genres(record),
+        'image_link': _optional(record, 'image_link'),
+        'facebook_link': _optional(record, 'facebook_link'),
+        'website': _optional(record, 'website'),
+        'seeking_venue': _flag(record, 'seeking_venue'),
+        'seeking_description': _optional(record, 'seeking_description'),
+    }
+
+
+def _reference(record, kind):
+    # shows point at artists/venues either by id or by their (name, city, state) key
+    ref_id = _integer(record, kind + '_id')
+    if ref_id is not None:
+        return ref_id
+    try:
+        return tuple(_required(record, '{}_{}'.format(kind, field)) for field in ('name', 'city', 'state'))
+    except RejectedRow:
+        raise RejectedRow('missing {0}_id or {0}_name/{0}_city/{0}_state'.format(kind))
+
+
+def normalize_show(record):
+    import dateutil.parser
+    start_time = _required(record, 'start_time')
+    try:
+        start_time = dateutil.parser.parse(start_time)
+    except (ValueError, OverflowError):
+        raise RejectedRow('start_time is not a date')
+    return {
+        'artist': _reference(record, 'artist'),
+        'venue': _reference(record, 'venue'),
+        'start_time': local_time(start_time),
+        'duration_minutes': _integer(record, 'duration_minutes'),
+    }
+
+NORMALIZERS = {
+    'venues': normalize_venue,
+    'artists': normalize_artist,
+    'shows': normalize_show,
+}
+
+
+def normalize(kind, record):
+    if isinstance(record, RejectedRow):
+        raise record
+    if not isinstance(record, dict):
+        raise RejectedRow('expected an object')
+    return NORMALIZERS[kind](record)
+
+#----------------------------------------------------------------------------#
+# Reporting.
+#----------------------------------------------------------------------------#
+
+class LoadReport(object):
+    def __init__(self):
+        self.started = time.time()
+        self.loaded = 0
+        self.rejects = []
+
+    def reject(self, line_no, reason):
+        self.rejects.append((line_no, str(reason).strip()))
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.loaded / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return '{} rows loaded, {} rejected in {:.1f}s ({:.0f} rows/s)'.format(
+            self.loaded, len(self.rejects), self.elapsed, self.rows_per_second)
@@ -0,0 +1,50 @@
+"""search indexes
+
+Revision ID: a3c5e1f09b27
+Revises: 514040a528e6
+Create Date: 2026-10-18 09:12:40.318221
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e1f09b27'
+down_revision = '514040a528e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute("""
+    CREATE OR REPLACE FUNCTION fyyur_search_vector() RETURNS trigger AS $$
+    BEGIN
+      NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+      RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """)
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute('CREATE TRIGGER "{0}_search_vector" BEFORE INSERT OR UPDATE ON "{0}" '
+                   'FOR EACH ROW EXECUTE PROCEDURE fyyur_search_vector()'.format(table))
+        # fire the trigger once for existing rows
+        op.execute('UPDATE "{0}" SET name = name'.format(table))
+        op.create_index('ix_{}_search_vector'.format(table), table, ['search_vector'],
+                        postgresql_using='gin')
+        op.execute('CREATE INDEX "ix_{0}_name_trgm" ON "{0}" USING gin (name gin_trgm_ops)'.format(table))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_{}_name_trgm'.format(table), table_name=table)
+        op.drop_index('ix_{}_search_vector'.format(table), table_name=table)
+        op.execute('DROP TRIGGER "{0}_search_vector" ON "{0}"'.format(table))
+        op.drop_column(table, 'search_vector')
+    op.execute('DROP FUNCTION fyyur_search_vector()')
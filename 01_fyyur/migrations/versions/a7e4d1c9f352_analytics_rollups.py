@@ -0,0 +1,49 @@
+"""monthly show rollups for analytics
+
+Revision ID: a7e4d1c9f352
+Revises: f3c6a8d2b914
+Create Date: 2026-10-18 18:40:12.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e4d1c9f352'
+down_revision = 'f3c6a8d2b914'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Watermark', sa.Column('position', sa.BigInteger(), nullable=True))
+    op.create_table('AreaMonthRollup',
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('shows', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('city', 'state', 'month')
+    )
+    op.create_table('GenreMonthRollup',
+        sa.Column('genre', sa.String(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('shows', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('genre', 'month')
+    )
+    op.create_table('VenueMonthRollup',
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('shows', sa.Integer(), nullable=False),
+        sa.Column('booked_minutes', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('venue_id', 'month')
+    )
+    # the rollups start empty; `flask analytics refresh` fills them from every show
+
+
+def downgrade():
+    op.drop_table('VenueMonthRollup')
+    op.drop_table('GenreMonthRollup')
+    op.drop_table('AreaMonthRollup')
+    op.drop_column('Watermark', 'position')
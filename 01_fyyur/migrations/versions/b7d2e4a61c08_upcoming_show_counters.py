@@ -0,0 +1,38 @@
+"""upcoming show counters
+
+Revision ID: b7d2e4a61c08
+Revises: a3c5e1f09b27
+Create Date: 2026-10-18 10:03:51.772410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4a61c08'
+down_revision = 'a3c5e1f09b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Show', sa.Column('counted_upcoming', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_index('ix_Show_counted_upcoming_start_time', 'Show', ['start_time'],
+                    postgresql_where=sa.text('counted_upcoming'))
+
+    # same as `flask counters check --rebuild`
+    op.execute('UPDATE "Show" SET counted_upcoming = start_time > LOCALTIMESTAMP')
+    op.execute('UPDATE "Venue" SET upcoming_shows_count = (SELECT count(*) FROM "Show" '
+               'WHERE "Show".venue_id = "Venue".id AND "Show".counted_upcoming)')
+    op.execute('UPDATE "Artist" SET upcoming_shows_count = (SELECT count(*) FROM "Show" '
+               'WHERE "Show".artist_id = "Artist".id AND "Show".counted_upcoming)')
+
+
+def downgrade():
+    op.drop_index('ix_Show_counted_upcoming_start_time', table_name='Show')
+    op.drop_column('Show', 'counted_upcoming')
+    op.drop_column('Artist', 'upcoming_shows_count')
+    op.drop_column('Venue', 'upcoming_shows_count')
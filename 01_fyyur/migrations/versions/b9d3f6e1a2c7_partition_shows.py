@@ -0,0 +1,92 @@
+"""range-partition Show by start_time
+
+Revision ID: b9d3f6e1a2c7
+Revises: a7e4d1c9f352
+Create Date: 2026-10-18 20:12:37.550981
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9d3f6e1a2c7'
+down_revision = 'a7e4d1c9f352'
+branch_labels = None
+depends_on = None
+
+# Needs PostgreSQL 11 or later. The rows are copied into a new partitioned table
+# while Show is locked, so run it in a quiet moment. There is one partition per
+# month from the oldest show to a year ahead, plus a DEFAULT partition for
+# anything else; `flask partitions maintain` keeps creating months ahead.
+
+MONTHS_AHEAD = 12
+
+COLUMNS = 'id, start_time, artist_id, venue_id, duration_minutes, counted_upcoming, updated_at'
+
+SHOW_TABLE = '''CREATE TABLE "Show" (
+    id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+    start_time timestamp without time zone NOT NULL,
+    artist_id integer NOT NULL,
+    venue_id integer NOT NULL,
+    duration_minutes integer NOT NULL DEFAULT 120,
+    counted_upcoming boolean NOT NULL DEFAULT false,
+    updated_at timestamp without time zone NOT NULL DEFAULT (now() at time zone 'utc'),
+    CONSTRAINT "Show_artist_id_fkey" FOREIGN KEY (artist_id) REFERENCES "Artist" (id) ON DELETE CASCADE,
+    CONSTRAINT "Show_venue_id_fkey" FOREIGN KEY (venue_id) REFERENCES "Venue" (id) ON DELETE CASCADE,
+    CONSTRAINT "ck_Show_duration_minutes" CHECK (duration_minutes BETWEEN 1 AND 1440)
+){}'''
+
+
+def month_start(day, months_ahead=0):
+    index = day.year * 12 + day.month - 1 + months_ahead
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_indexes(primary_key):
+    # built after the copy, which is faster than maintaining them row by row
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_pkey" PRIMARY KEY ({})'.format(primary_key))
+    # includes the partition key, so it is still enforced across partitions
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_artist_id_venue_id_start_time_key" '
+               'UNIQUE (artist_id, venue_id, start_time)')
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
+    op.create_index('ix_Show_counted_upcoming_start_time', 'Show', ['start_time'],
+                    postgresql_where=sa.text('counted_upcoming'))
+
+
+def replace_show_table(partition_by):
+    op.execute('LOCK TABLE "Show" IN ACCESS EXCLUSIVE MODE')
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_old"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute(SHOW_TABLE.format(partition_by))
+
+
+def copy_and_drop_old_table():
+    op.execute('INSERT INTO "Show" ({0}) SELECT {0} FROM "Show_old"'.format(COLUMNS))
+    op.execute('DROP TABLE "Show_old"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+
+
+def upgrade():
+    oldest = op.get_bind().execute(sa.text('SELECT min(start_time) FROM "Show"')).scalar()
+    replace_show_table(' PARTITION BY RANGE (start_time)')
+    month = month_start(oldest or date.today())
+    last = month_start(date.today(), MONTHS_AHEAD)
+    while month <= last:
+        op.execute('CREATE TABLE "Show_{:%Y_%m}" PARTITION OF "Show" FOR VALUES FROM (\'{:%Y-%m-%d}\') TO (\'{:%Y-%m-%d}\')'
+                   .format(month, month, month_start(month, 1)))
+        month = month_start(month, 1)
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+    copy_and_drop_old_table()
+    # the primary key has to include the partition key
+    create_indexes('id, start_time')
+
+
+def downgrade():
+    # archived (detached) partitions are left alone
+    replace_show_table('')
+    copy_and_drop_old_table()
+    create_indexes('id')
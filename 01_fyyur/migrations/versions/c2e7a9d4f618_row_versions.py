@@ -0,0 +1,27 @@
+"""row versions for optimistic concurrency on venue and artist edits
+
+Revision ID: c2e7a9d4f618
+Revises: b9d3f6e1a2c7
+Create Date: 2026-10-18 22:05:41.318260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e7a9d4f618'
+down_revision = 'b9d3f6e1a2c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # a constant default is stored in the catalog, so existing rows aren't rewritten
+    op.add_column('Venue', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('Artist', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    op.drop_column('Artist', 'version')
+    op.drop_column('Venue', 'version')
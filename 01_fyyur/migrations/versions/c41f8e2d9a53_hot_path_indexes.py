@@ -0,0 +1,43 @@
+"""hot path indexes
+
+Revision ID: c41f8e2d9a53
+Revises: b7d2e4a61c08
+Create Date: 2026-10-18 11:26:09.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f8e2d9a53'
+down_revision = 'b7d2e4a61c08'
+branch_labels = None
+depends_on = None
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction, so every index is
+# built in an autocommit block and the tables stay writable meanwhile. A build
+# that fails leaves an INVALID index behind; drop it and run the upgrade again.
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_Venue_genres', 'Venue', ['genres'],
+                        postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_Artist_genres', 'Artist', ['genres'],
+                        postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_Venue_city_state', 'Venue', ['city', 'state'],
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_Venue_city_state', table_name='Venue', postgresql_concurrently=True)
+        op.drop_index('ix_Artist_genres', table_name='Artist', postgresql_concurrently=True)
+        op.drop_index('ix_Venue_genres', table_name='Venue', postgresql_concurrently=True)
+        op.drop_index('ix_Show_artist_id_start_time', table_name='Show', postgresql_concurrently=True)
+        op.drop_index('ix_Show_venue_id_start_time', table_name='Show', postgresql_concurrently=True)
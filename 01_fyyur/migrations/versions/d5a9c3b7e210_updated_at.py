@@ -0,0 +1,27 @@
+"""updated_at columns for conditional API responses
+
+Revision ID: d5a9c3b7e210
+Revises: c41f8e2d9a53
+Create Date: 2026-10-18 14:21:07.318552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a9c3b7e210'
+down_revision = 'c41f8e2d9a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("(now() at time zone 'utc')")))
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_column(table, 'updated_at')
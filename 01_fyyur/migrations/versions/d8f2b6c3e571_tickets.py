@@ -0,0 +1,59 @@
+"""show capacity, ticket seats and reservations
+
+Revision ID: d8f2b6c3e571
+Revises: c2e7a9d4f618
+Create Date: 2026-10-18 23:31:08.772415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f2b6c3e571'
+down_revision = 'c2e7a9d4f618'
+branch_labels = None
+depends_on = None
+
+# Foreign keys to the partitioned Show table need PostgreSQL 12 or later.
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('capacity', sa.Integer(), nullable=True))
+    op.create_check_constraint('ck_Show_capacity', 'Show', 'capacity >= 0')
+    op.create_table('Reservation',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('show_id', sa.Integer(), nullable=False),
+        sa.Column('show_start_time', sa.DateTime(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(length=32), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('confirmed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['show_id', 'show_start_time'], ['Show.id', 'Show.start_time'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_Reservation_expires_at', 'Reservation', ['expires_at'],
+                    postgresql_where=sa.text('confirmed_at IS NULL'))
+    op.create_table('Ticket',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('show_id', sa.Integer(), nullable=False),
+        sa.Column('show_start_time', sa.DateTime(), nullable=False),
+        sa.Column('seat', sa.Integer(), nullable=False),
+        sa.Column('reservation_id', sa.BigInteger(), nullable=True),
+        sa.Column('held_until', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['reservation_id'], ['Reservation.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['show_id', 'show_start_time'], ['Show.id', 'Show.start_time'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('show_id', 'seat')
+    )
+    op.create_index(op.f('ix_Ticket_reservation_id'), 'Ticket', ['reservation_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Ticket_reservation_id'), table_name='Ticket')
+    op.drop_table('Ticket')
+    op.drop_index('ix_Reservation_expires_at', table_name='Reservation')
+    op.drop_table('Reservation')
+    op.drop_constraint('ck_Show_capacity', 'Show', type_='check')
+    op.drop_column('Show', 'capacity')
@@ -0,0 +1,33 @@
+"""updated_at indexes for the show export validator
+
+Revision ID: e6b3d9a1c547
+Revises: d8f2b6c3e571
+Create Date: 2026-10-19 10:14:52.603118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b3d9a1c547'
+down_revision = 'd8f2b6c3e571'
+branch_labels = None
+depends_on = None
+
+# A partitioned table can't be indexed concurrently, so ix_Show_updated_at
+# blocks writes to Show while it builds. Venue and Artist stay writable.
+
+
+def upgrade():
+    op.create_index('ix_Show_updated_at', 'Show', ['updated_at'])
+    with op.get_context().autocommit_block():
+        op.create_index('ix_Venue_updated_at', 'Venue', ['updated_at'], postgresql_concurrently=True)
+        op.create_index('ix_Artist_updated_at', 'Artist', ['updated_at'], postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_Artist_updated_at', table_name='Artist', postgresql_concurrently=True)
+        op.drop_index('ix_Venue_updated_at', table_name='Venue', postgresql_concurrently=True)
+    op.drop_index('ix_Show_updated_at', table_name='Show')
@@ -0,0 +1,32 @@
+"""show durations for booking conflict checks
+
+Revision ID: e8b1f4c2a937
+Revises: d5a9c3b7e210
+Create Date: 2026-10-18 15:02:44.907115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b1f4c2a937'
+down_revision = 'd5a9c3b7e210'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # a constant default doesn't rewrite the table
+    op.add_column('Show', sa.Column('duration_minutes', sa.Integer(), server_default='120', nullable=False))
+    # NOT VALID only takes the ACCESS EXCLUSIVE lock briefly; the existing rows are
+    # checked after that commits, under a lock that doesn't block writes
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "ck_Show_duration_minutes" '
+               'CHECK (duration_minutes BETWEEN 1 AND 1440) NOT VALID')
+    with op.get_context().autocommit_block():
+        op.execute('ALTER TABLE "Show" VALIDATE CONSTRAINT "ck_Show_duration_minutes"')
+
+
+def downgrade():
+    op.drop_constraint('ck_Show_duration_minutes', 'Show', type_='check')
+    op.drop_column('Show', 'duration_minutes')
@@ -0,0 +1,43 @@
+"""precomputed related artists
+
+Revision ID: f3c6a8d2b914
+Revises: e8b1f4c2a937
+Create Date: 2026-10-18 17:21:05.318452
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c6a8d2b914'
+down_revision = 'e8b1f4c2a937'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ArtistRecommendation',
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('rank', sa.SmallInteger(), autoincrement=False, nullable=False),
+        sa.Column('related_artist_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.REAL(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['related_artist_id'], ['Artist.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('artist_id', 'kind', 'rank')
+    )
+    # deleting an artist cascades to the rows that point at it
+    op.create_index(op.f('ix_ArtistRecommendation_related_artist_id'), 'ArtistRecommendation',
+                    ['related_artist_id'], unique=False)
+    op.create_table('Watermark',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('Watermark')
+    op.drop_index(op.f('ix_ArtistRecommendation_related_artist_id'), table_name='ArtistRecommendation')
+    op.drop_table('ArtistRecommendation')
@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from search import install_search_ddl
+
+db = SQLAlchemy()
+
+# Show lengths are bounded so overlap checks can scan the (artist_id, start_time)
+# and (venue_id, start_time) indexes over a window of at most this many minutes.
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 24 * 60
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+    __table_args__ = (
+        db.UniqueConstraint('name', 'city', 'state'),
+        db.Index('ix_Venue_city_state', 'city', 'state'),
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(), nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    address = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120), nullable=True)
+    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    image_link = db.Column(db.String(500), nullable=True)
+    facebook_link = db.Column(db.String(120), nullable=True)
+    website = db.Column(db.String(), nullable=True)
+    seeking_talent = db.Column(db.Boolean, nullable=True, default=False)
+    seeking_description = db.Column(db.String(), nullable=True)
+    search_vector = db.deferred(db.Column(TSVECTOR, nullable=True))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("(now() at time zone 'utc')"))
+    # bumped by every ORM update (UPDATE ... WHERE version = <loaded>) and import, so
+    # an edit made from an older copy of the row is rejected instead of overwriting it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+    __table_args__ = (
+        db.UniqueConstraint('name', 'city', 'state'),
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120), nullable=True)
+    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    image_link = db.Column(db.String(500), nullable=True)
+    facebook_link = db.Column(db.String(120), nullable=True)
+    website = db.Column(db.String(), nullable=True)
+    seeking_venue = db.Column(db.Boolean, nullable=True, default=False)
+    seeking_description = db.Column(db.String(), nullable=True)
+    search_vector = db.deferred(db.Column(TSVECTOR, nullable=True))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("(now() at time zone 'utc')"))
+    # see Venue.version
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+
+class Show(db.Model):
+    __tablename__ = 'Show'
+    __table_args__ = (
+        db.UniqueConstraint('artist_id', 'venue_id', 'start_time'),
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_counted_upcoming_start_time', 'start_time',
+                 postgresql_where=db.text('counted_upcoming')),
+        db.Index('ix_Show_updated_at', 'updated_at'),
+        db.CheckConstraint('duration_minutes BETWEEN 1 AND {}'.format(MAX_SHOW_MINUTES),
+                           name='ck_Show_duration_minutes'),
+        db.CheckConstraint('capacity >= 0', name='ck_Show_capacity'),
+        {'postgresql_partition_by': 'RANGE (start_time)'},
+    )
+
+    # Range-partitioned by month of start_time (see `flask partitions maintain`),
+    # so the primary key has to include start_time; ids still come from one sequence.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    start_time = db.Column(db.DateTime, primary_key=True)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES,
+                                 server_default=str(DEFAULT_SHOW_MINUTES))
+    # True while the show is included in its venue/artist upcoming_shows_count
+    counted_upcoming = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # seats for sale, one Ticket row each; NULL when the show doesn't sell tickets
+    capacity = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("(now() at time zone 'utc')"))
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+
+    @property
+    def end_time(self):
+        return self.start_time + timedelta(minutes=self.duration_minutes)
+
+    artist = db.relationship('Artist', backref=db.backref('shows', lazy=True, passive_deletes=True))
+    venue = db.relationship('Venue', backref=db.backref('shows', lazy=True, passive_deletes=True))
+
+# A buyer's hold on some of a show's tickets, until expires_at unless confirmed.
+class Reservation(db.Model):
+    __tablename__ = 'Reservation'
+    __table_args__ = (
+        db.ForeignKeyConstraint(['show_id', 'show_start_time'], ['Show.id', 'Show.start_time'], ondelete='CASCADE'),
+        db.Index('ix_Reservation_expires_at', 'expires_at', postgresql_where=db.text('confirmed_at IS NULL')),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    show_id = db.Column(db.Integer, nullable=False)
+    show_start_time = db.Column(db.DateTime, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    # shown only to the buyer, who needs it to confirm or release the hold
+    token = db.Column(db.String(32), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    confirmed_at = db.Column(db.DateTime, nullable=True)
+
+# One seat of a show. Free while reservation_id is NULL or held_until has
+# passed; held while held_until is ahead; sold once a reservation is confirmed
+# (reservation_id set, held_until NULL).
+class Ticket(db.Model):
+    __tablename__ = 'Ticket'
+    __table_args__ = (
+        db.ForeignKeyConstraint(['show_id', 'show_start_time'], ['Show.id', 'Show.start_time'], ondelete='CASCADE'),
+        # also the index buyers scan for free seats, in seat order
+        db.UniqueConstraint('show_id', 'seat'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    show_id = db.Column(db.Integer, nullable=False)
+    show_start_time = db.Column(db.DateTime, nullable=False)
+    seat = db.Column(db.Integer, nullable=False)
+    reservation_id = db.Column(db.BigInteger, db.ForeignKey('Reservation.id', ondelete='SET NULL'), nullable=True,
+                               index=True)
+    held_until = db.Column(db.DateTime, nullable=True)
+
+# Top related artists per artist, written by `flask recommendations build`.
+class ArtistRecommendation(db.Model):
+    __tablename__ = 'ArtistRecommendation'
+
+    # the primary key is the artist page's lookup: one artist's rows, in order
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
+    kind = db.Column(db.String(16), primary_key=True)  # 'venue' or 'genre'
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    related_artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False,
+                                  index=True)
+    score = db.Column(db.REAL, nullable=False)
+
+# How far a background job has got, e.g. the start of its last run.
+class Watermark(db.Model):
+    __tablename__ = 'Watermark'
+
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.DateTime, nullable=False)
+    # for jobs that follow an id rather than a time, e.g. the last Show.id rolled up
+    position = db.Column(db.BigInteger, nullable=True)
+
+# Monthly show rollups for /analytics, maintained by `flask analytics refresh`.
+# The city and state are the venue's; a show counts once for each artist genre.
+class AreaMonthRollup(db.Model):
+    __tablename__ = 'AreaMonthRollup'
+
+    city = db.Column(db.String(120), primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+
+class GenreMonthRollup(db.Model):
+    __tablename__ = 'GenreMonthRollup'
+
+    genre = db.Column(db.String(), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+
+class VenueMonthRollup(db.Model):
+    __tablename__ = 'VenueMonthRollup'
+
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+    booked_minutes = db.Column(db.Integer, nullable=False)
+
+install_search_ddl(db.metadata, Venue.__table__, Artist.__table__)
+
+# create_all() only makes the catch-all partition; monthly ones come from the
+# migration and `flask partitions maintain`.
+event.listen(Show.__table__, 'after_create',
+             DDL('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT'))
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class LRUCache(object):
+    """Per-process cache that evicts the least recently used entry once full."""
+
+    # other processes, e.g. a CLI command and the web workers, each have their own
+    shared = False
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache(object):
+    """Cache shared by every worker, backed by Redis (needs the `redis` package)."""
+
+    shared = True
+
+    def __init__(self, url, prefix='fyyur:page:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value.encode('utf-8'), ex=max(int(ttl), 1))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+class PageCache(object):
+    """Rendered detail pages keyed by (kind, id), e.g. ('venue', 3).
+
+    Entries live for at most `ttl` seconds and never past the start of the
+    page's next upcoming show, which is when that show would move to "past".
+    """
+
+    def __init__(self, backend=None, ttl=60, enabled=True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+
+    @classmethod
+    def from_config(cls, config):
+        cache = cls()
+        cache.configure(config)
+        return cache
+
+    def init_app(self, app):
+        self.configure(app.config)
+        app.extensions['page_cache'] = self
+
+    def configure(self, config):
+        if config.get('PAGE_CACHE_BACKEND', 'memory') == 'redis':
+            self.backend = RedisCache(config['PAGE_CACHE_URL'])
+        else:
+            self.backend = LRUCache(config.get('PAGE_CACHE_SIZE', 1024))
+        self.ttl = config.get('PAGE_CACHE_TTL', 60)
+        self.enabled = config.get('PAGE_CACHE_ENABLED', True)
+
+    @property
+    def shared(self):
+        """Whether invalidations made here reach every process."""
+        return self.backend.shared
+
+    @staticmethod
+    def key(kind, owner_id):
+        return '{}:{}'.format(kind, owner_id)
+
+    def get(self, kind, owner_id):
+        if not self.enabled:
+            return None
+        return self.backend.get(self.key(kind, owner_id))
+
+    def set(self, kind, owner_id, page, expires_at=None):
+        if not self.enabled:
+            return
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.now()).total_seconds())
+        if ttl > 0:
+            self.backend.set(self.key(kind, owner_id), page, ttl)
+
+    def invalidate(self, kind, *owner_ids):
+        self.backend.delete(*[self.key(kind, owner_id) for owner_id in owner_ids])
+
+    def clear(self):
+        self.backend.clear()
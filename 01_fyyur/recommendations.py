@@ -0,0 +1,103 @@
+import numpy as np
+from scipy import sparse
+
+# Related artists, computed offline by `flask recommendations build` (needs the
+# numpy and scipy packages). Artists are rows of two sparse feature matrices,
+# venues played and genres, each weighted by inverse frequency so a small club
+# shared by two artists says more than a big hall or "Rock n Roll". Neighbours
+# are the rows with the highest cosine similarity.
+
+# Similarities are computed for this many artists at a time; a chunk is a dense
+# chunk x artists float32 array (128 x 100k artists is about 50MB).
+CHUNK_SIZE = 128
+
+
+def _weighted(matrix):
+    # idf-weighted, L2-normalized rows
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1.0 + matrix.shape[0]) / (1.0 + frequency)).astype(np.float32) + 1
+    matrix = matrix @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix, dtype=np.float32)
+
+
+def venue_features(artist_ids, plays):
+    """Artists x venues, from (artist_id, venue_id, show count) rows."""
+    position = {artist_id: i for i, artist_id in enumerate(artist_ids)}
+    plays = [(position[artist_id], venue_id, count) for artist_id, venue_id, count in plays
+             if artist_id in position]
+    venues = {venue_id: i for i, venue_id in enumerate(sorted({venue_id for _, venue_id, _ in plays}))}
+    rows = [row for row, _, _ in plays]
+    cols = [venues[venue_id] for _, venue_id, _ in plays]
+    counts = np.log1p([count for _, _, count in plays])
+    return _weighted(sparse.coo_matrix((counts, (rows, cols)), shape=(len(artist_ids), len(venues))))
+
+
+def genre_features(genres):
+    """Artists x genres, from each artist's list of genres."""
+    names = {}
+    rows, cols = [], []
+    for row, artist_genres in enumerate(genres):
+        for genre in set(artist_genres or ()):
+            rows.append(row)
+            cols.append(names.setdefault(genre, len(names)))
+    return _weighted(sparse.coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(genres), len(names))))
+
+
+def top_neighbors(features, rows, k, boost=None, chunk_size=CHUNK_SIZE):
+    """Yields (row, [(neighbour row, score), ...]) for each of `rows`.
+
+    Neighbours are the `k` most similar other rows with a positive score,
+    best first. `boost` (one small value per row) only breaks ties, e.g.
+    in favour of artists with more shows.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    count = features.shape[0]
+    k = min(k, count - 1)
+    transposed = features.T.tocsc()
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        scores = (features[chunk] @ transposed).toarray()
+        scores[np.arange(len(chunk)), chunk] = 0
+        ranked = scores if boost is None else np.where(scores > 0, scores + boost, 0)
+        if 0 < k < count:
+            top = np.argpartition(-ranked, k - 1, axis=1)[:, :k]
+        else:
+            top = np.zeros((len(chunk), 0), dtype=np.int64)
+        for i, row in enumerate(chunk):
+            cols = top[i][np.argsort(-ranked[i, top[i]], kind='stable')]
+            yield int(row), [(int(col), float(scores[i, col])) for col in cols if scores[i, col] > 0]
+
+
+class RelatedArtists(object):
+    """Similarity between every artist, for computing neighbours in batches.
+
+    `artist_ids` and `genres` describe every artist and `plays` is every
+    (artist_id, venue_id, show count).
+    """
+
+    KINDS = ('venue', 'genre')
+
+    def __init__(self, artist_ids, genres, plays):
+        self.artist_ids = list(artist_ids)
+        self.position = {artist_id: i for i, artist_id in enumerate(self.artist_ids)}
+        plays = list(plays)
+        popularity = np.zeros(len(self.artist_ids), dtype=np.float32)
+        for artist_id, _, show_count in plays:
+            if artist_id in self.position:
+                popularity[self.position[artist_id]] += show_count
+        self.boost = 1e-4 * popularity / max(popularity.max(initial=0), 1)
+        self.features = {
+            'venue': venue_features(self.artist_ids, plays),
+            'genre': genre_features(genres),
+        }
+
+    def neighbors(self, targets, k):
+        """Yields (artist_id, kind, rank, related_artist_id, score) rows."""
+        rows = sorted(self.position[artist_id] for artist_id in targets if artist_id in self.position)
+        for kind in self.KINDS:
+            for row, neighbors in top_neighbors(self.features[kind], rows, k, boost=self.boost):
+                for rank, (col, score) in enumerate(neighbors):
+                    yield self.artist_ids[row], kind, rank, self.artist_ids[col], round(score, 4)
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+#----------------------------------------------------------------------------#
+# Formatting.
+#----------------------------------------------------------------------------#
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; request fields travel in `record.fields`."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+#----------------------------------------------------------------------------#
+# Sampling.
+#----------------------------------------------------------------------------#
+
+class RequestStats(object):
+    __slots__ = ('started', 'sql_count', 'sql_ms')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_ms = 0.0
+
+    @property
+    def wall_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+class Sampler(object):
+    """Keeps every 5xx and slow request; samples the rest at `rate` and caps
+    them at `max_per_second` with a token bucket (0 means no cap)."""
+
+    def __init__(self, rate=1.0, slow_ms=500, max_per_second=0, random=random.random, clock=time.monotonic):
+        self.rate = rate
+        self.slow_ms = slow_ms
+        self.max_per_second = max_per_second
+        self.random = random
+        self.clock = clock
+        self._tokens = float(max_per_second)
+        self._refilled = clock()
+        self._lock = threading.Lock()
+
+    def keep(self, status, wall_ms):
+        if status >= 500 or wall_ms >= self.slow_ms:
+            return True
+        if self.rate < 1 and self.random() >= self.rate:
+            return False
+        return self._take()
+
+    def _take(self):
+        if not self.max_per_second:
+            return True
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.max_per_second,
+                               self._tokens + (now - self._refilled) * self.max_per_second)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+#----------------------------------------------------------------------------#
+# Queue.
+#----------------------------------------------------------------------------#
+
+class DroppingQueueHandler(QueueHandler):
+    """Counts records that don't fit in the queue instead of blocking or raising."""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the listener is in this process: leave formatting (and exc_info) to it
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestLog(logging.Handler):
+    """Hands records to a bounded queue drained by a background thread.
+
+    The calling thread only builds the record and enqueues it; formatting
+    and the `handlers` run on the listener thread. The thread is started
+    lazily in each process, so an instance built in a pre-fork master works
+    in every worker.
+    """
+
+    def __init__(self, handlers, sampler=None, queue_size=10000):
+        super().__init__()
+        self.handlers = tuple(handlers)
+        self.sampler = sampler or Sampler()
+        self.queue_size = queue_size
+        self.queue_handler = None
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.logger = logging.getLogger('fyyur.requests')
+
+    @property
+    def dropped(self):
+        return self.queue_handler.dropped if self.queue_handler else 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self.queue_handler = DroppingQueueHandler(queue.Queue(self.queue_size))
+                self.listener = QueueListener(self.queue_handler.queue, *self.handlers,
+                                              respect_handler_level=True)
+                self.listener.start()
+                self._pid = os.getpid()
+
+    def emit(self, record):
+        self._ensure_started()
+        self.queue_handler.handle(record)
+
+    def request(self, method, route, status, stats):
+        # called once per request; sampled out requests cost one comparison or two
+        wall_ms = stats.wall_ms
+        if not self.sampler.keep(status, wall_ms):
+            return False
+        record = self.logger.makeRecord(
+            self.logger.name, logging.INFO, __file__, 0, 'request', None, None)
+        record.fields = {
+            'method': method,
+            'route': route,
+            'status': status,
+            'wall_ms': round(wall_ms, 2),
+            'sql_count': stats.sql_count,
+            'sql_ms': round(stats.sql_ms, 2),
+            'sample_rate': self.sampler.rate,
+            'dropped': self.dropped,
+        }
+        self.handle(record)
+        return True
+
+    def stop(self):
+        # flushes what is queued; the next record starts a new listener
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self._pid = None
+
+    def close(self):
+        self.stop()
+        super().close()
@@ -0,0 +1,99 @@
+import re
+
+from sqlalchemy import DDL, event, func, or_
+
+#----------------------------------------------------------------------------#
+# Schema.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist both carry name/city/state/genres, so one trigger function
+# keeps the search_vector column of either table up to date.
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_search_vector() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER "%(table)s_search_vector" BEFORE INSERT OR UPDATE ON "%(table)s"
+FOR EACH ROW EXECUTE PROCEDURE fyyur_search_vector()
+"""
+
+SEARCH_INDEXES = """
+CREATE INDEX "ix_%(table)s_search_vector" ON "%(table)s" USING gin (search_vector);
+CREATE INDEX "ix_%(table)s_name_trgm" ON "%(table)s" USING gin (name gin_trgm_ops)
+"""
+
+
+def install_search_ddl(metadata, *tables):
+    """Emits the search trigger and indexes whenever metadata.create_all() builds the tables."""
+    event.listen(metadata, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    event.listen(metadata, 'before_create', DDL(SEARCH_VECTOR_FUNCTION))
+    for table in tables:
+        event.listen(table, 'after_create', DDL(SEARCH_VECTOR_TRIGGER))
+        event.listen(table, 'after_create', DDL(SEARCH_INDEXES))
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def to_prefix_tsquery(term):
+    # 'san fran' -> 'san:* & fran:*'; punctuation never reaches to_tsquery
+    words = re.findall(r'\w+', term.lower())
+    return ' & '.join(word + ':*' for word in words)
+
+
+def contains_pattern(term):
+    # LIKE pattern matching `term` anywhere, with its own % and _ taken literally
+    return '%' + re.sub(r'([\\%_])', r'\\\1', term) + '%'
+
+
+def search(session, model, term, page=1, per_page=20):
+    """Relevance-ranked, paginated search over name, city, state and genres.
+
+    Full-text prefix matches come from the search_vector GIN index and
+    partial name matches from the trigram index; both contribute to the rank.
+    """
+    term = term.strip()
+    page = max(page, 1)
+    query = session.query(model.id, model.name, model.upcoming_shows_count,
+                          func.count().over().label('total'))
+
+    tsquery = to_prefix_tsquery(term)
+    if tsquery:
+        ts = func.to_tsquery('simple', tsquery)
+        rank = func.ts_rank(model.search_vector, ts) + func.similarity(model.name, term)
+        query = query.filter(or_(
+            model.search_vector.op('@@')(ts),
+            model.name.ilike(contains_pattern(term), escape='\\'))). \
+            order_by(rank.desc(), model.id)
+    elif term:
+        query = query.filter(model.name.ilike(contains_pattern(term), escape='\\')).order_by(model.name, model.id)
+    else:
+        query = query.order_by(model.name, model.id)
+
+    rows = query.limit(per_page).offset((page - 1) * per_page).all()
+    if rows:
+        total = rows[0].total
+    elif page > 1:
+        # past the last page there is no row to carry the window count
+        total = query.with_entities(func.count()).order_by(None).scalar()
+    else:
+        total = 0
+
+    return {
+        "count": total,
+        "page": page,
+        "per_page": per_page,
+        "data": [{
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.upcoming_shows_count
+        } for row in rows]
+    }
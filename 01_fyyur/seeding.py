@@ -0,0 +1,149 @@
+import itertools
+from datetime import datetime, timedelta
+
+# Synthetic venues, artists and shows for development and benchmarks. Every
+# generator takes a random.Random, so the same seed gives the same data.
+
+# (city, state, relative size): a few big markets and a long tail
+CITIES = (
+    ('New York', 'NY', 84), ('Los Angeles', 'CA', 39), ('Chicago', 'IL', 27),
+    ('Houston', 'TX', 23), ('Phoenix', 'AZ', 16), ('Philadelphia', 'PA', 16),
+    ('San Antonio', 'TX', 15), ('San Diego', 'CA', 14), ('Dallas', 'TX', 13),
+    ('Austin', 'TX', 10), ('San Francisco', 'CA', 9), ('Seattle', 'WA', 7),
+    ('Denver', 'CO', 7), ('Nashville', 'TN', 7), ('Boston', 'MA', 7),
+    ('Portland', 'OR', 6), ('Detroit', 'MI', 6), ('Memphis', 'TN', 6),
+    ('Atlanta', 'GA', 5), ('New Orleans', 'LA', 4), ('Minneapolis', 'MN', 4),
+    ('Kansas City', 'MO', 4), ('Asheville', 'NC', 1), ('Burlington', 'VT', 1),
+)
+
+# (genre, relative popularity), using the genre names of the forms
+GENRES = (
+    ('Rock n Roll', 20), ('Pop', 16), ('Hip-Hop', 14), ('Jazz', 9), ('Electronic', 9),
+    ('Country', 8), ('R&B', 7), ('Alternative', 7), ('Folk', 5), ('Blues', 5),
+    ('Soul', 5), ('Punk', 4), ('Heavy Metal', 4), ('Classical', 3), ('Reggae', 3),
+    ('Funk', 3), ('Instrumental', 2), ('Musical Theatre', 2), ('Other', 2),
+)
+
+VENUE_WORDS = ('Blue', 'Velvet', 'Golden', 'Rusty', 'Midnight', 'Electric', 'Lucky', 'Copper', 'Paper', 'Silver')
+VENUE_KINDS = ('Room', 'Hall', 'Lounge', 'Tavern', 'Ballroom', 'Club', 'Theatre', 'Garage', 'Pavilion')
+ARTIST_WORDS = ('Wolves', 'Echoes', 'Lanterns', 'Rivers', 'Static', 'Foxes', 'Satellites', 'Ghosts', 'Tides')
+
+# shows are spread over the last two years and the next six months, mostly on
+# weekend evenings
+SHOW_DAYS_BEFORE = 730
+SHOW_DAYS_AFTER = 180
+WEEKDAY_WEIGHTS = (1, 1, 1, 2, 4, 5, 2)  # Monday .. Sunday
+SHOW_HOURS = ((18, 1), (19, 3), (20, 5), (21, 4), (22, 2))
+SHOW_MINUTES = ((60, 2), (90, 3), (120, 4), (180, 1))
+LOCAL_ARTIST_SHARE = 0.6
+
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+def _zipf(count, exponent=0.9):
+    # popularity of the n-th most popular venue or artist
+    return _cumulative(1.0 / (rank ** exponent) for rank in range(1, count + 1))
+
+
+class _Picker(object):
+    def __init__(self, choices):
+        choices = list(choices)
+        self.values = [value for value, _ in choices]
+        self.cum_weights = _cumulative(weight for _, weight in choices)
+
+    def __call__(self, rng, k=1):
+        return rng.choices(self.values, cum_weights=self.cum_weights, k=k)
+
+
+_city = _Picker(((city, state), weight) for city, state, weight in CITIES)
+_genre = _Picker(GENRES)
+_hour = _Picker(SHOW_HOURS)
+_duration = _Picker(SHOW_MINUTES)
+
+
+def _genres(rng):
+    return sorted(set(_genre(rng, k=rng.choices((1, 2, 3), weights=(5, 3, 1))[0])))
+
+
+def _phone(rng):
+    return '{}-{}-{}'.format(rng.randint(200, 999), rng.randint(200, 999), rng.randint(1000, 9999))
+
+
+def venue_records(count, rng):
+    """Yields rows in the shape of importer.normalize_venue()."""
+    for i in range(count):
+        (city, state), = _city(rng)
+        yield {
+            'name': 'The {} {} {}'.format(rng.choice(VENUE_WORDS), rng.choice(VENUE_KINDS), i),
+            'city': city,
+            'state': state,
+            'address': '{} {} St'.format(rng.randint(1, 9999), rng.choice(VENUE_WORDS)),
+            'phone': _phone(rng),
+            'genres': _genres(rng),
+            'image_link': None,
+            'facebook_link': None,
+            'website': None,
+            'seeking_talent': rng.random() < 0.3,
+            'seeking_description': None,
+        }
+
+
+def artist_records(count, rng):
+    """Yields rows in the shape of importer.normalize_artist()."""
+    for i in range(count):
+        (city, state), = _city(rng)
+        yield {
+            'name': 'The {} {} {}'.format(rng.choice(VENUE_WORDS), rng.choice(ARTIST_WORDS), i),
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'genres': _genres(rng),
+            'image_link': None,
+            'facebook_link': None,
+            'website': None,
+            'seeking_venue': rng.random() < 0.4,
+            'seeking_description': None,
+        }
+
+
+def _start_time(rng, now):
+    # rejection-sample a day by weekday, then an evening hour on the half hour
+    while True:
+        day = now.date() + timedelta(days=rng.randint(-SHOW_DAYS_BEFORE, SHOW_DAYS_AFTER))
+        if rng.random() * max(WEEKDAY_WEIGHTS) < WEEKDAY_WEIGHTS[day.weekday()]:
+            break
+    hour, = _hour(rng)
+    return datetime(day.year, day.month, day.day, hour, rng.choice((0, 30)))
+
+
+def show_records(count, venues, artists, rng, now=None):
+    """Yields show rows for insert_shows().
+
+    `venues` and `artists` are (id, city) pairs. A few popular venues and
+    artists get most of the shows, and most shows book a local artist.
+    """
+    now = now or datetime.now()
+    # popularity follows the shuffled order, not the ids
+    venues, artists = list(venues), list(artists)
+    rng.shuffle(venues)
+    rng.shuffle(artists)
+    venue_weights = _zipf(len(venues))
+    artist_weights = _zipf(len(artists))
+    local = {}
+    for artist_id, city in artists:
+        local.setdefault(city, []).append(artist_id)
+    for _ in range(count):
+        (venue_id, city), = rng.choices(venues, cum_weights=venue_weights)
+        if city in local and rng.random() < LOCAL_ARTIST_SHARE:
+            artist_id = rng.choice(local[city])
+        else:
+            (artist_id, _), = rng.choices(artists, cum_weights=artist_weights)
+        duration, = _duration(rng)
+        yield {
+            'artist_id': artist_id,
+            'venue_id': venue_id,
+            'start_time': _start_time(rng, now),
+            'duration_minutes': duration,
+        }
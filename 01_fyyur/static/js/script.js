@@ -2,3 +2,37 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Name fields with data-autocomplete fill a datalist from the autocomplete
+// endpoint as the user types, and copy the id of a picked name into the
+// field named by data-target.
+document.addEventListener('DOMContentLoaded', function () {
+  document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var target = document.getElementById(input.dataset.target);
+    var ids = {};
+    var timer = null;
+    input.addEventListener('input', function () {
+      if (ids[input.value] !== undefined) {
+        target.value = ids[input.value];
+        return;
+      }
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        fetch(input.dataset.autocomplete + '?q=' + encodeURIComponent(input.value))
+          .then(function (response) { return response.json(); })
+          .then(function (body) {
+            ids = {};
+            list.innerHTML = '';
+            body.data.forEach(function (match) {
+              var label = match.name + ' (#' + match.id + ')';
+              ids[label] = match.id;
+              var option = document.createElement('option');
+              option.value = label;
+              list.appendChild(option);
+            });
+          });
+      }, 100);
+    });
+  });
+});
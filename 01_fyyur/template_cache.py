@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+from jinja2 import FileSystemBytecodeCache
+
+# Compiled templates kept on disk, so a new worker loads bytecode instead of
+# parsing and compiling each template on its first request. Entries are keyed
+# by template name and path and checked against the source, so an edited
+# template is recompiled and rewritten by whichever worker renders it first.
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that several processes can share.
+
+    Entries are written to a temporary file and renamed into place, so a
+    worker never reads another's half-written entry. A directory that can't
+    be written only means templates are compiled in memory as before.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        super(TemplateBytecodeCache, self).__init__(directory)
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        try:
+            fd, partial = tempfile.mkstemp(dir=self.directory, prefix='.partial-')
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            # mkstemp makes the file private; a precompile run may not be the workers' user
+            os.chmod(partial, 0o644)
+            os.replace(partial, filename)
+        except OSError:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
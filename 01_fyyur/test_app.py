@@ -0,0 +1,1070 @@
+import gzip
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from app import create_app, configure_logging, delete_venue, seed_database, db, Venue, Artist, Show, Ticket, venue_areas, show_partitions, decode_cursor, \
+    rebuild_upcoming_counts, expire_upcoming_shows, check_upcoming_counts, release_upcoming_shows, \
+    import_file, page_cache, build_recommendations, related_artists, refresh_rollups, maintain_show_partitions, \
+    delete_rows, set_show_capacity, reserve_tickets, ticket_counts, expire_reservations, TicketError, MAX_TOUR_SHOWS
+from page_cache import LRUCache, PageCache
+from formatting import get_formatter
+from request_log import JSONFormatter, Sampler
+from autocomplete import PrefixIndex
+from assets import AssetBuild, minify_css
+try:
+    from recommendations import RelatedArtists
+except ImportError:  # numpy and scipy are only needed by the offline job
+    RelatedArtists = None
+from importer import normalize
+import seeding
+from search import search
+
+DB_HOST = os.getenv('DB_HOST', '127.0.0.1:5432')
+DB_USER = os.getenv('DB_USER', 'postgres')
+DB_PASSWORD = os.getenv('DB_PASSWORD', 'postgres')
+DB_NAME = os.getenv('DB_NAME', 'fyyur_test')
+
+
+class QueryCounter(object):
+    """Counts the SQL statements sent to the engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+class ListHandler(logging.Handler):
+    """Collects formatted records."""
+
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(JSONFormatter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.app = create_app({
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'SQLALCHEMY_DATABASE_URI': 'postgresql+psycopg2://{}:{}@{}/{}'.format(
+                DB_USER, DB_PASSWORD, DB_HOST, DB_NAME),
+        })
+        self.client = self.app.test_client
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        page_cache.clear()
+
+    def tearDown(self):
+        """Executed after reach test"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def seed(self, venues, shows_per_venue=2, prefix='Seed'):
+        artist = Artist(name=prefix + ' Artist', city='San Francisco', state='CA',
+                        genres=['Rock n Roll'])
+        db.session.add(artist)
+        now = datetime.now()
+        for i in range(venues):
+            venue = Venue(name='%s Venue %d' % (prefix, i), city='City %d' % (i % 3), state='CA',
+                          address='%d Main St' % i, genres=['Jazz'])
+            db.session.add(venue)
+            for j in range(shows_per_venue):
+                db.session.add(Show(artist=artist, venue=venue,
+                                    start_time=now + timedelta(days=j + 1, minutes=i)))
+            db.session.add(Show(artist=artist, venue=venue,
+                                start_time=now - timedelta(days=1, minutes=i)))
+        db.session.commit()
+        rebuild_upcoming_counts()
+
+    def test_venues_grouped_by_area(self):
+        self.seed(5)
+        areas = venue_areas()
+
+        self.assertEqual([(a['city'], a['state']) for a in areas],
+                         [('City 0', 'CA'), ('City 1', 'CA'), ('City 2', 'CA')])
+        self.assertEqual(sum(len(a['venues']) for a in areas), 5)
+        for area in areas:
+            for venue in area['venues']:
+                self.assertEqual(venue['num_upcoming_shows'], 2)
+
+    def test_venues_query_count_is_constant(self):
+        self.seed(3)
+        with QueryCounter(db.engine) as small:
+            res = self.client().get('/venues')
+        self.assertEqual(res.status_code, 200)
+
+        self.seed(30, prefix='More')
+        with QueryCounter(db.engine) as large:
+            res = self.client().get('/venues')
+        self.assertEqual(res.status_code, 200)
+
+        self.assertEqual(small.count, 1)
+        self.assertEqual(large.count, small.count)
+
+    def test_search_venues_ranks_name_matches_first(self):
+        self.seed(3)
+        db.session.add(Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                             address='1015 Folsom Street', genres=['Jazz', 'Reggae']))
+        db.session.add(Venue(name='Park Square Live Music & Coffee', city='San Francisco',
+                             state='CA', address='34 Whiskey Moore Ave', genres=['Rock n Roll']))
+        db.session.commit()
+
+        res = self.client().post('/venues/search', data={'search_term': 'Music'})
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'The Musical Hop', res.data)
+        self.assertIn(b'Park Square Live Music &amp; Coffee', res.data)
+
+        with QueryCounter(db.engine) as counter:
+            results = search(db.session, Venue, 'hop')
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(results['data'][0]['name'], 'The Musical Hop')
+
+    def test_search_covers_city_and_genres(self):
+        self.seed(3)
+        by_city = search(db.session, Venue, 'city 1')
+        self.assertEqual([v['name'] for v in by_city['data']], ['Seed Venue 1'])
+        self.assertEqual(by_city['data'][0]['num_upcoming_shows'], 2)
+
+        by_genre = search(db.session, Artist, 'rock')
+        self.assertEqual(by_genre['count'], 1)
+
+    def test_search_treats_wildcards_literally(self):
+        self.seed(3)
+        db.session.add(Venue(name='100% Jazz_Club', city='Oakland', state='CA', address='1 Main St', genres=['Jazz']))
+        db.session.commit()
+        for term in ('%', '_'):
+            self.assertEqual([v['name'] for v in search(db.session, Venue, term)['data']], ['100% Jazz_Club'])
+        self.assertEqual(search(db.session, Venue, '\\')['count'], 0)
+
+    def test_search_is_paginated(self):
+        self.seed(5)
+        first = search(db.session, Venue, 'seed', page=1, per_page=2)
+        last = search(db.session, Venue, 'seed', page=3, per_page=2)
+        self.assertEqual(first['count'], 5)
+        self.assertEqual(len(first['data']), 2)
+        self.assertEqual(len(last['data']), 1)
+        beyond = search(db.session, Venue, 'seed', page=9, per_page=2)
+        self.assertEqual((beyond['count'], beyond['data']), (5, []))
+
+    def test_show_partitions_counts_shows_starting_now_as_upcoming(self):
+        self.seed(1)
+        venue = Venue.query.first()
+        now = datetime.now()
+        db.session.add(Show(artist_id=Artist.query.first().id, venue_id=venue.id, start_time=now))
+        db.session.commit()
+
+        with QueryCounter(db.engine) as counter:
+            upcoming, past, past_count, cursor = show_partitions(
+                Show.venue_id, venue.id, Artist, now=now)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(len(upcoming), 3)
+        self.assertEqual(upcoming[0].start_time, now)
+        self.assertEqual(len(past), 1)
+        self.assertEqual(past_count, 1)
+        self.assertIsNone(cursor)
+
+    def test_past_shows_are_keyset_paginated(self):
+        self.seed(1, shows_per_venue=0)
+        venue = Venue.query.first()
+        artist_id = Artist.query.first().id
+        now = datetime.now()
+        for days in range(2, 8):
+            db.session.add(Show(artist_id=artist_id, venue_id=venue.id,
+                                start_time=now - timedelta(days=days)))
+        db.session.commit()
+
+        seen = []
+        cursor = None
+        while True:
+            _, past, past_count, cursor = show_partitions(
+                Show.venue_id, venue.id, Artist, before=decode_cursor(cursor), per_page=3, now=now)
+            self.assertEqual(past_count, 7)
+            seen.extend(row.show_id for row in past)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+        res = self.client().get('/venues/{}?before=garbage'.format(venue.id))
+        self.assertEqual(res.status_code, 400)
+
+    def test_shows_listing_is_keyset_paginated_and_filtered(self):
+        self.seed(4)
+        res = self.client().get('/shows?limit=5')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.is_streamed)
+        body = res.get_data(as_text=True)
+        self.assertEqual(body.count('tile-show'), 5)
+        self.assertIn('before=', body)
+
+        res = self.client().get('/shows?limit=100&city=City+1')
+        self.assertEqual(res.get_data(as_text=True).count('tile-show'), 3)
+        self.assertNotIn('Older shows', res.get_data(as_text=True))
+
+        res = self.client().get('/shows?limit=100&genre=Jazz')
+        self.assertEqual(res.get_data(as_text=True).count('tile-show'), 0)
+
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        res = self.client().get('/shows?limit=100&start={0}&end={0}'.format(tomorrow))
+        self.assertEqual(res.get_data(as_text=True).count('tile-show'), 4)
+
+    def test_counters_follow_show_writes(self):
+        self.seed(2)
+        venue, other_venue = Venue.query.order_by(Venue.id).all()
+        artist = Artist.query.first()
+        start_time = (datetime.now() + timedelta(days=5)).strftime('%Y-%m-%d %H:%M:%S')
+
+        res = self.client().post('/shows/create', data={
+            'artist_id': artist.id, 'venue_id': venue.id, 'start_time': start_time})
+        self.assertEqual(res.status_code, 200)
+        db.session.expire_all()
+        self.assertEqual(Venue.query.get(venue.id).upcoming_shows_count, 3)
+        self.assertEqual(Artist.query.get(artist.id).upcoming_shows_count, 5)
+
+        release_upcoming_shows(Show.venue_id == venue.id)
+        db.session.delete(Venue.query.get(venue.id))
+        db.session.commit()
+        self.assertIsNone(Venue.query.get(venue.id))
+        self.assertEqual(Artist.query.get(artist.id).upcoming_shows_count, 2)
+        self.assertEqual(check_upcoming_counts(), [])
+
+    def test_expire_moves_started_shows_out_of_counters(self):
+        self.seed(1)
+        self.assertEqual(expire_upcoming_shows(datetime.now() + timedelta(days=1, hours=1)), 1)
+        self.assertEqual(Venue.query.first().upcoming_shows_count, 1)
+        self.assertEqual(expire_upcoming_shows(datetime.now() + timedelta(days=1, hours=1)), 0)
+
+        Venue.query.update({Venue.upcoming_shows_count: 9})
+        db.session.commit()
+        self.assertEqual(len(check_upcoming_counts()), 1)
+        rebuild_upcoming_counts()
+        self.assertEqual(check_upcoming_counts(), [])
+
+    def test_bulk_import_upserts_and_reports_rejects(self):
+        self.seed(1)
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        venues = os.path.join(tmp, 'venues.csv')
+        with open(venues, 'w') as f:
+            f.write('name,city,state,address,genres,seeking_talent\n'
+                    'Seed Venue 0,City 0,CA,99 New St,Jazz;Blues,yes\n'
+                    'The Dueling Pianos Bar,New York,NY,335 Delancey Street,Classical,no\n'
+                    'No Genres,New York,NY,1 Main St,,no\n')
+        report = import_file('venues', venues, batch_size=2)
+        self.assertEqual(report.loaded, 2)
+        self.assertEqual(report.rejects, [(4, 'missing genres')])
+        updated = Venue.query.filter_by(name='Seed Venue 0').one()
+        self.assertEqual(updated.address, '99 New St')
+        self.assertTrue(updated.seeking_talent)
+        self.assertEqual(Venue.query.count(), 2)
+
+        shows = os.path.join(tmp, 'shows.ndjson')
+        start_time = (datetime.now() + timedelta(days=3)).isoformat()
+        dueling = Venue.query.filter_by(name='The Dueling Pianos Bar').one()
+        booked = Show.query.filter(Show.start_time > datetime.now()).order_by(Show.start_time).first()
+        with open(shows, 'w') as f:
+            f.write('{"artist_name": "Seed Artist", "artist_city": "San Francisco", "artist_state": "CA", '
+                    '"venue_name": "The Dueling Pianos Bar", "venue_city": "New York", "venue_state": "NY", '
+                    '"start_time": "%s"}\n' % start_time)
+            f.write('{"artist_id": 999999, "venue_id": %d, "start_time": "%s"}\n' % (updated.id, start_time))
+            f.write('{"artist_name": "Nobody", "artist_city": "X", "artist_state": "CA", '
+                    '"venue_id": %d, "start_time": "%s"}\n' % (updated.id, start_time))
+            f.write('{"artist_name": "Seed Artist", "artist_city": "San Francisco", "artist_state": "CA", '
+                    '"venue_name": "The Dueling Pianos Bar", "venue_city": "New York", "venue_state": "NY", '
+                    '"start_time": "%s"}\n' % start_time)
+            f.write('{"artist_id": %d, "venue_id": %d, "start_time": "%s"}\n' % (
+                booked.artist_id, dueling.id, (datetime.fromisoformat(start_time) + timedelta(hours=1)).isoformat()))
+            f.write('{"artist_id": %d, "venue_id": %d, "start_time": "%s"}\n' % (
+                booked.artist_id, dueling.id, (booked.start_time + timedelta(minutes=30)).isoformat()))
+        report = import_file('shows', shows)
+        self.assertEqual(report.loaded, 1)
+        self.assertEqual([line_no for line_no, _ in report.rejects], [3, 4, 5, 6, 2])
+        self.assertEqual(report.rejects[1:3], [(4, 'duplicate of line 1'), (5, 'overlaps line 1')])
+        self.assertTrue(report.rejects[3][1].startswith('the artist is already booked'))
+        # the same show again is not a conflict with itself
+        report = import_file('shows', shows)
+        self.assertEqual([line_no for line_no, _ in report.rejects], [3, 4, 5, 6, 2])
+        self.assertEqual(Show.query.filter_by(venue_id=dueling.id).count(), 1)
+        self.assertEqual(Venue.query.filter_by(name='The Dueling Pianos Bar').one().upcoming_shows_count, 1)
+        self.assertEqual(check_upcoming_counts(), [])
+
+    def test_detail_pages_are_cached_until_a_write_touches_them(self):
+        self.seed(1)
+        venue = Venue.query.first()
+        artist = Artist.query.first()
+        url = '/venues/{}'.format(venue.id)
+
+        self.client().get(url)
+        with QueryCounter(db.engine) as counter:
+            res = self.client().get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(counter.count, 0)
+
+        self.client().post('/artists/{}/edit'.format(artist.id), data={
+            'name': 'Renamed Artist', 'city': 'San Francisco', 'state': 'CA',
+            'phone': '', 'genres': ['Jazz'], 'facebook_link': ''})
+        # the redirect target carries a flashed message and must not be cached
+        self.client().get('/artists/{}'.format(artist.id))
+        self.assertIsNone(page_cache.get('artist', artist.id))
+        self.assertIn(b'Renamed Artist', self.client().get(url).data)
+
+        start_time = (datetime.now() + timedelta(days=9)).strftime('%Y-%m-%d %H:%M:%S')
+        self.client().post('/shows/create', data={
+            'artist_id': artist.id, 'venue_id': venue.id, 'start_time': start_time})
+        self.assertIsNone(page_cache.get('venue', venue.id))
+        self.assertIn(b'3 Upcoming Shows', self.client().get(url).data)
+
+    def test_genre_listings_use_cached_grouped_counts(self):
+        self.seed(3)
+        db.session.add(Artist(name='Matt Quevedo', city='New York', state='NY', genres=['Jazz']))
+        db.session.commit()
+
+        res = self.client().get('/genres/Jazz/artists')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Matt Quevedo', res.data)
+        self.assertNotIn(b'Seed Artist', res.data)
+        self.assertIn(b'Rock n Roll (1)', res.data)
+
+        res = self.client().get('/genres/Jazz/venues')
+        self.assertIn(b'Jazz: 3 venues', res.data)
+
+        with QueryCounter(db.engine) as counter:
+            self.client().get('/genres/Jazz/venues?page=2')
+        self.assertEqual(counter.count, 1)
+
+        self.client().post('/venues/create', data={
+            'name': 'The Jazz Hole', 'city': 'City 0', 'state': 'CA', 'address': '1 Jazz Way',
+            'phone': '', 'genres': ['Jazz'], 'website': '', 'facebook_link': '',
+            'image_link': '', 'seeking_description': ''})
+        self.assertIn(b'Jazz: 4 venues', self.client().get('/genres/Jazz/venues').data)
+
+    def test_api_detail_answers_304_from_the_validator_query(self):
+        self.seed(1)
+        venue = Venue.query.first()
+        artist = Artist.query.first()
+        url = '/api/v1/venues/{}'.format(venue.id)
+
+        res = self.client().get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.get_json()['upcoming_shows']), 2)
+        etag, _ = res.get_etag()
+        self.assertIsNotNone(res.last_modified)
+
+        with QueryCounter(db.engine) as counter:
+            res = self.client().get(url, headers={'If-None-Match': '"{}"'.format(etag)})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(counter.count, 1)
+
+        res = self.client().get(url, headers={'If-Modified-Since': res.headers['Last-Modified']})
+        self.assertEqual(res.status_code, 304)
+
+        # a partner artist rename changes the venue payload, so the venue etag moves too
+        self.client().post('/artists/{}/edit'.format(artist.id), data={
+            'name': 'Renamed Artist', 'city': 'San Francisco', 'state': 'CA',
+            'phone': '', 'genres': ['Jazz'], 'facebook_link': ''})
+        res = self.client().get(url, headers={'If-None-Match': '"{}"'.format(etag)})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['upcoming_shows'][0]['artist_name'], 'Renamed Artist')
+
+        self.assertEqual(self.client().get('/api/v1/artists/0').status_code, 404)
+
+    def test_api_lists_are_conditional(self):
+        self.seed(2)
+        res = self.client().get('/api/v1/shows?limit=3')
+        data = res.get_json()
+        self.assertEqual(len(data['shows']), 3)
+        self.assertIsNotNone(data['next_cursor'])
+        datetime.fromisoformat(data['shows'][0]['start_time'])
+
+        res = self.client().get('/api/v1/shows?limit=3', headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(len(self.client().get('/api/v1/venues').get_json()['areas']), 2)
+
+
+    def test_overlapping_bookings_are_refused(self):
+        self.seed(1)
+        artist, venue = Artist.query.one(), Venue.query.one()
+        other_venue = Venue(name='Other Venue', city='City 0', state='CA', address='2 Main St', genres=['Jazz'])
+        other_artist = Artist(name='Other Artist', city='City 0', state='CA', genres=['Jazz'])
+        db.session.add_all([other_venue, other_artist])
+        db.session.commit()
+        booked = Show.query.filter(Show.start_time > datetime.now()).order_by(Show.start_time).first().start_time
+
+        def book(artist_id, venue_id, start_time, duration_minutes=120):
+            return self.client().post('/shows/create', data={
+                'artist_id': artist_id, 'venue_id': venue_id, 'duration_minutes': duration_minutes,
+                'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S')})
+
+        res = book(artist.id, other_venue.id, booked + timedelta(minutes=90))
+        self.assertIn(b'the artist is already booked', res.data)
+        res = book(other_artist.id, venue.id, booked - timedelta(minutes=30), duration_minutes=45)
+        self.assertIn(b'the venue is already booked', res.data)
+        # an explicit offset is converted to server-local time before the check
+        res = self.client().post('/shows/create', data={
+            'artist_id': artist.id, 'venue_id': other_venue.id,
+            'start_time': booked.astimezone(timezone(timedelta(hours=-11))).isoformat()})
+        self.assertIn(b'the artist is already booked', res.data)
+        self.assertEqual(Show.query.count(), 3)
+
+        # back to back is fine: the earlier show ends as the next one starts
+        res = book(artist.id, other_venue.id, booked + timedelta(minutes=120))
+        self.assertIn(b'Show was successfully listed!', res.data)
+        self.assertEqual(Show.query.count(), 4)
+
+    def test_tour_schedule_is_validated_in_one_query(self):
+        self.seed(1)
+        artist, venue = Artist.query.one(), Venue.query.one()
+        booked = Show.query.filter(Show.start_time > datetime.now()).order_by(Show.start_time).first()
+        later = booked.start_time + timedelta(days=10)
+        tour = [
+            {'artist_id': artist.id, 'venue_id': venue.id, 'start_time': booked.start_time.isoformat()},
+            {'artist_id': artist.id, 'venue_id': venue.id, 'start_time': later.isoformat()},
+            {'artist_id': artist.id, 'venue_id': 0, 'start_time': (later + timedelta(hours=1)).isoformat(),
+             'duration_minutes': 30},
+            {'artist_id': artist.id, 'venue_id': 0, 'start_time': (later + timedelta(hours=3)).isoformat()},
+        ]
+        with QueryCounter(db.engine) as counter:
+            res = self.client().post('/api/v1/shows/validate', json={'shows': tour})
+        self.assertEqual(counter.count, 1)
+
+        data = res.get_json()
+        self.assertFalse(data['valid'])
+        first, second, third, fourth = data['shows']
+        self.assertEqual([c['show_id'] for c in first['conflicts']], [booked.id])
+        self.assertEqual(first['conflicts'][0]['booked'], ['artist', 'venue'])
+        self.assertEqual((second['schedule_conflicts'], third['schedule_conflicts']), ([2], [1]))
+        self.assertEqual((fourth['conflicts'], fourth['schedule_conflicts']), ([], []))
+
+        res = self.client().post('/api/v1/shows/validate', json={'shows': [{'artist_id': 1}]})
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.get_json()['errors'], [{'index': 0, 'error': 'missing venue_id'}])
+
+        for body in ({'shows': tour[0]}, {'shows': tour[:1] * (MAX_TOUR_SHOWS + 1)}):
+            res = self.client().post('/api/v1/shows/validate', json=body)
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(res.get_json()['error'],
+                             'expected {{"shows": [...]}} with 1 to {} shows'.format(MAX_TOUR_SHOWS))
+
+        # an explicit offset is converted to the server-local time shows are stored in
+        offset = booked.start_time.astimezone(timezone(timedelta(hours=-11))).isoformat()
+        res = self.client().post('/api/v1/shows/validate', json={'shows': [dict(tour[0], start_time=offset)]})
+        self.assertEqual([c['show_id'] for c in res.get_json()['shows'][0]['conflicts']], [booked.id])
+
+    def test_calendar_export_streams_and_answers_304(self):
+        self.seed(1)
+        venue = Venue.query.one()
+        url = '/venues/{}/shows.ics'.format(venue.id)
+
+        res = self.client().get(url)
+        self.assertEqual(res.mimetype, 'text/calendar')
+        self.assertTrue(res.is_streamed)
+        body = res.get_data(as_text=True)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+        self.assertIn('SUMMARY:Seed Artist at Seed Venue 0', body)
+
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        res = self.client().get(url + '?start=' + tomorrow)
+        self.assertEqual(res.get_data(as_text=True).count('BEGIN:VEVENT'), 2)
+
+        etag = self.client().get(url).headers['ETag']
+        with QueryCounter(db.engine) as counter:
+            res = self.client().get(url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(self.client().get('/artists/0/shows.ics').status_code, 404)
+
+    def test_csv_export_covers_every_show(self):
+        self.seed(3)
+        res = self.client().get('/shows.csv')
+        self.assertEqual(res.mimetype, 'text/csv')
+        lines = res.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0].split(','), ['show_id', 'start_time', 'end_time', 'duration_minutes', 'venue_id',
+                                               'venue_name', 'venue_city', 'venue_state', 'artist_id', 'artist_name'])
+        self.assertEqual(len(lines), 1 + 9)
+
+        res = self.client().get('/shows.csv', headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+        # no count over Show: a venue's shows go with it, and the artist it played with is touched
+        delete_rows('venues', [Venue.query.order_by(Venue.id).first().id])
+        res = self.client().get('/shows.csv', headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(len(res.get_data(as_text=True).splitlines()), 1 + 6)
+        Show.query.delete()
+        db.session.commit()
+        res = self.client().get('/shows.csv', headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.get_data(as_text=True).splitlines(), lines[:1])
+
+    def test_autocomplete_follows_create_edit_and_delete(self):
+        self.seed(2)
+        res = self.client().get('/autocomplete/venues?q=seed ven')
+        self.assertEqual([match['name'] for match in json.loads(res.data)['data']],
+                         ['Seed Venue 0', 'Seed Venue 1'])
+
+        venue = Venue.query.filter_by(name='Seed Venue 0').one()
+        self.client().post('/venues/%d/edit' % venue.id, data={
+            'name': 'Café Olé', 'city': 'Oakland', 'state': 'CA', 'address': '1 Main St',
+            'phone': '', 'genres': ['Jazz'], 'facebook_link': ''})
+        res = self.client().get('/autocomplete/venues?q=cafe')
+        self.assertEqual(json.loads(res.data)['data'], [{'id': venue.id, 'name': 'Café Olé'}])
+        res = self.client().get('/autocomplete/venues?q=ole')
+        self.assertEqual(len(json.loads(res.data)['data']), 1)
+
+        with self.app.test_request_context(method='DELETE'):
+            delete_venue(venue.id)
+        res = self.client().get('/autocomplete/venues?q=cafe')
+        self.assertEqual(json.loads(res.data)['data'], [])
+        res = self.client().get('/autocomplete/artists?q=sed&fuzzy=1')
+        self.assertEqual([match['name'] for match in json.loads(res.data)['data']], ['Seed Artist'])
+        res = self.client().get('/autocomplete/artists?q=sed&fuzzy=0')
+        self.assertEqual(json.loads(res.data)['data'], [])
+
+    @unittest.skipIf(RelatedArtists is None, 'needs numpy and scipy')
+    def test_related_artists_are_precomputed_and_updated_incrementally(self):
+        now = datetime.now()
+        jazz, rock, other = [Artist(name=name, city='Oakland', state='CA', genres=genres)
+                             for name, genres in (('Jazz Trio', ['Jazz']), ('Rock Band', ['Rock n Roll']),
+                                                  ('Jazz Duo', ['Jazz']))]
+        club, hall = [Venue(name=name, city='Oakland', state='CA', address='1 Main St', genres=['Jazz'])
+                      for name in ('Club', 'Hall')]
+        db.session.add_all([Show(artist=jazz, venue=club, start_time=now - timedelta(days=3)),
+                            Show(artist=rock, venue=club, start_time=now - timedelta(days=2)),
+                            Show(artist=other, venue=hall, start_time=now - timedelta(days=1))])
+        db.session.commit()
+
+        self.assertEqual(build_recommendations(), 3)
+        related = related_artists(jazz.id)
+        self.assertEqual([a['artist_name'] for a in related['venue']], ['Rock Band'])
+        self.assertEqual([a['artist_name'] for a in related['genre']], ['Jazz Duo'])
+        res = self.client().get('/artists/%d' % jazz.id)
+        self.assertIn(b'Played the Same Venues', res.data)
+
+        self.assertEqual(build_recommendations(), 0)
+        db.session.add(Show(artist_id=other.id, venue_id=club.id, start_time=now + timedelta(days=1)))
+        db.session.commit()
+        # the new show's artist and everyone who played the club
+        self.assertEqual(build_recommendations(), 3)
+        self.assertEqual(len(related_artists(jazz.id)['venue']), 2)
+
+        # a genre change reaches the artists sharing the new genre, not only the edited one
+        rock.genres = ['Jazz']
+        db.session.commit()
+        self.assertEqual(build_recommendations(), 3)
+        self.assertEqual([a['artist_name'] for a in related_artists(jazz.id)['genre']], ['Jazz Duo', 'Rock Band'])
+
+    def test_analytics_rollups_follow_inserts_and_venue_deletes(self):
+        self.seed(2, shows_per_venue=1)
+        self.assertEqual(refresh_rollups(), 4)
+        artist = Artist.query.first()
+        venue = Venue.query.filter_by(name='Seed Venue 0').one()
+        db.session.add(Show(artist_id=artist.id, venue_id=venue.id, duration_minutes=90,
+                            start_time=datetime.now() + timedelta(days=40)))
+        db.session.commit()
+        self.assertEqual(refresh_rollups(), 1)
+        self.assertEqual(refresh_rollups(), 0)
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            res = self.client().get('/api/v1/analytics?months=3')
+            self.assertEqual(self.client().get('/analytics').status_code, 200)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertFalse([statement for statement in statements if '"Show"' in statement])
+        data = json.loads(res.data)
+        self.assertEqual(sum(row['shows'] for row in data['areas']), 5)
+        self.assertEqual(sum(row['shows'] for row in data['genres']), 5)
+        by_venue = {}
+        for row in data['venues']:
+            by_venue[row['venue_name']] = by_venue.get(row['venue_name'], 0) + row['booked_minutes']
+        self.assertEqual(by_venue, {'Seed Venue 0': 2 * 120 + 90, 'Seed Venue 1': 2 * 120})
+
+        with self.app.test_request_context(method='DELETE'):
+            delete_venue(venue.id)
+        data = json.loads(self.client().get('/api/v1/analytics?months=3').data)
+        self.assertEqual(sum(row['shows'] for row in data['areas']), 2)
+        refresh_rollups(full=True)
+        self.assertEqual(json.loads(self.client().get('/api/v1/analytics?months=3').data)['areas'], data['areas'])
+
+    def test_edits_write_changed_fields_and_reject_stale_versions(self):
+        self.seed(1)
+        venue = Venue.query.first()
+        url = '/venues/%d/edit' % venue.id
+        form = {'name': venue.name, 'city': venue.city, 'state': 'CA', 'address': venue.address,
+                'phone': '', 'genres': ['Jazz'], 'facebook_link': ''}
+        res = self.client().get(url)
+        self.assertEqual(res.headers['ETag'], '"v1"')
+        self.assertIn(b'name="version" value="1"', res.data)
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            self.client().post(url, data=dict(form, version=1))
+            self.assertFalse([statement for statement in statements if statement.startswith('UPDATE "Venue"')])
+            self.client().post(url, data=dict(form, version=1, phone='555-123-4567'))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        update, = [statement for statement in statements if statement.startswith('UPDATE "Venue"')]
+        self.assertIn('phone=', update)
+        self.assertNotIn('name=', update)
+        self.assertIn('"Venue".version = ', update)
+
+        # a second editor still on version 1
+        res = self.client().post(url, data=dict(form, version=1, address='9 Side St'))
+        self.assertEqual(res.status_code, 409)
+        self.assertIn(b'555-123-4567', res.data)
+        self.assertIn(b'name="version" value="2"', res.data)
+        self.assertEqual(Venue.query.get(venue.id).address, form['address'])
+
+        res = self.client().post(url, data=dict(form, address='9 Side St'), headers={'If-Match': '"v1"'})
+        self.assertEqual(res.status_code, 412)
+        body = json.loads(res.data)
+        self.assertEqual((body['version'], body['current']['phone']), (2, '555-123-4567'))
+        res = self.client().post(url, data=dict(form, address='9 Side St'), headers={'If-Match': '"v2"'})
+        self.assertEqual(res.status_code, 302)
+        db.session.expire_all()
+        venue = Venue.query.get(venue.id)
+        self.assertEqual((venue.address, venue.phone, venue.version), ('9 Side St', '', 3))
+
+    def test_bulk_delete_cascades_in_batches_and_releases_counters(self):
+        seed_database(6, 8, 60, random_seed=5)
+        venue_ids = sorted(venue.id for venue in Venue.query)
+        doomed = venue_ids[:4]
+        name = Venue.query.get(doomed[0]).name
+        lookup = lambda: [match['id'] for match in
+                          json.loads(self.client().get('/autocomplete/venues', query_string={'q': name}).data)['data']]
+        self.assertIn(doomed[0], lookup())
+        progress = []
+        deleted = delete_rows('venues', doomed[:3] + doomed[:1], batch_size=2,
+                              progress=lambda *args: progress.append(args))
+        self.assertEqual(deleted, doomed[:3])
+        self.assertEqual([done for done, _, _ in progress], [2, 3])
+        self.assertEqual(Show.query.filter(Show.venue_id.in_(doomed[:3])).count(), 0)
+        self.assertEqual(check_upcoming_counts(), [])
+
+        res = self.client().post('/api/v1/venues/delete', json={'ids': [doomed[3], 0]})
+        self.assertEqual(json.loads(res.data), {'deleted': [doomed[3]], 'missing': [0]})
+        self.assertEqual(self.client().post('/api/v1/venues/delete', json={'ids': ['1']}).status_code, 400)
+        self.assertEqual(self.client().post('/api/v1/venues/delete', json={'ids': []}).status_code, 400)
+        self.assertEqual(sorted(venue.id for venue in Venue.query), venue_ids[4:])
+        self.assertNotIn(doomed[0], lookup())
+
+        res = self.client().delete('/venues/%d' % venue_ids[4])
+        self.assertEqual(json.loads(res.data), {'success': True})
+        self.assertEqual(self.client().delete('/venues/%d' % venue_ids[4]).status_code, 404)
+        artist_id = Artist.query.first().id
+        self.assertEqual(delete_rows('artists', [artist_id]), [artist_id])
+        self.assertEqual(Show.query.filter_by(artist_id=artist_id).count(), 0)
+        self.assertEqual(check_upcoming_counts(), [])
+
+    def ticketed_show(self, capacity):
+        self.seed(1, shows_per_venue=1)
+        show = Show.query.filter(Show.start_time > datetime.now()).first()
+        set_show_capacity(show, capacity)
+        db.session.commit()
+        return show.id
+
+    def test_reservations_hold_confirm_release_and_expire(self):
+        show_id = self.ticketed_show(5)
+        url = '/api/v1/shows/%d' % show_id
+        res = self.client().post(url + '/reservations', json={'quantity': 2})
+        self.assertEqual(res.status_code, 201)
+        held = json.loads(res.data)
+        self.assertEqual(held['seats'], [1, 2])
+        self.assertEqual(self.client().post(url + '/reservations', json={'quantity': 4}).status_code, 409)
+        self.assertEqual(self.client().post(url + '/reservations', json={'quantity': 0}).status_code, 400)
+
+        confirm = '/api/v1/reservations/%d/confirm' % held['reservation_id']
+        self.assertEqual(self.client().post(confirm, json={'token': 'wrong'}).status_code, 404)
+        res = self.client().post(confirm, json={'token': held['token']})
+        self.assertEqual(json.loads(res.data)['seats'], [1, 2])
+        res = self.client().delete('/api/v1/reservations/%d' % held['reservation_id'], json={'token': held['token']})
+        self.assertEqual(res.status_code, 409)
+
+        released = json.loads(self.client().post(url + '/reservations', json={'quantity': 3}).data)
+        res = self.client().delete('/api/v1/reservations/%d' % released['reservation_id'],
+                                   json={'token': released['token']})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(self.client().get(url + '/tickets').data),
+                         {'show_id': show_id, 'capacity': 5, 'available': 3, 'held': 0, 'sold': 2})
+
+        other = json.loads(self.client().post(url + '/reservations', json={'quantity': 3}).data)
+        self.assertEqual(json.loads(self.client().get(url + '/tickets').data),
+                         {'show_id': show_id, 'capacity': 5, 'available': 0, 'held': 3, 'sold': 2})
+        with self.assertRaises(TicketError):
+            set_show_capacity(Show.query.filter(Show.id == show_id).one(), 3)
+        db.session.rollback()
+
+        # a lapsed hold is free for the next buyer and can no longer be confirmed
+        later = datetime.utcnow() + timedelta(seconds=self.app.config['TICKET_HOLD_SECONDS'] + 1)
+        reservation, seats = reserve_tickets(show_id, 3, now=later)
+        self.assertEqual(seats, [3, 4, 5])
+        res = self.client().post('/api/v1/reservations/%d/confirm' % other['reservation_id'],
+                                 json={'token': other['token']})
+        self.assertEqual(res.status_code, 410)
+        self.assertEqual(expire_reservations(now=later), 1)
+        self.assertEqual(expire_reservations(now=later), 0)
+
+    def test_concurrent_buyers_never_oversell(self):
+        capacity, buyers = 50, 300
+        show_id = self.ticketed_show(capacity)
+        db.session.remove()
+        start = threading.Barrier(buyers)
+        results, errors = [], []
+
+        def buy(quantity):
+            with self.app.app_context():
+                start.wait()
+                try:
+                    reservation, seats = reserve_tickets(show_id, quantity)
+                    results.append((reservation.id, quantity, seats))
+                except TicketError:
+                    pass
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=buy, args=(1 + i % 3,)) for i in range(buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        seats = [seat for _, _, reserved in results for seat in reserved]
+        self.assertEqual(len(seats), len(set(seats)))
+        self.assertLessEqual(len(seats), capacity)
+        self.assertTrue(all(len(reserved) == quantity for _, quantity, reserved in results))
+        # what each buyer was told matches the table
+        held = dict(db.session.query(Ticket.seat, Ticket.reservation_id).filter(
+            Ticket.show_id == show_id, Ticket.reservation_id.isnot(None)).all())
+        self.assertEqual(held, {seat: reservation_id for reservation_id, _, reserved in results for seat in reserved})
+        counts = ticket_counts(Show.query.filter(Show.id == show_id).one())
+        self.assertEqual((counts['held'], counts['available']), (len(seats), capacity - len(seats)))
+
+    def test_show_partitions_take_rows_from_the_default_partition(self):
+        self.seed(1, shows_per_venue=0)
+        artist, venue = Artist.query.first(), Venue.query.first()
+        today = date.today()
+        later = datetime(today.year + 3, today.month, 1, 20)
+        earlier = datetime(today.year - 3, today.month, 1, 20)
+        db.session.add_all([Show(artist=artist, venue=venue, start_time=later),
+                            Show(artist=artist, venue=venue, start_time=earlier)])
+        db.session.commit()
+
+        created, archived = maintain_show_partitions(ahead=1, today=today)
+        self.assertTrue({date(today.year, today.month, 1), later.date(), earlier.date()} <= set(created))
+        self.assertEqual(archived, [])
+        partition_of = lambda start_time: db.session.execute(
+            'SELECT tableoid::regclass::text FROM "Show" WHERE start_time = :start_time',
+            {'start_time': start_time}).scalar()
+        self.assertEqual(partition_of(later), '"Show_{:%Y_%m}"'.format(later))
+        self.assertEqual(db.session.execute('SELECT count(*) FROM "Show_default"').scalar(), 0)
+
+        # uniqueness still holds across partitions
+        db.session.add(Show(artist=artist, venue=venue, start_time=later))
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+        created, archived = maintain_show_partitions(ahead=1, archive_before=24, today=today)
+        self.assertEqual((created, [month.year for month in archived]), ([], [earlier.year]))
+        self.assertEqual(Show.query.count(), 2)
+        db.session.execute('DROP TABLE "ShowArchive_{:%Y_%m}"'.format(earlier))
+        db.session.commit()
+
+    def test_seeded_data_goes_through_the_bulk_writers(self):
+        seed_database(20, 60, 600, random_seed=3)
+        self.assertEqual((Venue.query.count(), Artist.query.count()), (20, 60))
+        self.assertGreater(Show.query.count(), 550)
+        self.assertEqual(check_upcoming_counts(), [])
+        self.assertGreater(search(db.session, Venue, 'the')['count'], 0)
+
+    def test_request_log_counts_sql_per_request(self):
+        self.seed(2)
+        handler = ListHandler()
+        configure_logging(self.app, [handler])
+        with QueryCounter(db.engine) as counter:
+            self.client().get('/venues', buffered=True)
+        self.app.extensions['request_log'].stop()
+
+        line, = handler.lines
+        self.assertEqual((line['route'], line['status']), ('/venues', 200))
+        self.assertEqual(line['sql_count'], counter.count)
+        self.assertGreater(line['wall_ms'], line['sql_ms'])
+
+
+class AppFactoryTestCase(unittest.TestCase):
+    """create_app() without a database."""
+
+    def test_secret_key_is_required_outside_debug_and_tests(self):
+        with self.assertRaises(RuntimeError):
+            create_app({'SECRET_KEY': None, 'DEBUG': False})
+        app = create_app({'SECRET_KEY': None, 'TESTING': True})
+        self.assertTrue(app.config['SECRET_KEY'])
+
+    def test_workers_share_signed_sessions(self):
+        first, second = [create_app({'SECRET_KEY': 'shared', 'TESTING': True}) for _ in range(2)]
+        cookie = first.session_interface.get_signing_serializer(first).dumps({'_flashes': [('message', 'hi')]})
+        session = second.session_interface.get_signing_serializer(second).loads(cookie)
+        self.assertEqual(session['_flashes'], [('message', 'hi')])
+
+    def test_heavy_modules_load_on_first_use(self):
+        deferred = ('alembic', 'wtforms', 'babel', 'dateutil')
+        script = 'import sys, app; app.create_app({"TESTING": True}); print(sorted(set(%r) & set(sys.modules)))'
+        output = subprocess.check_output([sys.executable, '-c', script % (deferred,)],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(output.decode().strip(), '[]')
+
+    def test_templates_precompile_into_the_shared_bytecode_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        app = create_app({'TESTING': True, 'TEMPLATE_CACHE_DIR': cache_dir})
+        result = app.test_cli_runner().invoke(args=['templates', 'compile'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        templates = app.jinja_env.list_templates()
+        entries = [name for name in os.listdir(cache_dir) if name.endswith('.cache')]
+        self.assertEqual(len(entries), len(templates))
+
+        # a new worker loads the bytecode instead of compiling
+        worker = create_app({'TESTING': True, 'TEMPLATE_CACHE_DIR': cache_dir})
+        compiled = []
+        original = worker.jinja_env.compile
+        worker.jinja_env.compile = lambda *args, **kwargs: compiled.append(args) or original(*args, **kwargs)
+        res = worker.test_client().get('/')
+        self.assertEqual((res.status_code, compiled), (200, []))
+
+        app = create_app({'TESTING': True, 'TEMPLATE_CACHE_DIR': ''})
+        self.assertIsNone(app.jinja_env.bytecode_cache)
+
+
+
+class AssetsTestCase(unittest.TestCase):
+    """`flask assets build` and the /assets handler, without a database."""
+
+    def test_minify_css_keeps_strings_and_notices(self):
+        css = '/*! keep */\n/* drop */\na > b ,\n c {\n  content: "a ;  b" ;\n  color: red;\n}\n'
+        self.assertEqual(minify_css(css), '/*! keep */\na > b,c{content: "a ;  b";color: red}')
+
+    def test_fingerprinted_bundles_are_served_precompressed_and_immutable(self):
+        out_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, out_dir)
+        app = create_app({'TESTING': True, 'ASSETS_DIR': out_dir})
+        html = app.test_client().get('/').get_data(as_text=True)
+        self.assertIn('/static/css/main.css', html)
+
+        manifest = AssetBuild(app.static_folder, out_dir).run()
+        bundle = manifest['files']['bundles/site.css']
+        self.assertRegex(bundle, r'^bundles/site\.[0-9a-f]{12}\.css$')
+        self.assertIn('gzip', manifest['encodings'][bundle])
+        with open(os.path.join(out_dir, bundle), 'rb') as f:
+            raw = f.read()
+        with open(os.path.join(out_dir, bundle + '.gz'), 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), raw)
+
+        app = create_app({'TESTING': True, 'ASSETS_DIR': out_dir})
+        client = app.test_client()
+        html = client.get('/').get_data(as_text=True)
+        self.assertIn('/assets/' + bundle, html)
+        self.assertNotIn('/static/css/main.css', html)
+        res = client.get('/assets/' + bundle, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual((res.headers['Content-Encoding'], res.headers['Content-Type']), ('gzip', 'text/css; charset=utf-8'))
+        self.assertIn('immutable', res.headers['Cache-Control'])
+        self.assertEqual(gzip.decompress(res.data), raw)
+        res = client.get('/assets/' + bundle, headers={'Accept-Encoding': 'identity'})
+        self.assertEqual((res.headers.get('Content-Encoding'), res.data), (None, raw))
+        self.assertEqual(client.get('/assets/css/main.css').status_code, 404)
+
+
+class RequestLogTestCase(unittest.TestCase):
+    """Request log sampling and the background writer, without a database."""
+
+    def test_sampler_keeps_errors_and_slow_requests_and_caps_the_rest(self):
+        draws = iter([0.9, 0.1, 0.1, 0.1, 0.1])
+        now = [0.0]
+        sampler = Sampler(rate=0.5, slow_ms=100, max_per_second=2,
+                          random=lambda: next(draws), clock=lambda: now[0])
+        self.assertTrue(sampler.keep(500, 1))
+        self.assertTrue(sampler.keep(200, 150))
+        self.assertEqual([sampler.keep(200, 1) for _ in range(4)], [False, True, True, False])
+        now[0] = 1.0
+        self.assertTrue(sampler.keep(200, 1))
+
+    def test_requests_are_written_as_json_off_the_request_thread(self):
+        app = create_app({'TESTING': True})
+        handler = ListHandler()
+        configure_logging(app, [handler])
+        app.test_client().get('/venues/create', buffered=True)
+        app.test_client().get('/no/such/page', buffered=True)
+        request_log = app.extensions['request_log']
+        self.assertNotEqual(request_log.listener._thread.ident, threading.get_ident())
+        request_log.stop()
+
+        created, missing = handler.lines
+        self.assertEqual((created['method'], created['route'], created['status']), ('GET', '/venues/create', 200))
+        self.assertEqual(created['sql_count'], 0)
+        self.assertEqual((missing['route'], missing['status']), (None, 404))
+
+    def test_failed_statements_leave_no_sql_timer_behind(self):
+        with create_engine('sqlite://').connect() as conn:
+            with self.assertRaises(DBAPIError):
+                conn.execute('SELECT * FROM missing')
+            self.assertEqual(conn.execute('SELECT 1').scalar(), 1)
+            self.assertNotIn('query_started', conn.info)
+
+
+class SeedingTestCase(unittest.TestCase):
+    """Synthetic data generators, without a database."""
+
+    def test_records_match_the_importer_and_repeat_per_seed(self):
+        def generate(random_seed):
+            rng = random.Random(random_seed)
+            venues = list(seeding.venue_records(50, rng))
+            artists = list(seeding.artist_records(100, rng))
+            shows = list(seeding.show_records(
+                500, [(i, v['city']) for i, v in enumerate(venues)], [(i, a['city']) for i, a in enumerate(artists)],
+                rng, now=datetime(2030, 6, 1)))
+            return venues, artists, shows
+
+        venues, artists, shows = generate(7)
+        self.assertEqual(generate(7), (venues, artists, shows))
+        self.assertEqual(normalize('venues', venues[0]), venues[0])
+        self.assertEqual(normalize('artists', artists[0]), artists[0])
+        self.assertTrue(all(18 <= show['start_time'].hour <= 22 for show in shows))
+        weekend = sum(show['start_time'].weekday() >= 4 for show in shows)
+        self.assertGreater(weekend, len(shows) / 2)
+
+
+class ImporterTestCase(unittest.TestCase):
+    """Record normalization for `flask import`, without a database."""
+
+    def test_show_times_with_an_offset_are_stored_as_local_time(self):
+        record = {'artist_id': '1', 'venue_id': '2', 'start_time': '2024-05-01T20:00:00+02:00'}
+        start_time = normalize('shows', record)['start_time']
+        self.assertIsNone(start_time.tzinfo)
+        self.assertEqual(start_time, datetime(2024, 5, 1, 18, 0, tzinfo=timezone.utc).astimezone().replace(tzinfo=None))
+        record['start_time'] = '2024-05-01 20:00'
+        self.assertEqual(normalize('shows', record)['start_time'], datetime(2024, 5, 1, 20, 0))
+
+
+class PrefixIndexTestCase(unittest.TestCase):
+    """In-memory name index behind the autocomplete endpoints."""
+
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.load([(1, 'The Blue Room'), (2, 'Blues Hall'), (3, 'Björk'), (4, 'Room 5')])
+
+    def test_name_starts_rank_before_word_starts(self):
+        self.assertEqual(self.index.lookup('blue'), [(2, 'Blues Hall'), (1, 'The Blue Room')])
+        self.assertEqual(self.index.lookup('ROOM'), [(4, 'Room 5'), (1, 'The Blue Room')])
+        self.assertEqual(self.index.lookup('bjo'), [(3, 'Björk')])
+        self.assertEqual(self.index.lookup('blue', limit=1), [(2, 'Blues Hall')])
+        self.assertEqual(self.index.lookup(' - '), [])
+
+    def test_updates_and_fuzzy_fallback(self):
+        self.index.add([(2, 'Jazz Hall'), (5, 'Blue Note')])
+        self.index.remove([1])
+        self.assertEqual(self.index.lookup('blue'), [(5, 'Blue Note')])
+        self.assertEqual(self.index.lookup('jaz'), [(2, 'Jazz Hall')])
+        self.assertEqual(self.index.lookup('bleu'), [])
+        self.assertEqual(self.index.lookup('bleu', fuzzy=True), [(5, 'Blue Note')])
+        self.assertEqual(len(self.index), 4)
+
+
+@unittest.skipIf(RelatedArtists is None, 'needs numpy and scipy')
+class RelatedArtistsTestCase(unittest.TestCase):
+    """Similarity scores behind the related artists, without a database."""
+
+    def test_neighbors_rank_shared_small_venues_and_genres(self):
+        related = RelatedArtists(
+            [10, 20, 30, 40],
+            [['Jazz'], ['Jazz', 'Blues'], ['Rock n Roll'], ['Jazz']],
+            # 100 is a club two artists share; 200 is a hall everyone plays
+            [(10, 100, 2), (20, 100, 1), (10, 200, 1), (20, 200, 1), (30, 200, 1), (40, 200, 5)])
+        rows = list(related.neighbors([10], k=2))
+        venue = [(other, score) for _, kind, _, other, score in rows if kind == 'venue']
+        genre = [other for _, kind, _, other, _ in rows if kind == 'genre']
+        self.assertEqual(venue[0][0], 20)
+        self.assertGreater(venue[0][1], venue[1][1])
+        # 40 has exactly the same genres
+        self.assertEqual(genre, [40, 20])
+        self.assertEqual([rank for _, kind, rank, _, _ in rows if kind == 'venue'], [0, 1])
+        self.assertEqual(list(related.neighbors([99], k=2)), [])
+
+
+class PageCacheTestCase(unittest.TestCase):
+    """This class covers the page cache without a database"""
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 'A', 60)
+        cache.set('b', 'B', 60)
+        cache.get('a')
+        cache.set('c', 'C', 60)
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'C')
+
+    def test_entries_expire_when_the_next_show_starts(self):
+        cache = PageCache(LRUCache(), ttl=60)
+        cache.set('venue', 1, 'page', expires_at=datetime.now() - timedelta(seconds=1))
+        self.assertIsNone(cache.get('venue', 1))
+        cache.set('venue', 1, 'page', expires_at=datetime.now() + timedelta(hours=1))
+        self.assertEqual(cache.get('venue', 1), 'page')
+        cache.invalidate('venue', 1)
+        self.assertIsNone(cache.get('venue', 1))
+
+
+class FormattingTestCase(unittest.TestCase):
+    """This class covers show time formatting without a database"""
+
+    def test_native_datetimes_and_strings_format_alike(self):
+        formatter = get_formatter('full')
+        self.assertEqual(formatter(datetime(2020, 12, 18, 21, 5)), 'Friday December, 18, 2020 at 9:05PM')
+        self.assertEqual(formatter('2020-12-18 21:05:00'), formatter(datetime(2020, 12, 18, 21, 5)))
+        self.assertIs(get_formatter('full'), formatter)
+
+    def test_timezone_conversion(self):
+        formatter = get_formatter('medium', 'en_US', 'America/New_York')
+        show_time = datetime(2020, 12, 18, 21, 5, tzinfo=timezone.utc)
+        self.assertEqual(formatter(show_time), 'Fri 12, 18, 2020 4:05PM')
+        # stored times are naive server-local time
+        self.assertEqual(formatter(datetime.fromtimestamp(show_time.timestamp())), 'Fri 12, 18, 2020 4:05PM')
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
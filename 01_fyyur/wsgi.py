@@ -0,0 +1,29 @@
+"""Entry point for pre-fork servers, e.g.
+
+    SECRET_KEY=... gunicorn --preload --workers 4 wsgi:app
+
+With --preload the master builds the app and runs warm_up() once; workers
+fork afterwards and share the imported modules and compiled templates
+copy-on-write instead of each loading them again.
+"""
+import gc
+import os
+
+from app import create_app, load_name_indexes, warm_up
+from models import db
+
+app = create_app()
+warm_up(app)
+
+# The autocomplete indexes are read once here and shared like the templates.
+with app.app_context():
+    load_name_indexes()
+    db.session.remove()
+
+# A pooled connection must not survive into a forked worker where two
+# processes would talk over one socket.
+os.register_at_fork(after_in_child=lambda: db.get_engine(app).dispose())
+
+# Keep the garbage collector from touching (and so copying) the preloaded
+# objects in every worker.
+gc.freeze()